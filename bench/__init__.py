@@ -0,0 +1,8 @@
+"""
+Offline benchmark suite for paki_api.
+
+    fake_server  local stand-in for the chat page (same selectors)
+    load         load generator for /ask and /chat_stream
+    run          starts fake page + API and runs the load in one go
+    replay       re-issues a captured request journal (PAKI_JOURNAL)
+"""
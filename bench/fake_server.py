@@ -0,0 +1,92 @@
+import os
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ============================================================
+# Local fake chat page for offline benchmarks
+# ============================================================
+HTML_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_chat.html")
+
+# Source text for fake answers. The page repeats it and cuts it to the
+# requested length, so load.py can rebuild the exact expected answer.
+# Contains paragraphs, a list and a code block so streaming is exercised
+# across line breaks and fences.
+CORPUS = (
+    "Here is a short walkthrough of the change.\n\n"
+    "1. Read the configuration once at startup.\n"
+    "2. Reuse the client instead of reconnecting.\n"
+    "3. Stream results as soon as they are available.\n\n"
+    "```python\n"
+    "from typing import Optional\n\n"
+    "def stream_chat_response(url: str, timeout: Optional[float] = 10.0) -> None:\n"
+    "    with httpx.Client(timeout=timeout) as client:\n"
+    "        for chunk in client.stream(\"GET\", url).iter_text():\n"
+    "            print(chunk, end=\"\", flush=True)\n"
+    "```\n\n"
+    "Unicode check: naïve café — 数据流 ✓.\n\n"
+)
+
+
+def expected_answer(length: int) -> str:
+    """
+    Returns the answer the fake page generates for `length` characters,
+    as the API reports it (trailing whitespace stripped).
+    """
+    text = ""
+    while len(text) < length:
+        text += CORPUS
+    return text[:length].rstrip()
+
+
+class FakeChatHandler(BaseHTTPRequestHandler):
+    """
+    Serves the fake chat page for every path, plus /corpus.txt.
+    """
+
+    def do_GET(self):
+        if self.path.split("?")[0] == "/corpus.txt":
+            body = CORPUS.encode("utf-8")
+            content_type = "text/plain; charset=utf-8"
+        else:
+            with open(HTML_PATH, "rb") as f:
+                body = f.read()
+            content_type = "text/html; charset=utf-8"
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Keep benchmark output clean
+        pass
+
+
+def serve(host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    """
+    Starts the fake chat server in a daemon thread and returns it.
+    Call .shutdown() on the result to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), FakeChatHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the fake chat page.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), FakeChatHandler)
+    print(f"Fake chat page on http://{args.host}:{args.port}/?rate=50&length=1500&fail=0")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+import sys
+import time
+import asyncio
+import argparse
+
+import httpx
+
+import procstats
+from bench.fake_server import expected_answer
+
+# ============================================================
+# Load generator for /ask and /chat_stream
+# ============================================================
+DEFAULT_PROMPT = "Benchmark prompt: explain the change."
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """
+    Nearest-rank percentile; 0.0 for an empty list.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def stream_once(
+    client: httpx.AsyncClient, prompt: str, params: dict | None = None, headers: dict | None = None
+) -> dict:
+    """
+    Runs one /chat_stream request and records chunk arrival times.
+    `params` adds query parameters (priority, timeout), `headers`
+    request headers (X-Paki-Session).
+    """
+    sample = {"ok": False, "ttfb": None, "gaps": [], "bytes": 0, "text": ""}
+    start = time.perf_counter()
+    parts = []
+    try:
+        async with client.stream(
+            "GET", "/chat_stream", params={"prompt": prompt, **(params or {})}, headers=headers
+        ) as r:
+            last = None
+            async for chunk in r.aiter_text():
+                now = time.perf_counter()
+                if last is None:
+                    sample["ttfb"] = now - start
+                else:
+                    sample["gaps"].append(now - last)
+                last = now
+                parts.append(chunk)
+            sample["ok"] = r.status_code == 200
+            sample["tab"] = r.headers.get("x-paki-tab")
+    except httpx.HTTPError as e:
+        sample["error"] = str(e)
+
+    sample["text"] = "".join(parts)
+    sample["bytes"] = len(sample["text"].encode("utf-8"))
+    sample["total"] = time.perf_counter() - start
+    if sample["text"].startswith("Error:"):
+        sample["ok"] = False
+        sample["error"] = sample["text"].strip()
+    return sample
+
+
+async def ask_once(
+    client: httpx.AsyncClient, prompt: str, params: dict | None = None, headers: dict | None = None
+) -> dict:
+    """
+    Runs one /ask request. Time-to-first-byte is the full response time.
+    """
+    sample = {"ok": False, "ttfb": None, "gaps": [], "bytes": 0, "text": ""}
+    start = time.perf_counter()
+    try:
+        r = await client.get("/ask", params={"prompt": prompt, **(params or {})}, headers=headers)
+        body = r.json()
+        sample["text"] = body.get("response", "")
+        sample["bytes"] = len(r.content)
+        sample["ok"] = r.status_code == 200 and "response" in body
+        sample["tab"] = r.headers.get("x-paki-tab")
+        if not sample["ok"]:
+            sample["error"] = body.get("error", f"HTTP {r.status_code}")
+    except (httpx.HTTPError, ValueError) as e:
+        sample["error"] = str(e)
+
+    sample["total"] = sample["ttfb"] = time.perf_counter() - start
+    return sample
+
+
+async def run_level(
+    base_url: str,
+    endpoint: str,
+    concurrency: int,
+    requests: int,
+    prompt: str,
+    pid: int | None = None,
+    timeout: float = 300,
+    use_cache: bool = False,
+    sessions: int = 0,
+) -> dict:
+    """
+    Fires `requests` calls at `endpoint` with at most `concurrency` in
+    flight and returns the samples plus wall-clock and CPU totals.
+    With `sessions`, request i belongs to conversation i % sessions
+    (X-Paki-Session), which exercises sticky tab routing; each sample
+    records its session and the tab that served it (X-Paki-Tab).
+    """
+    call = stream_once if endpoint == "chat_stream" else ask_once
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency)
+    # Measure the browser path, not the response cache
+    headers = {} if use_cache else {"X-Paki-Cache": "off"}
+
+    async with httpx.AsyncClient(
+        base_url=base_url, timeout=timeout, limits=limits, headers=headers
+    ) as client:
+
+        async def one(i: int) -> dict:
+            session = f"bench-{i % sessions}" if sessions else None
+            async with semaphore:
+                sample = await call(
+                    client, f"{prompt} (#{i})", headers={"X-Paki-Session": session} if session else None
+                )
+            sample["session"] = session
+            return sample
+
+        cpu_before = procstats.cpu_seconds(pid) if pid else 0.0
+        start = time.perf_counter()
+        samples = await asyncio.gather(*(one(i) for i in range(requests)))
+        wall = time.perf_counter() - start
+        cpu = procstats.cpu_seconds(pid) - cpu_before if pid else 0.0
+
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "samples": samples,
+        "wall": wall,
+        "cpu": cpu,
+        "rss": procstats.rss_bytes(pid) if pid else 0,
+    }
+
+
+def summarize(level: dict, expect_length: int | None = None) -> dict:
+    """
+    Reduces one level's samples to the figures in the report.
+    """
+    samples = level["samples"]
+    ok = [s for s in samples if s["ok"]]
+    gaps = [g for s in ok for g in s["gaps"]]
+    expected = expected_answer(expect_length) if expect_length else None
+    # Sessions whose turns were served by more than one tab
+    tabs: dict[str, set] = {}
+    for s in ok:
+        if s.get("session") and s.get("tab") is not None:
+            tabs.setdefault(s["session"], set()).add(s["tab"])
+
+    return {
+        "endpoint": level["endpoint"],
+        "concurrency": level["concurrency"],
+        "requests": len(samples),
+        "errors": len(samples) - len(ok),
+        "mismatches": sum(1 for s in ok if expected is not None and s["text"].strip() != expected),
+        "moved": sum(1 for seen in tabs.values() if len(seen) > 1),
+        "ttfb_p50": percentile([s["ttfb"] for s in ok if s["ttfb"] is not None], 50),
+        "ttfb_p95": percentile([s["ttfb"] for s in ok if s["ttfb"] is not None], 95),
+        "gap_p50": percentile(gaps, 50),
+        "gap_p95": percentile(gaps, 95),
+        "gap_p99": percentile(gaps, 99),
+        "total_p50": percentile([s["total"] for s in ok], 50),
+        "total_p95": percentile([s["total"] for s in ok], 95),
+        "req_per_s": len(ok) / level["wall"] if level["wall"] else 0.0,
+        "kb_per_s": sum(s["bytes"] for s in ok) / 1024 / level["wall"] if level["wall"] else 0.0,
+        "cpu_per_req": level["cpu"] / len(samples) if samples else 0.0,
+        "rss_mb": level["rss"] / 1024 / 1024,
+    }
+
+
+def print_report(rows: list[dict]) -> None:
+    """
+    Prints one line per (endpoint, concurrency) level. Times are in ms.
+    """
+    columns = [
+        ("endpoint", "{:<12}"), ("concurrency", "{:>4}"), ("requests", "{:>5}"),
+        ("errors", "{:>4}"), ("mismatches", "{:>4}"), ("moved", "{:>5}"),
+        ("ttfb_p50", "{:>9.0f}"), ("ttfb_p95", "{:>9.0f}"),
+        ("gap_p50", "{:>8.1f}"), ("gap_p95", "{:>8.1f}"), ("gap_p99", "{:>8.1f}"),
+        ("total_p50", "{:>9.0f}"), ("total_p95", "{:>9.0f}"),
+        ("req_per_s", "{:>7.2f}"), ("kb_per_s", "{:>7.1f}"),
+        ("cpu_per_req", "{:>8.3f}"), ("rss_mb", "{:>7.0f}"),
+    ]
+    headers = ["endpoint", "conc", "reqs", "err", "bad", "moved", "ttfb50", "ttfb95",
+               "gap50", "gap95", "gap99", "total50", "total95",
+               "req/s", "KB/s", "cpu_s/rq", "rss_MB"]
+    widths = [len(fmt.format(0 if i else "")) for i, (_, fmt) in enumerate(columns)]
+    print(" ".join(h.rjust(w) if i else h.ljust(w) for i, (h, w) in enumerate(zip(headers, widths))))
+
+    for row in rows:
+        cells = []
+        for key, fmt in columns:
+            value = row[key]
+            if key.startswith(("ttfb", "gap", "total")):
+                value *= 1000
+            cells.append(fmt.format(value))
+        print(" ".join(cells))
+
+
+async def run(args) -> list[dict]:
+    rows = []
+    for endpoint in args.endpoints.split(","):
+        for concurrency in (int(c) for c in args.concurrency.split(",")):
+            level = await run_level(
+                args.url, endpoint, concurrency, args.requests,
+                args.prompt, pid=args.pid, timeout=args.timeout,
+                use_cache=args.use_cache, sessions=args.sessions,
+            )
+            rows.append(summarize(level, args.expect_length))
+            for s in level["samples"]:
+                if not s["ok"] and args.verbose:
+                    print(f"  [{endpoint} x{concurrency}] {s.get('error')}", file=sys.stderr)
+    return rows
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Drive /ask and /chat_stream and report latency.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="API base URL")
+    parser.add_argument("--endpoints", default="ask,chat_stream", help="comma separated: ask,chat_stream")
+    parser.add_argument("--concurrency", default="1,2,4", help="comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=8, help="requests per level")
+    parser.add_argument("--prompt", default=DEFAULT_PROMPT)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--pid", type=int, help="API process id, for CPU and RSS of its process tree")
+    parser.add_argument("--expect-length", type=int, help="fake page answer length; enables exact-text checks")
+    parser.add_argument("--use-cache", action="store_true", help="let the API answer from its response cache")
+    parser.add_argument("--sessions", type=int, default=0,
+                        help="spread requests over N conversations (X-Paki-Session) to exercise sticky routing")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print individual failures")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    print_report(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import sys
+import time
+import asyncio
+import argparse
+
+import httpx
+
+import procstats
+from bench.load import ask_once, percentile, print_report, stream_once, summarize
+from journal import read_journal
+
+# ============================================================
+# Replay a captured request journal
+# ============================================================
+# Re-issues the requests of a journal written with PAKI_JOURNAL at their
+# original arrival offsets (or scaled with --speed), so a production load
+# shape can be reproduced against a local server, e.g. the one started
+# by bench.run or a paki_api pointed at bench/fake_server.py:
+#
+#   python -m bench.replay journal.jsonl.gz --url http://127.0.0.1:8010 --speed 4
+#
+# Journals hold the prompt text only with PAKI_JOURNAL_PROMPTS=1. Without
+# it, each request gets a synthetic prompt of the original length derived
+# from the prompt hash, so requests that shared a prompt still do (cache
+# and singleflight behave as they did).
+#
+# /ask and non-streaming /v1/chat/completions are replayed as /ask; all
+# streaming endpoints (/chat_stream, /v1 with stream=true, /ws) as
+# /chat_stream.
+
+
+def replay_prompt(entry: dict) -> str:
+    if entry.get("prompt"):
+        return entry["prompt"]
+    prompt = f"Replay {entry.get('prompt_hash', '')}: "
+    filler = "lorem ipsum dolor sit amet "
+    length = int(entry.get("prompt_chars") or len(prompt))
+    while len(prompt) < length:
+        prompt += filler
+    return prompt[:max(length, 1)]
+
+
+def replay_endpoint(entry: dict) -> str:
+    endpoint = entry.get("endpoint")
+    if endpoint == "ask" or (endpoint == "chat_completions" and not entry.get("stream")):
+        return "ask"
+    return "chat_stream"
+
+
+def load_entries(path: str, endpoints: set[str] | None, limit: int | None) -> list[dict]:
+    entries = [e for e in read_journal(path) if "arrived" in e]
+    if endpoints:
+        entries = [e for e in entries if e.get("endpoint") in endpoints]
+    entries.sort(key=lambda e: e["arrived"])
+    return entries[:limit] if limit else entries
+
+
+async def replay(args, entries: list[dict]) -> tuple[list[dict], list[float]]:
+    """
+    Issues every entry at its (scaled) offset from the first one.
+    Returns one level per replayed endpoint and the scheduling lags.
+    """
+    headers = {} if args.use_cache else {"X-Paki-Cache": "off"}
+    samples: dict[str, list[dict]] = {}
+    lags: list[float] = []
+    in_flight = peak = 0
+    first = entries[0]["arrived"]
+
+    async with httpx.AsyncClient(
+        base_url=args.url, timeout=args.timeout, headers=headers,
+        limits=httpx.Limits(max_connections=args.max_connections),
+    ) as client:
+
+        async def one(entry: dict, due: float) -> None:
+            nonlocal in_flight, peak
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            lags.append(max(0.0, time.perf_counter() - due))
+
+            endpoint = replay_endpoint(entry)
+            call = ask_once if endpoint == "ask" else stream_once
+            params = {"priority": entry["priority"]} if entry.get("priority") is not None else {}
+            in_flight += 1
+            peak = max(peak, in_flight)
+            try:
+                sample = await call(client, replay_prompt(entry), params)
+            finally:
+                in_flight -= 1
+            sample["original_ms"] = entry.get("queue_wait_ms", 0) + entry.get("total_ms", 0)
+            samples.setdefault(endpoint, []).append(sample)
+            if not sample["ok"] and args.verbose:
+                print(f"  [{endpoint}] {sample.get('error')}", file=sys.stderr)
+
+        cpu_before = procstats.cpu_seconds(args.pid) if args.pid else 0.0
+        start = time.perf_counter()
+        speed = args.speed if args.speed > 0 else float("inf")
+        await asyncio.gather(*(
+            one(entry, start + (entry["arrived"] - first) / speed) for entry in entries
+        ))
+        wall = time.perf_counter() - start
+        cpu = procstats.cpu_seconds(args.pid) - cpu_before if args.pid else 0.0
+
+    total = sum(len(s) for s in samples.values())
+    levels = [
+        {
+            "endpoint": endpoint,
+            "concurrency": peak,
+            "samples": endpoint_samples,
+            "wall": wall,
+            # CPU split by request count, so cpu_per_req stays comparable
+            "cpu": cpu * len(endpoint_samples) / total,
+            "rss": procstats.rss_bytes(args.pid) if args.pid else 0,
+        }
+        for endpoint, endpoint_samples in samples.items()
+    ]
+    return levels, lags
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Replay a paki_api request journal.")
+    parser.add_argument("journal", help="journal file (PAKI_JOURNAL); rotated parts are read too")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="API base URL")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="time scale: 2 = twice as fast, 0 = all at once")
+    parser.add_argument("--endpoints", help="comma separated journal endpoints to replay (default: all)")
+    parser.add_argument("--limit", type=int, help="replay only the first N requests")
+    parser.add_argument("--max-connections", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--pid", type=int, help="API process id, for CPU and RSS of its process tree")
+    parser.add_argument("--use-cache", action="store_true", help="let the API answer from its response cache")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print individual failures")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    endpoints = set(args.endpoints.split(",")) if args.endpoints else None
+    entries = load_entries(args.journal, endpoints, args.limit)
+    if not entries:
+        print(f"No requests to replay in {args.journal}.")
+        return
+
+    span = entries[-1]["arrived"] - entries[0]["arrived"]
+    print(f"Replaying {len(entries)} requests spanning {span:.1f}s at speed {args.speed:g}...")
+    levels, lags = asyncio.run(replay(args, entries))
+    print_report([summarize(level) for level in levels])
+
+    print(f"\nschedule lag p50 {percentile(lags, 50) * 1000:.1f} ms, "
+          f"p95 {percentile(lags, 95) * 1000:.1f} ms (column 'conc' is peak in flight)")
+    for level in levels:
+        ok = [s for s in level["samples"] if s["ok"]]
+        original = [s["original_ms"] for s in ok]
+        replayed = [s["total"] * 1000 for s in ok]
+        print(f"{level['endpoint']:<12} original total p50 {percentile(original, 50):.0f} ms "
+              f"p95 {percentile(original, 95):.0f} ms | replay p50 {percentile(replayed, 50):.0f} ms "
+              f"p95 {percentile(replayed, 95):.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
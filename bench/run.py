@@ -0,0 +1,146 @@
+import os
+import sys
+import time
+import socket
+import asyncio
+import subprocess
+
+import httpx
+
+import procstats
+from bench.fake_server import serve
+from bench.load import build_parser, print_report, run
+
+# ============================================================
+# One-shot offline benchmark
+# ============================================================
+# Starts the fake chat page, launches paki_api against it (headless, no
+# auth.json) and drives it with bench.load. Run from the repo root:
+#
+#   python -m bench.run --rate 50 --length 1500 --concurrency 1,2,4
+#
+# With --pool N the API serves from N tabs of the fake page; the per-tab
+# figures from /stats are printed after the load:
+#
+#   python -m bench.run --pool 4 --concurrency 4,8 --sessions 4
+#
+# With --sessions it also checks session affinity end to end: every turn
+# of a conversation must be served by the same tab (X-Paki-Tab), else
+# the run fails. Conversation rotation is turned off for this, since a
+# fresh conversation may legitimately move to another tab.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def wait_for_port(host: str, port: int, process: subprocess.Popen, timeout: float) -> bool:
+    """
+    Waits until the API accepts connections (uvicorn only binds after the
+    lifespan warm-up finished) or the process exits.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def print_pool(url: str) -> None:
+    """
+    Per-tab occupancy and latency as reported by the API's /stats.
+    """
+    try:
+        pool = httpx.get(f"{url}/stats", timeout=5).json()["pool"]
+    except (httpx.HTTPError, ValueError, KeyError) as e:
+        print(f"Could not read pool stats: {e}")
+        return
+    print(f"\npool: {pool['size']} tabs, sticky hits {pool['sticky_hits']}, waits {pool['sticky_waits']}")
+    for tab in pool["tabs"]:
+        p50 = f"{tab['p50_seconds'] * 1000:.0f} ms" if tab["p50_seconds"] is not None else "-"
+        print(f"  tab {tab['tab']}: {tab['requests']} requests, {tab['failures']} failed, p50 {p50}")
+
+
+def main():
+    parser = build_parser()
+    parser.description = "Benchmark paki_api against a local fake chat page."
+    parser.add_argument("--api-port", type=int, default=8010)
+    parser.add_argument("--fake-port", type=int, default=8765)
+    parser.add_argument("--rate", type=float, default=50, help="fake tokens per second")
+    parser.add_argument("--length", type=int, default=1500, help="fake answer length (chars)")
+    parser.add_argument("--fail", type=float, default=0.0, help="fake failure rate [0..1]")
+    parser.add_argument("--stream-mode", default="push", choices=["push", "poll"])
+    parser.add_argument("--headed", action="store_true", help="show the browser window")
+    parser.add_argument("--no-block", action="store_true",
+                        help="disable resource/telemetry blocking (before/after comparison)")
+    parser.add_argument("--pool", type=int, default=1, help="chat tabs in the API's pool")
+    parser.add_argument("--api-log", help="write the API's output to this file")
+    parser.add_argument("--startup-timeout", type=float, default=90)
+    args = parser.parse_args()
+
+    fake = serve(port=args.fake_port)
+    chat_url = (
+        f"http://127.0.0.1:{args.fake_port}/"
+        f"?rate={args.rate}&length={args.length}&fail={args.fail}"
+    )
+
+    env = dict(
+        os.environ,
+        PAKI_CHAT_URL=chat_url,
+        PAKI_AUTH_FILE="",
+        PAKI_HEADLESS="0" if args.headed else "1",
+        PAKI_STREAM_MODE=args.stream_mode,
+        PAKI_POOL_SIZE=str(args.pool),
+    )
+    if args.no_block:
+        env.update(PAKI_BLOCK_RESOURCES="", PAKI_BLOCK_TELEMETRY="0")
+    if args.sessions:
+        env.update(PAKI_ROTATE_TURNS="0", PAKI_ROTATE_NODES="0", PAKI_ROTATE_HEAP_MB="0")
+    log = open(args.api_log, "w") if args.api_log else subprocess.DEVNULL
+    api = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "paki_api:app",
+         "--host", "127.0.0.1", "--port", str(args.api_port), "--log-level", "warning"],
+        cwd=ROOT,
+        env=env,
+        stdout=log,
+        stderr=subprocess.STDOUT,
+    )
+
+    try:
+        started = time.perf_counter()
+        if not wait_for_port("127.0.0.1", args.api_port, api, args.startup_timeout):
+            print("Error: paki_api did not start (use --api-log to see why).")
+            return
+        print(f"API ready in {time.perf_counter() - started:.1f}s "
+              f"(rss {procstats.rss_bytes(api.pid) / 1024 / 1024:.0f} MB), "
+              f"fake page: {chat_url}")
+
+        args.url = f"http://127.0.0.1:{args.api_port}"
+        args.pid = api.pid
+        args.expect_length = args.length if args.fail == 0 else args.expect_length
+        rows = asyncio.run(run(args))
+        print_report(rows)
+        print_pool(args.url)
+        # With --fail a broken page is replaced, which moves its sessions
+        if args.sessions and args.fail == 0:
+            moved = sum(row["moved"] for row in rows)
+            if moved:
+                print(f"\nsession affinity: FAILED, {moved} sessions changed tabs")
+                sys.exit(1)
+            print("\nsession affinity: ok")
+
+    finally:
+        api.terminate()
+        try:
+            api.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            api.kill()
+        fake.shutdown()
+        if log is not subprocess.DEVNULL:
+            log.close()
+
+
+if __name__ == "__main__":
+    main()
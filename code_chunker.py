@@ -0,0 +1,265 @@
+import ast
+import os
+import re
+import textwrap
+from dataclasses import dataclass
+
+# ============================================================
+# Splitting large source files into reviewable chunks
+# ============================================================
+# Python files are split on top-level statements (functions, classes
+# and the code between them), so every chunk is a syntactically whole
+# piece of the module. Anything else - or Python that does not parse -
+# falls back to fixed line windows.
+#
+# Chunks cover the file contiguously and in order: joining their text
+# reproduces the original source exactly, and stitch() puts the fixed
+# versions back together the same way.
+
+MAX_CHUNK_CHARS = int(os.getenv("CODE_DOCTOR_CHUNK_CHARS", "6000"))
+MAX_CONTEXT_CHARS = 2000
+
+# Lines kept as shared context for non-Python files
+IMPORT_LINE = re.compile(
+    r"^\s*(import\s|from\s\S+\s+import\s|#include\s|using\s|require\(|package\s|"
+    r"(const|let|var)\s+\w+\s*=\s*require\()"
+)
+
+
+@dataclass
+class Chunk:
+    start: int  # first line, 1-based
+    end: int    # last line, inclusive
+    text: str
+    label: str
+
+
+def split_lines(source: str) -> list[str]:
+    """
+    Lines with their endings. Splits on "\n" only, unlike
+    str.splitlines(), so indexes agree with ast line numbers.
+    """
+    lines = [line + "\n" for line in source.split("\n")]
+    lines[-1] = lines[-1][:-1]
+    return lines if lines[-1] else lines[:-1]
+
+
+def _node_start(node: ast.stmt) -> int:
+    """
+    First line of a statement, including its decorators.
+    """
+    lines = [node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])]
+    return min(lines)
+
+
+def _label(node: ast.stmt) -> str:
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        return f"def {node.name}"
+    if isinstance(node, ast.ClassDef):
+        return f"class {node.name}"
+    return "module code"
+
+
+def _python_segments(source: str, tree: ast.Module) -> list[Chunk]:
+    """
+    One segment per top-level statement. Blank lines and comments in
+    front of a statement belong to it, so nothing falls between segments.
+    """
+    lines = split_lines(source)
+    segments = []
+    start = 1
+    for i, node in enumerate(tree.body):
+        if i + 1 < len(tree.body):
+            end = _node_start(tree.body[i + 1]) - 1
+        else:
+            end = node.end_lineno
+        segments.append(Chunk(start, end, "".join(lines[start - 1:end]), _label(node)))
+        start = end + 1
+    if start <= len(lines):
+        # Trailing comments after the last statement
+        segments.append(Chunk(start, len(lines), "".join(lines[start - 1:]), "module code"))
+    return segments
+
+
+def python_segments(source: str) -> list[Chunk] | None:
+    """
+    The top-level statements of a Python file as contiguous segments,
+    or None if it does not parse.
+    """
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return None
+    return _python_segments(source, tree) if tree.body else None
+
+
+def _merge(segments: list[Chunk], max_chars: int) -> list[Chunk]:
+    """
+    Packs neighbouring segments into chunks of up to max_chars. A single
+    segment that is larger on its own is split into line windows.
+    """
+    chunks: list[Chunk] = []
+    for seg in segments:
+        if len(seg.text) > max_chars:
+            for w in line_windows(seg.text, max_chars):
+                start, end = w.start + seg.start - 1, w.end + seg.start - 1
+                chunks.append(Chunk(start, end, w.text, f"{seg.label} (lines {start}-{end})"))
+            continue
+        last = chunks[-1] if chunks else None
+        if last is not None and len(last.text) + len(seg.text) <= max_chars:
+            label = last.label if last.label.endswith(seg.label) else f"{last.label}, {seg.label}"
+            chunks[-1] = Chunk(last.start, seg.end, last.text + seg.text, label)
+        else:
+            chunks.append(seg)
+    return chunks
+
+
+def line_windows(source: str, max_chars: int = MAX_CHUNK_CHARS) -> list[Chunk]:
+    """
+    Language-agnostic fallback: consecutive line ranges of up to
+    max_chars each. Prefers to break at a blank line in the second half
+    of a window so functions are cut less often.
+    """
+    lines = split_lines(source)
+    chunks = []
+    i = 0
+    while i < len(lines):
+        size = 0
+        j = i
+        while j < len(lines) and (j == i or size + len(lines[j]) <= max_chars):
+            size += len(lines[j])
+            j += 1
+        if j < len(lines):
+            for k in range(j - 1, i + (j - i) // 2, -1):
+                if not lines[k].strip():
+                    j = k + 1
+                    break
+        chunks.append(Chunk(i + 1, j, "".join(lines[i:j]), f"lines {i + 1}-{j}"))
+        i = j
+    return chunks
+
+
+def split_source(source: str, filename: str = "", max_chars: int = MAX_CHUNK_CHARS) -> list[Chunk]:
+    """
+    Returns the chunks of `source`; a single chunk when it is small enough.
+    """
+    lines = split_lines(source)
+    if len(source) <= max_chars:
+        return [Chunk(1, len(lines), source, "whole file")]
+
+    if filename.endswith((".py", ".pyw")) or not filename:
+        try:
+            tree = ast.parse(source)
+        except SyntaxError:
+            tree = None
+        if tree is not None and tree.body:
+            return _merge(_python_segments(source, tree), max_chars)
+
+    return line_windows(source, max_chars)
+
+
+def shared_context(source: str, filename: str = "", max_chars: int = MAX_CONTEXT_CHARS) -> str:
+    """
+    What every chunk needs to make sense on its own: the imports, plus
+    (for Python) module-level names and an outline of the top-level
+    functions and classes. Trimmed to max_chars.
+    """
+    lines = split_lines(source)
+    parts = []
+    try:
+        tree = ast.parse(source) if filename.endswith((".py", ".pyw")) or not filename else None
+    except SyntaxError:
+        tree = None
+
+    if tree is not None:
+        for node in tree.body:
+            segment = "".join(lines[node.lineno - 1:node.end_lineno]).rstrip()
+            if isinstance(node, (ast.Import, ast.ImportFrom)):
+                parts.append(segment)
+            elif isinstance(node, (ast.Assign, ast.AnnAssign)) and node.end_lineno == node.lineno:
+                parts.append(segment)
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                parts.append(lines[node.lineno - 1].rstrip() + " ...")
+    else:
+        parts = [line.rstrip() for line in lines if IMPORT_LINE.match(line)]
+
+    context = ""
+    for part in parts:
+        if len(context) + len(part) + 1 > max_chars:
+            break
+        context += part + "\n"
+    return context
+
+
+def _blank_edges(text: str) -> tuple[int, int]:
+    lines = text.split("\n")
+    lead = 0
+    while lead < len(lines) and not lines[lead].strip():
+        lead += 1
+    trail = 0
+    while trail < len(lines) - lead and not lines[-1 - trail].strip():
+        trail += 1
+    return lead, trail
+
+
+def _common_indent(text: str) -> str:
+    indents = [re.match(r"[ \t]*", line).group() for line in text.split("\n") if line.strip()]
+    return min(indents, key=len) if indents else ""
+
+
+def _fit(chunk: Chunk, new: str) -> str:
+    """
+    A fixed chunk laid out like the original: its blank lines around it
+    restored and, if the model returned it dedented, its indentation.
+    """
+    lead, trail = _blank_edges(chunk.text)
+    body = new.strip("\n")
+    # A window that starts inside a class or function often comes back
+    # dedented to column 0; shift the whole body back, not only line 1
+    indent = _common_indent(chunk.text)
+    if len(_common_indent(body)) < len(indent):
+        body = textwrap.indent(textwrap.dedent(body), indent)
+    # `trail` counts the empty string after the final newline too
+    ending = "\n" * max(trail, 1) if chunk.text.endswith("\n") else "\n" * max(trail - 1, 0)
+    return "\n" * lead + body + ending
+
+
+def _parses(source: str) -> bool:
+    try:
+        ast.parse(source)
+        return True
+    except (SyntaxError, ValueError):
+        return False
+
+
+def stitch(chunks: list[Chunk], fixed: list[str | None], filename: str = "") -> str:
+    """
+    Joins the fixed chunks in the original order. A chunk without a
+    fixed version (the model returned no code) is kept as it was. The
+    blank lines around each chunk are restored so the layout between
+    functions survives the round-trip.
+
+    For Python (a .py `filename`, or none given and the original parses)
+    the result must still parse: a fixed chunk that breaks it is dropped
+    and its original kept.
+    """
+    original = [chunk.text for chunk in chunks]
+    fitted = [
+        _fit(chunk, new) if new and new.strip() else None
+        for chunk, new in zip(chunks, fixed)
+    ]
+    out = [new if new is not None else text for new, text in zip(fitted, original)]
+
+    python = filename.endswith((".py", ".pyw")) or not filename
+    if not python or _parses("".join(out)) or not _parses("".join(original)):
+        return "".join(out)
+
+    # Accept the fixed chunks one by one, each only if it keeps the file valid
+    out = list(original)
+    for i, new in enumerate(fitted):
+        if new is None:
+            continue
+        trial = out[:i] + [new] + out[i + 1:]
+        if _parses("".join(trial)):
+            out = trial
+    return "".join(out)
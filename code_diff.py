@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import difflib
+import hashlib
+from dataclasses import dataclass
+
+from code_chunker import MAX_CHUNK_CHARS, Chunk, python_segments, split_lines, stitch
+
+# ============================================================
+# Incremental (diff-based) review for Code Doctor re-runs
+# ============================================================
+# After a review, the file as it was reviewed and the fixed version that
+# came back are kept as a snapshot in .code_doctor/snapshots, keyed by
+# the file's path relative to the directory holding .code_doctor (the
+# batch root), so single-file and batch runs share them. On the next
+# run the current file is diffed (difflib) against whichever of the two
+# it is closer to - the user may or may not have adopted the fix - and
+# only the changed regions are sent, each with a little context:
+#
+#   - Python: the whole top-level function / class / statement that a
+#     change touches, when it fits one prompt
+#   - otherwise: CONTEXT_LINES lines above and below the change
+#
+# The regions and the unchanged code between them cover the file in
+# order, so stitch() merges the fixed regions back into the current
+# file. When the regions add up to more than MAX_DIFF_RATIO of the file,
+# a diff review would not save much: diff_plan() returns None and the
+# caller reviews the whole file.
+
+CONTEXT_LINES = 3
+MAX_DIFF_RATIO = float(os.getenv("CODE_DOCTOR_DIFF_RATIO", "0.5"))
+STATE_DIR = ".code_doctor"
+
+
+class SnapshotStore:
+    """
+    Last reviewed version of each file under `root`, one JSON file per
+    source file, in <root>/.code_doctor unless `state_dir` says otherwise.
+    """
+
+    def __init__(self, root: str, state_dir: str | None = None):
+        self.root = os.path.abspath(root)
+        self.directory = os.path.join(state_dir or os.path.join(self.root, STATE_DIR), "snapshots")
+
+    @classmethod
+    def for_file(cls, file_path: str) -> "SnapshotStore":
+        """
+        The store of the closest directory above the file that has one
+        (e.g. the root of a batch run), else of the file's own directory.
+        """
+        start = directory = os.path.dirname(os.path.abspath(file_path))
+        while not os.path.isdir(os.path.join(directory, STATE_DIR)):
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                return cls(start)
+            directory = parent
+        return cls(directory)
+
+    def key(self, file_path: str) -> str:
+        return os.path.relpath(os.path.abspath(file_path), self.root).replace(os.sep, "/")
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.directory, f"{os.path.basename(key)}-{digest}.json")
+
+    def load(self, file_path: str) -> dict | None:
+        try:
+            with open(self._path(self.key(file_path)), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, file_path: str, reviewed: str, fixed: str | None) -> None:
+        """Atomic write, like the batch manifest."""
+        os.makedirs(self.directory, exist_ok=True)
+        key = self.key(file_path)
+        path = self._path(key)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"file": key, "time": round(time.time()), "reviewed": reviewed, "fixed": fixed}, f)
+        os.replace(tmp, path)
+
+
+@dataclass
+class DiffPlan:
+    chunks: list[Chunk]  # the whole current file, in order
+    changed: list[int]   # indexes of the chunks to review
+    baseline: str        # "reviewed" or "fixed": what the file was diffed against
+    filename: str = ""
+
+    @property
+    def regions(self) -> list[Chunk]:
+        return [self.chunks[i] for i in self.changed]
+
+    @property
+    def changed_chars(self) -> int:
+        return sum(len(chunk.text) for chunk in self.regions)
+
+    def merge(self, fixed_regions: list[str | None]) -> str:
+        """
+        The current file with each changed region replaced by its fixed
+        version (a region without one is kept as it is).
+        """
+        fixed = [None] * len(self.chunks)
+        for index, code in zip(self.changed, fixed_regions):
+            fixed[index] = code
+        return stitch(self.chunks, fixed, self.filename)
+
+
+def changed_ranges(old: str, new: str) -> list[tuple[int, int]]:
+    """
+    Line ranges of `new` (0-based, end exclusive) that differ from
+    `old`. A pure deletion is an empty range where the lines were.
+    """
+    matcher = difflib.SequenceMatcher(None, split_lines(old), split_lines(new), autojunk=False)
+    return [(j1, j2) for tag, _, _, j1, j2 in matcher.get_opcodes() if tag != "equal"]
+
+
+def _widen(ranges: list[tuple[int, int]], source: str, filename: str, context: int) -> list[tuple[int, int]]:
+    """
+    Grows each range to its enclosing top-level statements (Python) or
+    by `context` lines, then merges ranges that overlap or touch.
+    """
+    count = len(split_lines(source))
+    segments = python_segments(source) if filename.endswith((".py", ".pyw")) or not filename else None
+    widened = []
+    for start, end in ranges:
+        # A deletion is reviewed together with the line after it
+        end = max(end, min(start + 1, count))
+        grown = None
+        if segments:
+            touched = [s for s in segments if s.start - 1 < end and s.end > start]
+            if touched and sum(len(s.text) for s in touched) <= MAX_CHUNK_CHARS:
+                grown = (touched[0].start - 1, touched[-1].end)
+        widened.append(grown or (max(0, start - context), min(count, end + context)))
+
+    merged: list[tuple[int, int]] = []
+    for start, end in sorted(widened):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _plan(current: str, previous: str, filename: str, context: int, baseline: str) -> DiffPlan:
+    lines = split_lines(current)
+    chunks: list[Chunk] = []
+    changed = []
+    position = 0
+    for start, end in _widen(changed_ranges(previous, current), current, filename, context):
+        if start > position:
+            chunks.append(Chunk(position + 1, start, "".join(lines[position:start]), "unchanged"))
+        changed.append(len(chunks))
+        chunks.append(Chunk(start + 1, end, "".join(lines[start:end]), f"lines {start + 1}-{end}"))
+        position = end
+    if position < len(lines):
+        chunks.append(Chunk(position + 1, len(lines), "".join(lines[position:]), "unchanged"))
+    return DiffPlan(chunks, changed, baseline, filename)
+
+
+def diff_plan(
+    current: str,
+    snapshot: dict | None,
+    filename: str = "",
+    context: int = CONTEXT_LINES,
+    max_ratio: float = MAX_DIFF_RATIO,
+) -> DiffPlan | None:
+    """
+    The regions of `current` to review since the snapshot, or None when
+    the whole file should be reviewed (no snapshot, or too much changed).
+    A plan without changed regions means nothing changed.
+    """
+    if not snapshot or not current:
+        return None
+    plans = [
+        _plan(current, snapshot[baseline], filename, context, baseline)
+        for baseline in ("reviewed", "fixed")
+        if snapshot.get(baseline)
+    ]
+    if not plans:
+        return None
+    plan = min(plans, key=lambda p: p.changed_chars)
+    if plan.changed_chars > max_ratio * len(current):
+        return None
+    return plan
@@ -2,6 +2,104 @@ import httpx
 import os
 import sys
 
+from code_chunker import shared_context, split_source, stitch
+from code_diff import SnapshotStore, diff_plan
+from fence_parser import BlockFileWriter, FenceParser, extract_blocks
+from paki_client import DEFAULT_URL, PakiClient, PakiError
+
+API_URL = DEFAULT_URL
+
+def build_prompt(content):
+    """Builds the review prompt for one file's source code."""
+    return (
+        f"Act as a Senior Software Engineer. I am going to provide you with a code file. "
+        f"Your goals are:\n"
+        f"1. Fix any bugs.\n"
+        f"2. Optimize performance.\n"
+        f"3. Improve readability (add comments where necessary).\n"
+        f"4. Provide the FULL fixed code inside a markdown code block.\n"
+        f"5. Briefly explain the changes after the code.\n\n"
+        f"Here is the code content:\n"
+        f"```\n{content}\n```"
+    )
+
+def build_chunk_prompt(chunk, context, index, total, filename=""):
+    """Builds the review prompt for one chunk of a file too big for a single prompt."""
+    name = f" of `{filename}`" if filename else ""
+    return (
+        f"Act as a Senior Software Engineer. I am reviewing a large file{name} "
+        f"in parts. This is part {index} of {total} ({chunk.label}, "
+        f"lines {chunk.start}-{chunk.end}).\n"
+        f"Your goals are:\n"
+        f"1. Fix any bugs in THIS PART.\n"
+        f"2. Optimize performance.\n"
+        f"3. Improve readability (add comments where necessary).\n"
+        f"4. Provide the FULL fixed version of this part only inside one markdown code block. "
+        f"Keep its names and signatures so it still fits the rest of the file.\n"
+        f"5. Briefly explain the changes after the code.\n\n"
+        f"Context from the rest of the file (read only, do not repeat it):\n"
+        f"```\n{context}```\n\n"
+        f"Here is the part to fix:\n"
+        f"```\n{chunk.text.rstrip()}\n```"
+    )
+
+def build_diff_prompt(region, context, index, total, filename=""):
+    """Builds the review prompt for one region that changed since the file was last reviewed."""
+    name = f" `{filename}`" if filename else " a file"
+    return (
+        f"Act as a Senior Software Engineer. I reviewed{name} before and have edited it since. "
+        f"This is changed region {index} of {total} (lines {region.start}-{region.end}), "
+        f"with a few unchanged lines around the edit.\n"
+        f"Your goals are:\n"
+        f"1. Fix any bugs in THIS REGION.\n"
+        f"2. Optimize performance.\n"
+        f"3. Improve readability (add comments where necessary).\n"
+        f"4. Provide the FULL fixed version of exactly these lines inside one markdown code block. "
+        f"Keep its names, signatures and indentation so it still fits the rest of the file.\n"
+        f"5. Briefly explain the changes after the code.\n\n"
+        f"Context from the rest of the file (read only, do not repeat it):\n"
+        f"```\n{context}```\n\n"
+        f"Here is the region to fix:\n"
+        f"```\n{region.text.rstrip()}\n```"
+    )
+
+def extract_code(response):
+    """Returns the largest markdown code block in the response, or ""."""
+    # We assume the largest block is the main code
+    blocks = [b for b in extract_blocks(response) if b.closed]
+    if not blocks:
+        return ""
+    return max(blocks, key=lambda b: len(b.code)).code.strip("\n")
+
+def stream_answer(client, prompt, writer=None):
+    """
+    Streams one answer from /chat_stream to the terminal through a
+    FenceParser (code blocks are picked out as they complete; `writer`
+    gets them on disk while the answer is still arriving).
+    Returns the parser, or None on an API error.
+    """
+    parser = FenceParser(*((writer.on_line, writer.on_block) if writer else ()))
+    try:
+        for chunk in client.stream(prompt):
+            print(chunk, end="", flush=True)
+            parser.feed(chunk)
+    except PakiError as e:
+        if e.status is None:
+            # The generation failed after the answer started
+            print(f"\nError: {e}")
+            return None
+        # Refused even after the client's retries (busy, not logged in...)
+        print(f"Error: API returned status code {e.status}")
+        print(e)
+        return None
+    parser.close()
+    return parser
+
+def best_code(parser):
+    """Largest complete code block of a streamed answer, or ""."""
+    block = parser.largest()
+    return block.code.strip("\n") if block else ""
+
 def main():
     print("==========================================")
     print("       🚑 CODE DOCTOR: AUTO-FIXER 🚑      ")
@@ -22,65 +120,93 @@ def main():
         print(f"Error reading file: {e}")
         return
 
-    # 3. Construct the prompt
+    # 3. Re-runs review only what changed since the last review (--full
+    #    for the whole file); big files are split into parts that each
+    #    fit one prompt
     print(f"\nReading '{os.path.basename(file_path)}' ({len(content)} characters)...")
-    prompt = (
-        f"Act as a Senior Software Engineer. I am going to provide you with a code file. "
-        f"Your goals are:\n"
-        f"1. Fix any bugs.\n"
-        f"2. Optimize performance.\n"
-        f"3. Improve readability (add comments where necessary).\n"
-        f"4. Provide the FULL fixed code inside a markdown code block.\n"
-        f"5. Briefly explain the changes after the code.\n\n"
-        f"Here is the code content:\n"
-        f"```\n{content}\n```"
-    )
+    snapshots = SnapshotStore.for_file(file_path)
+    plan = None if "--full" in sys.argv[1:] else diff_plan(content, snapshots.load(file_path), file_path)
+    if plan is not None and not plan.changed:
+        print("No changes since the last review (run with --full to review it again).")
+        return
+
+    if plan is not None:
+        chunks = plan.regions
+        context = shared_context(content, file_path)
+        prompts = [
+            build_diff_prompt(region, context, i, len(chunks), os.path.basename(file_path))
+            for i, region in enumerate(chunks, 1)
+        ]
+        print(f"Changed since the last review: {len(chunks)} region(s), "
+              f"{plan.changed_chars} of {len(content)} characters.")
+    else:
+        chunks = split_source(content, file_path)
+        if len(chunks) == 1:
+            prompts = [build_prompt(content)]
+        else:
+            context = shared_context(content, file_path)
+            prompts = [
+                build_chunk_prompt(chunk, context, i, len(chunks), os.path.basename(file_path))
+                for i, chunk in enumerate(chunks, 1)
+            ]
+            print(f"Large file: reviewing it in {len(chunks)} parts.")
+
+    # Single-prompt fixes are written to disk while they stream in
+    base, ext = os.path.splitext(file_path)
+    new_filename = f"{base}_doctor_fixed{ext}"
+    writer = BlockFileWriter(new_filename) if plan is None and len(prompts) == 1 else None
+    if writer:
+        print(f"(The fix is written to '{new_filename}' as soon as its code block completes.)")
 
     print("\n--- contacting ChatGPT (Streaming Response) ---\n")
     
-    full_response = ""
+    fixed_parts = []
+    client = PakiClient(API_URL)
     
     try:
-        # 4. Stream the response from the local API
-        with httpx.stream("GET", "http://127.0.0.1:8000/chat_stream", params={"prompt": prompt}, timeout=300) as r:
-            if r.status_code != 200:
-                print(f"Error: API returned status code {r.status_code}")
-                # Try to print error message if available
-                print(r.read().decode())
+        # 4. Stream each response from the local API (one kept-alive connection)
+        for i, prompt in enumerate(prompts):
+            if len(prompts) > 1:
+                print(f"\n\n=== Part {i + 1}/{len(prompts)}: {chunks[i].label} ===\n")
+            parser = stream_answer(client, prompt, writer)
+            if parser is None:
                 return
-                
-            for chunk in r.iter_text():
-                print(chunk, end="", flush=True)
-                full_response += chunk
+            # 5. Code blocks were extracted while streaming
+            fixed_parts.append(best_code(parser))
                 
         print("\n\n------------------------------------------")
         print("          Analysis Complete")
         print("------------------------------------------")
         
-        # 5. Extract Code Block logic
-        import re
-        code_blocks = re.findall(r'```(?:\w+)?\n(.*?)```', full_response, re.DOTALL)
-        
-        extracted_code = ""
-        if code_blocks:
-            # We assume the first or largest block is the main code
-            # Let's join them just in case, or pick the largest
-            extracted_code = max(code_blocks, key=len).strip()
+        if plan is not None:
+            missing = sum(1 for part in fixed_parts if not part)
+            if missing:
+                print(f"Warning: {missing} region(s) came back without code; keeping the current code there.")
+            # Fixed regions go back into the current file
+            extracted_code = plan.merge(fixed_parts) if missing < len(chunks) else ""
+        elif len(chunks) == 1:
+            extracted_code = fixed_parts[0]
         else:
+            missing = sum(1 for part in fixed_parts if not part)
+            if missing:
+                print(f"Warning: {missing} part(s) came back without code; keeping the original there.")
+            # Parts without code keep their original text
+            extracted_code = stitch(chunks, fixed_parts, file_path) if missing < len(chunks) else ""
+        if not extracted_code:
             # Fallback for when GPT forgets the code blocks
             print("Warning: No markdown code blocks found in response.")
         
-        # 6. Offer to save
+        # 6. Offer to save (keep or drop what was already written)
         if extracted_code:
+            # The next run diffs against this review
+            snapshots.save(file_path, content, extracted_code)
             save = input("\nDo you want to save the FIXED CODE to a file? (y/n): ").strip().lower()
             if save == 'y':
-                # Create a suggested filename
-                base, ext = os.path.splitext(file_path)
-                new_filename = f"{base}_doctor_fixed{ext}" 
-                
                 with open(new_filename, "w", encoding="utf-8") as f:
                     f.write(extracted_code)
                 print(f"✅ Success! Fixed code saved to: {new_filename}")
+            elif writer:
+                writer.discard()
         else:
             print("No code to save found.")
             
@@ -89,6 +215,10 @@ def main():
         print("Make sure 'python paki_api.py' is running in another terminal!")
     except Exception as e:
         print(f"\nAn error occurred: {e}")
+    finally:
+        client.close()
+        if writer:
+            writer.discard_partial()
 
 if __name__ == "__main__":
     main()
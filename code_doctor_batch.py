@@ -0,0 +1,271 @@
+import argparse
+import asyncio
+import fnmatch
+import hashlib
+import json
+import os
+import time
+
+import httpx
+
+from code_chunker import shared_context, split_source, stitch
+from code_diff import SnapshotStore, diff_plan
+from code_doctor import API_URL, build_chunk_prompt, build_diff_prompt, build_prompt, extract_code
+from paki_client import AsyncPakiClient, RetryPolicy
+
+# ============================================================
+# Code Doctor batch mode: whole directory trees
+# ============================================================
+# Walks a directory, sends every matching file through a bounded
+# concurrent pipeline and writes the fixed files to a mirror tree.
+#
+# A manifest (content hash + result per file) is saved after every
+# file, so re-runs skip unchanged files and an interrupted run resumes
+# where it stopped. Files too big for one prompt are split into parts
+# (see code_chunker) that are reviewed concurrently and stitched back.
+# A file that changed since its last review only has its changed regions
+# reviewed (see code_diff), unless --full-review is given.
+#
+#   python code_doctor_batch.py src --include "*.py" --concurrency 4
+#
+
+DEFAULT_EXCLUDES = [
+    ".git", ".code_doctor", "__pycache__", "venv", ".venv",
+    "node_modules", "chrome_profile", "*_doctor_fixed*",
+]
+MAX_RETRIES = 5
+
+
+def sha256_text(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))]
+
+
+def matches(path, patterns):
+    """True if the relative path or any of its parts matches a glob."""
+    parts = path.replace(os.sep, "/").split("/")
+    return any(
+        fnmatch.fnmatch(path, pattern) or any(fnmatch.fnmatch(part, pattern) for part in parts)
+        for pattern in patterns
+    )
+
+
+def collect_files(root, includes, excludes):
+    """Returns sorted relative paths under root that pass the globs."""
+    found = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        rel_dir = os.path.relpath(dirpath, root)
+        # Prune excluded directories instead of walking into them
+        dirnames[:] = [
+            d for d in dirnames
+            if not matches(os.path.normpath(os.path.join(rel_dir, d)), excludes)
+        ]
+        for name in filenames:
+            rel = os.path.normpath(os.path.join(rel_dir, name))
+            if matches(rel, excludes):
+                continue
+            if any(fnmatch.fnmatch(name, p) or fnmatch.fnmatch(rel, p) for p in includes):
+                found.append(rel)
+    return sorted(found)
+
+
+def load_manifest(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(path, manifest):
+    """Atomic write, so a crash mid-save never corrupts the checkpoint."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+async def process_file(rel, args, client, semaphore, manifest, lock):
+    src = os.path.join(args.root, rel)
+    try:
+        with open(src, "r", encoding="utf-8") as f:
+            content = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        print(f"❌ {rel} (unreadable: {e})")
+        return {"file": rel, "status": "unreadable"}
+    digest = sha256_text(content)
+
+    previous = manifest.get(rel)
+    if not args.force and previous and previous["sha256"] == digest and previous["status"] != "failed":
+        return {"file": rel, "status": "skipped"}
+
+    started = None
+    entry = {"sha256": digest, "status": "failed", "output": None}
+    plan = diff_plan(content, args.snapshots.load(src), rel)
+    if plan is not None and not plan.changed and not args.force:
+        # Same as what was last reviewed, or as its fix (adopted since):
+        # remember the new hash so the next run skips it right away
+        if previous:
+            async with lock:
+                manifest[rel] = {**previous, "sha256": digest}
+                save_manifest(args.manifest, manifest)
+        return {"file": rel, "status": "skipped"}
+    if args.full_review or (plan is not None and not plan.changed):
+        # --force on a file unchanged since its review: review it whole
+        plan = None
+    chunks = plan.regions if plan is not None else split_source(content, rel)
+    if plan is not None:
+        context = shared_context(content, rel)
+        prompts = [
+            build_diff_prompt(region, context, i, len(chunks), rel)
+            for i, region in enumerate(chunks, 1)
+        ]
+        entry["regions"] = len(chunks)
+    elif len(chunks) == 1:
+        prompts = [build_prompt(content)]
+    else:
+        context = shared_context(content, rel)
+        prompts = [
+            build_chunk_prompt(chunk, context, i, len(chunks), rel)
+            for i, chunk in enumerate(chunks, 1)
+        ]
+        entry["chunks"] = len(chunks)
+
+    async def review_part(prompt):
+        nonlocal started
+        async with semaphore:
+            # Latency is measured from the first part leaving the queue
+            started = started or time.perf_counter()
+            # The client retries 429 (after Retry-After) and 5xx by itself
+            return extract_code(await client.ask(prompt, timeout=args.timeout))
+
+    try:
+        parts = await asyncio.gather(*(review_part(p) for p in prompts))
+        if plan is not None:
+            # Fixed regions go back into the current file
+            fixed = plan.merge(parts).rstrip("\n") if any(parts) else ""
+        elif len(chunks) > 1 and any(parts):
+            # Parts that came back without code keep their original text
+            fixed = stitch(chunks, parts, rel).rstrip("\n")
+        else:
+            fixed = parts[0] if len(chunks) == 1 else ""
+        if fixed:
+            out = os.path.join(args.out, rel)
+            os.makedirs(os.path.dirname(out), exist_ok=True)
+            with open(out, "w", encoding="utf-8") as f:
+                f.write(fixed + "\n")
+            entry.update(status="fixed", output=os.path.relpath(out, args.root))
+            args.snapshots.save(src, content, fixed + "\n")
+        else:
+            entry["status"] = "no_code"
+    except (httpx.HTTPError, RuntimeError, ValueError) as e:
+        entry["error"] = str(e)
+    entry["seconds"] = round(time.perf_counter() - (started or time.perf_counter()), 2)
+
+    async with lock:
+        manifest[rel] = entry
+        save_manifest(args.manifest, manifest)
+
+    icon = {"fixed": "✅", "no_code": "⚠️", "failed": "❌"}[entry["status"]]
+    print(f"{icon} {rel} ({entry['seconds']}s) {entry.get('error', '')}".rstrip(), flush=True)
+    return {"file": rel, **entry}
+
+
+async def run(args):
+    files = collect_files(args.root, args.include, args.exclude)
+    manifest = load_manifest(args.manifest)
+    print(f"Found {len(files)} files, concurrency {args.concurrency}.\n")
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    lock = asyncio.Lock()
+    started = time.perf_counter()
+
+    async with AsyncPakiClient(
+        args.api, timeout=args.timeout + 30, retry=RetryPolicy(retries=MAX_RETRIES),
+        max_connections=args.concurrency,
+    ) as client:
+        results = await asyncio.gather(*(
+            process_file(rel, args, client, semaphore, manifest, lock) for rel in files
+        ))
+
+    return results, time.perf_counter() - started
+
+
+def report(results, wall, path):
+    """Prints the summary and writes it as JSON next to the manifest."""
+    counts = {}
+    for r in results:
+        counts[r["status"]] = counts.get(r["status"], 0) + 1
+    latencies = [r["seconds"] for r in results if "seconds" in r]
+    processed = len(latencies)
+
+    summary = {
+        "files": len(results),
+        "counts": counts,
+        "wall_seconds": round(wall, 2),
+        "files_per_minute": round(processed / wall * 60, 2) if wall and processed else 0.0,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "latency_max": max(latencies, default=0.0),
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+
+    print("\n------------------------------------------")
+    print("          Batch Complete")
+    print("------------------------------------------")
+    print("  " + ", ".join(f"{k}: {v}" for k, v in sorted(counts.items())))
+    print(f"  Wall time: {summary['wall_seconds']}s, "
+          f"throughput: {summary['files_per_minute']} files/min")
+    print(f"  Per-file latency: p50 {summary['latency_p50']}s, "
+          f"p95 {summary['latency_p95']}s, max {summary['latency_max']}s")
+    print(f"  Report: {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="🚑 Code Doctor batch mode for directory trees.")
+    parser.add_argument("root", help="directory to review")
+    parser.add_argument("--include", action="append", help='glob, repeatable (default "*.py")')
+    parser.add_argument("--exclude", action="append", default=[], help="glob, repeatable")
+    parser.add_argument("--concurrency", type=int, default=4, help="files in flight at once")
+    parser.add_argument("--out", help="where fixed files go (default <root>/_doctor_fixed)")
+    parser.add_argument("--state-dir", help="manifest and report location (default <root>/.code_doctor)")
+    parser.add_argument("--api", default=API_URL, help="Paki API base URL")
+    parser.add_argument("--timeout", type=float, default=300, help="per-file deadline in seconds")
+    parser.add_argument("--force", action="store_true", help="re-review unchanged files")
+    parser.add_argument("--full-review", action="store_true",
+                        help="send whole files even if only parts changed since the last review")
+    args = parser.parse_args()
+
+    args.root = os.path.abspath(args.root)
+    args.include = args.include or ["*.py"]
+    args.exclude = DEFAULT_EXCLUDES + args.exclude
+    args.out = os.path.abspath(args.out or os.path.join(args.root, "_doctor_fixed"))
+    state_dir = os.path.abspath(args.state_dir or os.path.join(args.root, ".code_doctor"))
+    os.makedirs(state_dir, exist_ok=True)
+    args.manifest = os.path.join(state_dir, "manifest.json")
+    args.snapshots = SnapshotStore(args.root, state_dir)
+
+    # Keep our own output out of the walk
+    args.exclude.append(os.path.relpath(args.out, args.root))
+
+    print("==========================================")
+    print("     🚑 CODE DOCTOR: BATCH MODE 🚑        ")
+    print("==========================================")
+    try:
+        results, wall = asyncio.run(run(args))
+    except KeyboardInterrupt:
+        print("\nInterrupted. Progress is saved; re-run to resume.")
+        return
+    report(results, wall, os.path.join(state_dir, "report.json"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import os
+import re
+from dataclasses import dataclass
+from typing import Callable
+
+# ============================================================
+# Incremental markdown code-fence parser
+# ============================================================
+# Consumes a streamed answer chunk by chunk (chunks may end anywhere,
+# mid-line included) and reports every fenced code block the moment its
+# closing fence arrives, instead of running a regex over the whole text
+# after the stream ended. Each chunk is looked at once, so the cost is
+# linear in the answer length.
+#
+#   parser = FenceParser()
+#   for chunk in stream:
+#       for block in parser.feed(chunk):
+#           print(block.lang, len(block.code))
+#   parser.close()
+#   best = parser.largest()
+
+# Opening fence: up to 3 spaces, 3+ backticks or tildes, optional info string
+FENCE_OPEN = re.compile(r"^ {0,3}(`{3,}|~{3,})[ \t]*([^`\s]*)[^`]*$")
+
+
+@dataclass
+class CodeBlock:
+    index: int
+    lang: str
+    code: str
+    closed: bool = True
+
+
+class FenceParser:
+    """
+    on_line(lang, line) is called for every code line as soon as the
+    line is complete; on_block(block) for every finished block.
+    """
+
+    def __init__(
+        self,
+        on_line: Callable[[str, str], None] | None = None,
+        on_block: Callable[[CodeBlock], None] | None = None,
+    ):
+        self.on_line = on_line
+        self.on_block = on_block
+        self.blocks: list[CodeBlock] = []
+        self._parts: list[str] = []
+        self._pending = ""
+        self._fence: str | None = None
+        self._lang = ""
+        self._lines: list[str] = []
+
+    @property
+    def text(self) -> str:
+        """
+        Everything fed so far.
+        """
+        if len(self._parts) > 1:
+            self._parts = ["".join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+    @property
+    def in_block(self) -> bool:
+        return self._fence is not None
+
+    @property
+    def current(self) -> CodeBlock | None:
+        """
+        The block being streamed right now (closed=False), for previews.
+        """
+        if self._fence is None:
+            return None
+        code = "".join(self._lines)
+        if self._pending and not self._is_close(self._pending):
+            code += self._pending
+        return CodeBlock(len(self.blocks), self._lang, code.rstrip("\n"), closed=False)
+
+    def feed(self, chunk: str) -> list[CodeBlock]:
+        """
+        Consumes one chunk; returns the blocks it completed.
+        """
+        if not chunk:
+            return []
+        self._parts.append(chunk)
+        data = self._pending + chunk
+        lines = data.split("\n")
+        self._pending = lines.pop()
+        done = []
+        for line in lines:
+            block = self._line(line)
+            if block is not None:
+                done.append(block)
+        return done
+
+    def close(self) -> list[CodeBlock]:
+        """
+        Flushes the last line. A block still open at the end of the
+        answer (truncated stream) is returned with closed=False.
+        """
+        done = []
+        if self._pending:
+            line, self._pending = self._pending, ""
+            block = self._line(line)
+            if block is not None:
+                done.append(block)
+        if self._fence is not None:
+            done.append(self._finish(closed=False))
+        return done
+
+    def largest(self, include_open: bool = False) -> CodeBlock | None:
+        """
+        The longest block; by convention the main code of the answer.
+        Blocks cut off by the end of the stream only count on request.
+        """
+        candidates = [b for b in self.blocks if b.closed or include_open]
+        if include_open and self.current is not None:
+            candidates.append(self.current)
+        return max(candidates, key=lambda b: len(b.code), default=None)
+
+    def _is_close(self, line: str) -> bool:
+        stripped = line.strip()
+        return (
+            len(line) - len(line.lstrip(" ")) <= 3
+            and stripped.startswith(self._fence)
+            and set(stripped) == {self._fence[0]}
+        )
+
+    def _line(self, line: str) -> CodeBlock | None:
+        line = line.rstrip("\r")
+        if self._fence is None:
+            match = FENCE_OPEN.match(line)
+            if match:
+                self._fence, self._lang, self._lines = match.group(1), match.group(2), []
+            return None
+
+        if self._is_close(line):
+            return self._finish(closed=True)
+        self._lines.append(line + "\n")
+        if self.on_line is not None:
+            self.on_line(self._lang, line + "\n")
+        return None
+
+    def _finish(self, closed: bool) -> CodeBlock:
+        block = CodeBlock(len(self.blocks), self._lang, "".join(self._lines).rstrip("\n"), closed)
+        self.blocks.append(block)
+        self._fence, self._lang, self._lines = None, "", []
+        if self.on_block is not None:
+            self.on_block(block)
+        return block
+
+
+def extract_blocks(text: str) -> list[CodeBlock]:
+    """
+    All code blocks of a complete answer.
+    """
+    parser = FenceParser()
+    parser.feed(text)
+    parser.close()
+    return parser.blocks
+
+
+class BlockFileWriter:
+    """
+    Writes code to disk while it is still being generated. The block in
+    progress is appended line by line to `<path>.partial`; whenever a
+    block closes and is the largest so far it atomically replaces
+    `path`. So `path` always holds the best complete block seen yet and
+    the .partial file shows what is arriving right now.
+
+    Pass writer.on_line / writer.on_block to FenceParser.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.partial_path = f"{path}.partial"
+        self.best = -1
+        self.written = False
+        self._file = None
+
+    def on_line(self, lang: str, line: str) -> None:
+        if self._file is None:
+            self._file = open(self.partial_path, "w", encoding="utf-8")
+        self._file.write(line)
+        self._file.flush()
+
+    def on_block(self, block: CodeBlock) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if block.closed and len(block.code) > self.best:
+            self.best = len(block.code)
+            # The .partial file has the block's lines; rewrite it exactly
+            with open(self.partial_path, "w", encoding="utf-8") as f:
+                f.write(block.code + "\n")
+            os.replace(self.partial_path, self.path)
+            self.written = True
+        else:
+            self.discard_partial()
+
+    def discard_partial(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if os.path.exists(self.partial_path):
+            os.remove(self.partial_path)
+
+    def discard(self) -> None:
+        """
+        Removes everything written (e.g. the user declined the fix).
+        """
+        self.discard_partial()
+        if self.written and os.path.exists(self.path):
+            os.remove(self.path)
+        self.written = False
@@ -1,19 +1,212 @@
 import os
 import sys
 import subprocess
+import threading
 import time
+import logging
+from collections import deque
+from logging.handlers import RotatingFileHandler
 import requests
 from pyngrok import ngrok, conf
 
 # --- CONFIG ---
 PORT = 8000
+READY_URL = f"http://127.0.0.1:{PORT}/readyz"
+HEALTH_URL = f"http://127.0.0.1:{PORT}/healthz"
+STARTUP_TIMEOUT = 120  # seconds
+
+# API output goes to logs/paki_api.log (rotated, never to an unread pipe)
+LOG_DIR = os.getenv("PAKI_LOG_DIR", "logs")
+LOG_MAX_BYTES = int(float(os.getenv("PAKI_LOG_MAX_MB", "10")) * 1024 * 1024)
+LOG_BACKUPS = int(os.getenv("PAKI_LOG_BACKUPS", "5"))
+
+# Restart policy: wait BACKOFF_INITIAL, doubling up to BACKOFF_MAX; a run
+# that stayed up for STABLE_SECONDS resets the delay.
+BACKOFF_INITIAL = 2
+BACKOFF_MAX = 300
+STABLE_SECONDS = 600
+# Liveness: restart after this many failed /healthz checks in a row
+HEALTH_INTERVAL = 5
+HEALTH_FAILURES = 3
+
 AUTH_TOKEN = input("Enter your Ngrok Authtoken (from dashboard.ngrok.com): ").strip()
 
+
+def api_logger():
+    """Logger that writes the API's output to size-rotated files."""
+    os.makedirs(LOG_DIR, exist_ok=True)
+    logger = logging.getLogger("paki_api")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    handler = RotatingFileHandler(
+        os.path.join(LOG_DIR, "paki_api.log"),
+        maxBytes=LOG_MAX_BYTES,
+        backupCount=LOG_BACKUPS,
+        encoding="utf-8",
+    )
+    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    logger.addHandler(handler)
+    return logger
+
+
+class ApiProcess:
+    """
+    Runs paki_api.py as a child process. Its stdout/stderr are drained
+    continuously by a background thread, so the child can never block
+    on a full pipe; the last lines are kept for crash reports.
+    """
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.process = None
+        self.started_at = 0.0
+        self.tail = deque(maxlen=40)
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [sys.executable, "paki_api.py"],
+            cwd=os.getcwd(),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+            bufsize=1,
+            # Line-by-line output instead of 8 KB bursts
+            env=dict(os.environ, PYTHONUNBUFFERED="1"),
+        )
+        self.started_at = time.monotonic()
+        self.logger.info(f"--- started paki_api.py (pid {self.process.pid}) ---")
+        threading.Thread(target=self._drain, args=(self.process,), daemon=True).start()
+
+    def _drain(self, process):
+        for line in process.stdout:
+            line = line.rstrip("\n")
+            self.tail.append(line)
+            self.logger.info(line)
+        process.stdout.close()
+
+    @property
+    def uptime(self):
+        return time.monotonic() - self.started_at
+
+    def exited(self):
+        return self.process is None or self.process.poll() is not None
+
+    def stop(self):
+        if self.process is None or self.process.poll() is not None:
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.logger.info(f"--- stopped paki_api.py (exit code {self.process.returncode}) ---")
+
+    def print_tail(self, lines=15):
+        recent = list(self.tail)[-lines:]
+        if recent:
+            print("Last output:")
+            for line in recent:
+                print("  " + line)
+
+
+def probe(url):
+    try:
+        return requests.get(url, timeout=3).status_code == 200
+    except requests.RequestException:
+        return False
+
+
+def wait_until_ready(process, timeout=STARTUP_TIMEOUT):
+    """
+    Polls /readyz until the API reports ready, the process exits or
+    `timeout` seconds pass. Returns True when ready.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        if probe(READY_URL):
+            return True
+        time.sleep(0.5)
+    return False
+
+
+def open_tunnel():
+    public_url = ngrok.connect(PORT).public_url
+    print("\n" + "="*60)
+    print(f"🚀 YOUR GLOBAL API URL IS LIVE: {public_url}")
+    print("="*60 + "\n")
+    return public_url
+
+
+def close_tunnel(public_url):
+    if public_url is None:
+        return
+    try:
+        ngrok.disconnect(public_url)
+    except Exception as e:
+        print(f"Warning: could not close tunnel: {e}")
+
+
+def supervise(api, public_url):
+    """
+    Keeps the API alive: restarts it with exponential backoff when it
+    exits or stops answering /healthz, and only re-exposes the tunnel
+    once /readyz passes again. Returns on Ctrl+C.
+    """
+    backoff = BACKOFF_INITIAL
+    restarts = 0
+    failures = 0
+    while True:
+        time.sleep(HEALTH_INTERVAL)
+
+        reason = None
+        if api.exited():
+            reason = f"exited with code {api.process.returncode}"
+        elif probe(HEALTH_URL):
+            failures = 0
+        else:
+            failures += 1
+            if failures >= HEALTH_FAILURES:
+                reason = f"not responding ({failures} failed health checks)"
+
+        if reason is None:
+            # Alive but never got ready (e.g. restarted while logged out):
+            # expose it as soon as it is
+            if public_url is None and probe(READY_URL):
+                public_url = open_tunnel()
+            continue
+
+        print(f"\nError: paki_api.py {reason}.")
+        api.print_tail()
+        close_tunnel(public_url)
+        public_url = None
+        if api.uptime >= STABLE_SECONDS:
+            backoff = BACKOFF_INITIAL
+        api.stop()
+
+        print(f"Restarting in {backoff}s (restart #{restarts + 1}, logs in '{LOG_DIR}')...")
+        time.sleep(backoff)
+        backoff = min(backoff * 2, BACKOFF_MAX)
+        restarts += 1
+        failures = 0
+
+        api.start()
+        if wait_until_ready(api.process):
+            print(f"API ready again after restart #{restarts}.")
+            public_url = open_tunnel()
+        else:
+            print("API did not become ready; tunnel stays closed until it does.")
+
+
 def main():
     print("==========================================")
     print("      🌍 GLOBAL 24/7 API SERVER 🌍      ")
     print("==========================================")
-    
+
     # 1. Setup Ngrok Auth (Crucial for stability)
     if not AUTH_TOKEN:
         print("Error: Starting ngrok requires a free authtoken.")
@@ -24,53 +217,41 @@ def main():
 
     print("Configuring Ngrok...")
     conf.get_default().auth_token = AUTH_TOKEN
-    
+
     # 2. Start the API locally (paki_api.py)
-    print("Starting paki_api.py in background...")
-    api_process = subprocess.Popen(
-        [sys.executable, "paki_api.py"],
-        cwd=os.getcwd(),
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True
-    )
-    
+    print(f"Starting paki_api.py in background (output: {LOG_DIR}/paki_api.log)...")
+    api = ApiProcess(api_logger())
+    api.start()
+
     # Wait for API to warm up
-    print("Waiting for API to initialize (this takes ~15s)...")
-    time.sleep(15)
-    
-    # Check if API is alive
-    if api_process.poll() is not None:
-        print("Error: paki_api.py crashed immediately.")
-        print(api_process.stderr.read())
+    print("Waiting for API to become ready...")
+    started = time.monotonic()
+    if not wait_until_ready(api.process):
+        if api.exited():
+            print("Error: paki_api.py crashed immediately.")
+            api.print_tail()
+        else:
+            print(f"Error: API not ready after {STARTUP_TIMEOUT}s (check auth.json / login screen).")
+            api.stop()
         return
+    print(f"API ready in {time.monotonic() - started:.1f}s.")
 
-    # 3. Create Tunnel
+    # 3. Create Tunnel and supervise
     try:
-        public_url = ngrok.connect(PORT).public_url
-        print("\n" + "="*60)
-        print(f"🚀 YOUR GLOBAL API URL IS LIVE: {public_url}")
-        print("="*60 + "\n")
-        
+        public_url = open_tunnel()
+
         print(f"Example usage (Code Doctor):")
-        print(f"API_URL = \"{public_url}/chat_stream\"")
-        
+        print(f"API_URL = \"{public_url}\"")
+
         print("\nPress Ctrl+C to stop the server.")
-        
-        # Keep alive
-        while True:
-            if api_process.poll() is not None:
-                print("\nError: paki_api.py crashed!")
-                print("Last error:", api_process.stderr.read())
-                break
-            time.sleep(5)
-            
+        supervise(api, public_url)
+
     except KeyboardInterrupt:
         print("\nShutting down...")
     except Exception as e:
         print(f"\nTunnel error: {e}")
     finally:
-        api_process.terminate()
+        api.stop()
         ngrok.kill()
         print("Server stopped.")
 
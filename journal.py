@@ -0,0 +1,156 @@
+import os
+import gzip
+import json
+import asyncio
+from typing import Iterator
+
+# ============================================================
+# Append-only request journal (JSONL, optionally gzip'd)
+# ============================================================
+# One line per finished request: when it arrived, endpoint, prompt hash
+# and size, queue wait, stage timings, outcome and response size. The
+# request path only appends to an in-memory queue; a background task
+# writes batches to disk in a worker thread, so a slow disk never stalls
+# a stream. When the queue is full, records are dropped and counted.
+#
+# Files rotate by size like logging's RotatingFileHandler
+# (journal.jsonl -> journal.jsonl.1 -> ...). A path ending in .gz is
+# written gzip-compressed (one gzip member per batch, which gzip and
+# read_journal() read as a single stream).
+#
+# bench/replay.py re-issues a journal against a server.
+
+MAX_BATCH = 500
+
+
+class RequestJournal:
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 64 * 1024 * 1024,
+        backups: int = 5,
+        capture_prompts: bool = False,
+        queue_size: int = 10000,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        # Full prompt text makes the journal replayable verbatim, but
+        # stores user data; off by default (only the hash is kept)
+        self.capture_prompts = capture_prompts
+        self.compress = path.endswith(".gz")
+        self.queue: asyncio.Queue[dict | None] = asyncio.Queue(maxsize=queue_size)
+        self.written = 0
+        self.dropped = 0
+        self.rotations = 0
+        self._task: asyncio.Task | None = None
+        self._closed = False
+
+    def start(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._task = asyncio.create_task(self._writer())
+
+    def record(self, entry: dict, prompt: str | None = None) -> None:
+        """
+        Queues one record; never blocks. Must be called on the event loop.
+        """
+        if self._closed:
+            return
+        if prompt is not None and self.capture_prompts:
+            entry = {**entry, "prompt": prompt}
+        try:
+            self.queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def close(self) -> None:
+        """
+        Writes what is still queued and stops the writer.
+        """
+        if self._task is None or self._closed:
+            return
+        self._closed = True
+        await self.queue.put(None)
+        await self._task
+
+    async def _writer(self) -> None:
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < MAX_BATCH and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            stop = None in batch
+            records = [entry for entry in batch if entry is not None]
+            if records:
+                lines = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in records)
+                try:
+                    await asyncio.to_thread(self._write, lines)
+                    self.written += len(records)
+                except OSError as e:
+                    print(f"Journal write failed ({e}); {len(records)} records lost.")
+                    self.dropped += len(records)
+            if stop:
+                return
+
+    def _write(self, lines: str) -> None:
+        if self.max_bytes and os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+            self._rotate()
+        opener = gzip.open if self.compress else open
+        with opener(self.path, "at", encoding="utf-8") as f:
+            f.write(lines)
+
+    def _rotate(self) -> None:
+        for n in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{n}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{n + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.rotations += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "path": self.path,
+            "queued": self.queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "rotations": self.rotations,
+        }
+
+
+def journal_files(path: str) -> list[str]:
+    """
+    The journal and its rotated files, oldest first.
+    """
+    files = []
+    n = 1
+    while os.path.exists(f"{path}.{n}"):
+        files.append(f"{path}.{n}")
+        n += 1
+    files.reverse()
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+
+def read_journal(path: str) -> Iterator[dict]:
+    """
+    Yields the records of a journal (rotated files included) in the
+    order they were written. A truncated last line is skipped.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    for name in journal_files(path):
+        try:
+            with opener(name, "rt", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+        except EOFError:
+            # gzip file cut off mid-write (e.g. the server was killed)
+            continue
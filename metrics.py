@@ -0,0 +1,307 @@
+import bisect
+import json
+import threading
+import time
+from typing import Callable
+
+# ============================================================
+# Minimal Prometheus-format metrics (no external dependency)
+# ============================================================
+# Counters, gauges and histograms with optional labels, rendered in the
+# text exposition format by Registry.render(). Updates are cheap (a dict
+# lookup and an add under a lock) so they can sit on the hot path.
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300,
+)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _callback_items(callback: Callable[[], float | dict]) -> list:
+    value = callback()
+    return list(value.items()) if isinstance(value, dict) else [((), value)]
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labels)
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """
+    Either incremented explicitly, or read at scrape time from `callback`
+    (like Gauge) for totals that are kept elsewhere and only ever grow.
+    """
+
+    kind = "counter"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        callback: Callable[[], float | dict] | None = None,
+    ):
+        super().__init__(name, help, labels)
+        # Unlabelled counters are exported as 0 from the start
+        self._values: dict[tuple[str, ...], float] = {} if labels else {(): 0}
+        self.callback = callback
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> list[str]:
+        if self.callback is not None:
+            items = _callback_items(self.callback)
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+            for key, value in items
+            if value is not None
+        ]
+
+
+class Gauge(Metric):
+    """
+    Either set explicitly, or computed at scrape time from `callback`
+    (which returns a number, or a dict of label-tuple -> number).
+    """
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        callback: Callable[[], float | dict] | None = None,
+    ):
+        super().__init__(name, help, labels)
+        self._values: dict[tuple[str, ...], float] = {}
+        self.callback = callback
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self) -> list[str]:
+        if self.callback is not None:
+            items = _callback_items(self.callback)
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+            for key, value in items
+            if value is not None
+        ]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts..., sum, count]
+        self._values: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                row[index] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = [(key, list(row)) for key, row in self._values.items()]
+        lines = []
+        for key, row in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, row):
+                cumulative += count
+                le = _format_labels(self.labels, key, f'le="{_format_value(float(bound))}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _format_labels(self.labels, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {int(row[-1])}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(row[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {int(row[-1])}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...] = (), callback=None) -> Counter:
+        return self.register(Counter(name, help, labels, callback))
+
+    def gauge(self, name: str, help: str, labels: tuple[str, ...] = (), callback=None) -> Gauge:
+        return self.register(Gauge(name, help, labels, callback))
+
+    def histogram(self, name: str, help: str, labels: tuple[str, ...] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+# ============================================================
+# Per-request tracing
+# ============================================================
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.counter(
+    "paki_requests_total", "Finished requests by endpoint and outcome.", ("endpoint", "outcome")
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "paki_request_seconds", "End-to-end request latency (excluding queue wait).", ("endpoint",)
+)
+STAGE_SECONDS = REGISTRY.histogram(
+    "paki_stage_seconds", "Time spent per request stage.", ("endpoint", "stage")
+)
+QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "paki_queue_wait_seconds", "Time spent waiting for the page.", ("endpoint",)
+)
+STREAM_BYTES = REGISTRY.counter(
+    "paki_stream_bytes_total", "Bytes of answer text sent to clients.", ("endpoint",)
+)
+RELOADS = REGISTRY.counter("paki_page_reloads_total", "Page reloads after a failed request.")
+TIMEOUTS = REGISTRY.counter(
+    "paki_timeouts_total", "Requests that timed out, by stage.", ("endpoint", "stage")
+)
+ERRORS = REGISTRY.counter("paki_errors_total", "Requests that failed.", ("endpoint",))
+CANCELLATIONS = REGISTRY.counter(
+    "paki_cancellations_total",
+    "Generations cut short (deadline / disconnect), by how the page was freed.",
+    ("method",),
+)
+
+# Emit one JSON line per finished request (set by paki_api from PAKI_JSON_LOGS)
+json_logs = False
+# RequestJournal that also gets every finished request (set by paki_api)
+journal = None
+
+
+class RequestTrace:
+    """
+    Timing spans for one request. mark(stage) closes the span that
+    started at the previous mark; finish() records the request once.
+    """
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.timings: dict[str, float] = {}
+        self.queue_wait = 0.0
+        self.bytes = 0
+        self.fields: dict[str, object] = {}
+        self.finished = False
+        self.outcome: str | None = None
+        # Only passed on to the journal (never logged)
+        self.prompt: str | None = None
+        self.arrived = time.time()
+        self._start = self._last = time.perf_counter()
+
+    def mark(self, stage: str) -> None:
+        now = time.perf_counter()
+        elapsed = now - self._last
+        self._last = now
+        self.timings[stage] = round(elapsed * 1000, 1)
+        STAGE_SECONDS.observe(elapsed, endpoint=self.endpoint, stage=stage)
+
+    def has(self, stage: str) -> bool:
+        return stage in self.timings
+
+    def restart(self) -> None:
+        """
+        Starts the clock now (e.g. once the page has been acquired).
+        """
+        self._start = self._last = time.perf_counter()
+
+    def add_bytes(self, text: str) -> None:
+        size = len(text.encode("utf-8"))
+        self.bytes += size
+        STREAM_BYTES.inc(size, endpoint=self.endpoint)
+
+    def finish(self, outcome: str, **fields) -> None:
+        if self.finished:
+            return
+        self.finished = True
+        self.outcome = outcome
+        total = time.perf_counter() - self._start
+        self.fields.update(fields)
+
+        REQUESTS.inc(endpoint=self.endpoint, outcome=outcome)
+        REQUEST_SECONDS.observe(total, endpoint=self.endpoint)
+        QUEUE_WAIT_SECONDS.observe(self.queue_wait, endpoint=self.endpoint)
+        if outcome in ("error", "timeout"):
+            ERRORS.inc(endpoint=self.endpoint)
+
+        if json_logs or journal is not None:
+            record = {
+                "ts": round(time.time(), 3),
+                "arrived": round(self.arrived, 3),
+                "endpoint": self.endpoint,
+                "outcome": outcome,
+                "total_ms": round(total * 1000, 1),
+                "queue_wait_ms": round(self.queue_wait * 1000, 1),
+                "timings_ms": self.timings,
+                "bytes": self.bytes,
+                **self.fields,
+            }
+            if json_logs:
+                print(json.dumps(record), flush=True)
+            if journal is not None:
+                journal.record(record, self.prompt)
@@ -0,0 +1,120 @@
+import json
+import time
+import uuid
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+# ============================================================
+# OpenAI Chat Completions wire format
+# ============================================================
+# Request model and response / SSE chunk builders for
+# POST /v1/chat/completions, so the official SDKs (and anything else
+# that speaks this API) can use paki_api as a base_url:
+#
+#   client = OpenAI(base_url="http://127.0.0.1:8000/v1", api_key="unused")
+#   client.chat.completions.create(model="chatgpt-web", messages=[...], stream=True)
+#
+# Sampling parameters (temperature, max_tokens, ...) are accepted and
+# ignored: the web UI has no such knobs.
+
+DEFAULT_MODEL = "chatgpt-web"
+
+SSE_DONE = "data: [DONE]\n\n"
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    # Keep reverse proxies (ngrok, nginx) from buffering the stream
+    "X-Accel-Buffering": "no",
+}
+
+
+class ChatMessage(BaseModel):
+    role: str
+    # Plain text, or a list of content parts ({"type": "text", "text": ...})
+    content: str | list[dict] | None = None
+
+
+class ChatCompletionRequest(BaseModel):
+    model: str = DEFAULT_MODEL
+    messages: list[ChatMessage]
+    stream: bool = False
+    # Extensions (pass with extra_body= in the SDKs)
+    priority: int | None = None
+    timeout: float | None = None
+
+
+def message_text(message: ChatMessage) -> str:
+    if isinstance(message.content, list):
+        return "".join(
+            part.get("text", "") for part in message.content if part.get("type") == "text"
+        )
+    return message.content or ""
+
+
+def messages_to_prompt(messages: list[ChatMessage]) -> str:
+    """
+    Flattens a message list into the single prompt the chat UI takes.
+    A lone user message is sent as is; anything longer is rendered as a
+    labelled transcript ending with the last message.
+    """
+    turns = [(m.role, message_text(m).strip()) for m in messages]
+    turns = [(role, text) for role, text in turns if text]
+    if not turns:
+        return ""
+    if len(turns) == 1 and turns[0][0] == "user":
+        return turns[0][1]
+    return "\n\n".join(f"{role.capitalize()}: {text}" for role, text in turns)
+
+
+def new_completion_id() -> str:
+    return f"chatcmpl-{uuid.uuid4().hex}"
+
+
+def completion_body(completion_id: str, model: str, text: str) -> dict:
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": text},
+            "finish_reason": "stop",
+        }],
+    }
+
+
+def sse_event(payload: dict) -> str:
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+def sse_chunk(completion_id: str, model: str, delta: dict, finish_reason: str | None = None) -> str:
+    return sse_event({
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    })
+
+
+def error_body(message: str, error_type: str = "server_error", code: str | None = None) -> dict:
+    return {"error": {"message": message, "type": error_type, "param": None, "code": code}}
+
+
+ERROR_TYPES = {
+    400: "invalid_request_error",
+    429: "rate_limit_exceeded",
+    503: "service_unavailable",
+    504: "timeout",
+}
+
+
+def openai_error(
+    message: str,
+    status_code: int,
+    error_type: str | None = None,
+    headers: dict[str, str] | None = None,
+) -> JSONResponse:
+    error_type = error_type or ERROR_TYPES.get(status_code, "server_error")
+    return JSONResponse(error_body(message, error_type), status_code=status_code, headers=headers)
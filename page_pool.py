@@ -0,0 +1,174 @@
+import time
+import asyncio
+from collections import OrderedDict, deque
+
+from playwright.async_api import Page
+
+# ============================================================
+# Pool of chat tabs and request dispatch
+# ============================================================
+# N independent chat tabs in one browser context, each with its own
+# conversation. PageScheduler (slots = number of tabs) decides *when* a
+# request may run; the pool decides *where*. acquire() is only called
+# once the scheduler granted a slot, so an idle tab always exists:
+#
+#   ticket = scheduler.reserve(priority)
+#   await ticket.acquire()
+#   tab = await pool.acquire(session)
+#   ... generate on tab.page ...
+#   pool.release(tab, seconds)   # before the ticket, so the tab is free
+#   ticket.release()             # when the next request is granted
+#
+# Dispatch: a request with a session key goes back to the tab that
+# served that session before, so its follow-up turns land in the same
+# conversation. If that tab is busy the request waits for it (the caller
+# bounds the wait) while keeping its slot: release() hands the tab
+# straight to the waiter, so the other granted requests still find an
+# idle tab. Everything else gets the idle tab that has been unused the
+# longest. A tab that starts a fresh conversation forgets its sessions.
+
+MAX_SESSIONS = 1024
+LATENCY_WINDOW = 50
+
+
+class Tab:
+    def __init__(self, index: int, page: Page):
+        self.index = index
+        self.page = page
+        self.busy = False
+        self.last_used = 0.0  # monotonic; 0 = never used
+        self.turns = 0        # in the current conversation
+        self.requests = 0
+        self.failures = 0
+        self.latencies: deque[float] = deque(maxlen=LATENCY_WINDOW)
+        # Session requests waiting for this tab to be released
+        self.waiters: deque[asyncio.Future] = deque()
+
+    def snapshot(self) -> dict:
+        recent = sorted(self.latencies)
+        return {
+            "tab": self.index,
+            "busy": self.busy,
+            "turns": self.turns,
+            "requests": self.requests,
+            "failures": self.failures,
+            "last_seconds": round(self.latencies[-1], 3) if self.latencies else None,
+            "p50_seconds": round(recent[len(recent) // 2], 3) if recent else None,
+        }
+
+
+class PagePool:
+    def __init__(self):
+        self.tabs: list[Tab] = []
+        # session key -> tab that holds its conversation (LRU bounded)
+        self._sessions: OrderedDict[str, Tab] = OrderedDict()
+        self.sticky_hits = 0
+        self.sticky_waits = 0
+
+    def __len__(self) -> int:
+        return len(self.tabs)
+
+    @property
+    def busy(self) -> int:
+        return sum(1 for tab in self.tabs if tab.busy)
+
+    def add(self, page: Page) -> Tab:
+        tab = Tab(len(self.tabs), page)
+        self.tabs.append(tab)
+        return tab
+
+    def replace_all(self, pages: list[Page]) -> None:
+        """
+        Starts over with new pages (e.g. a new browser context). Only
+        call while no tab is busy.
+        """
+        self.tabs = []
+        self._sessions.clear()
+        for page in pages:
+            self.add(page)
+
+    def find(self, page: Page) -> Tab | None:
+        return next((tab for tab in self.tabs if tab.page is page), None)
+
+    def any_page(self) -> Page | None:
+        """
+        A page for read-only checks; prefers an idle tab.
+        """
+        tabs = sorted(self.tabs, key=lambda tab: tab.busy)
+        return tabs[0].page if tabs else None
+
+    async def acquire(self, session: str | None = None) -> Tab:
+        """
+        An idle tab, or for a session the tab that holds its conversation,
+        waiting for it if it is busy.
+        """
+        bound = self._sessions.get(session) if session is not None else None
+        if bound is not None and bound.busy:
+            self.sticky_waits += 1
+            tab = await self._wait_for(bound)
+        elif bound is not None:
+            self.sticky_hits += 1
+            tab = bound
+            tab.busy = True
+        else:
+            idle = [tab for tab in self.tabs if not tab.busy]
+            if not idle:
+                raise RuntimeError("No idle tab; scheduler slots and pool size disagree.")
+            tab = min(idle, key=lambda t: t.last_used)
+            tab.busy = True
+
+        if session is not None:
+            self._sessions[session] = tab
+            self._sessions.move_to_end(session)
+            while len(self._sessions) > MAX_SESSIONS:
+                self._sessions.popitem(last=False)
+        return tab
+
+    async def _wait_for(self, tab: Tab) -> Tab:
+        future = asyncio.get_running_loop().create_future()
+        tab.waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Handed over and cancelled in the same tick: pass it on
+                self.release(tab)
+            else:
+                tab.waiters.remove(future)
+            raise
+        return tab
+
+    def release(self, tab: Tab, seconds: float | None = None, failed: bool = False) -> None:
+        """
+        Frees the tab, or hands it (still busy) to the next request
+        waiting for it; `seconds` is the generation time to record.
+        """
+        tab.last_used = time.monotonic()
+        if seconds is not None:
+            tab.requests += 1
+            tab.latencies.append(seconds)
+        if failed:
+            tab.failures += 1
+        while tab.waiters:
+            future = tab.waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        tab.busy = False
+
+    def forget(self, tab: Tab) -> None:
+        """
+        Unbinds the sessions of a tab whose conversation is gone.
+        """
+        for session in [s for s, t in self._sessions.items() if t is tab]:
+            del self._sessions[session]
+
+    def snapshot(self) -> dict:
+        return {
+            "size": len(self.tabs),
+            "busy": self.busy,
+            "sessions": len(self._sessions),
+            "sticky_hits": self.sticky_hits,
+            "sticky_waits": self.sticky_waits,
+            "tabs": [tab.snapshot() for tab in self.tabs],
+        }
@@ -0,0 +1,330 @@
+# ============================================================
+# In-page JavaScript used by paki_api.py
+# ============================================================
+# Kept in one place so the endpoint code stays readable and the
+# scripts are always passed to page.evaluate() as arguments,
+# never built with Python string formatting.
+
+# Name of the Playwright binding the stream observer pushes events to.
+STREAM_BINDING = "__pakiStreamEvent"
+
+# Converts a rendered assistant message back to markdown in one DOM
+# walk: fenced code blocks with their language, headings, lists,
+# tables, block quotes and inline emphasis / code / links. innerText
+# flattens all of that (code comes back as "python\nCopy code\n..."
+# without fences). Reads textContent only, so it forces no layout.
+#
+# With `partial` (a message still being generated) a code block at the
+# very end is left without its closing fence, so every snapshot is a
+# prefix of the next one and of the final text.
+#
+# A message without any elements (plain text, e.g. the bench fake page)
+# is returned as is. Not a script on its own: spliced into the scripts
+# below as `toMarkdown`.
+MARKDOWN_JS = """
+(root, partial) => {
+    const SKIP = /^(BUTTON|svg|SVG|STYLE|SCRIPT|TEMPLATE)$/;
+    const BLOCK = /^(P|DIV|SECTION|ARTICLE|UL|OL|LI|PRE|TABLE|BLOCKQUOTE|H[1-6]|HR)$/;
+
+    if (!root.querySelector("*")) return root.textContent.replace(/\\s+$/, "");
+
+    let lastFence = null;
+    // The fence of a code block is chosen once per <pre> and kept: if it
+    // widened when the streamed code later grew a run of backticks, text
+    // that was already sent would change and the stream observer would
+    // resend the whole block.
+    const fences = window.__pakiFences || (window.__pakiFences = new WeakMap());
+    const fenceFor = (pre, code) => {
+        let fence = fences.get(pre);
+        if (!fence) {
+            fence = "```";
+            while (code.includes(fence)) fence += "`";
+            fences.set(pre, fence);
+        }
+        return fence;
+    };
+
+    const inline = (node) => {
+        if (node.nodeType === 3) return node.nodeValue.replace(/\\s+/g, " ");
+        if (node.nodeType !== 1 || SKIP.test(node.tagName)) return "";
+        const tag = node.tagName;
+        if (tag === "BR") return "\\n";
+        if (tag === "CODE") return "`" + node.textContent + "`";
+        const inner = Array.from(node.childNodes, inline).join("");
+        if (!inner.trim()) return inner;
+        if (tag === "STRONG" || tag === "B") return "**" + inner + "**";
+        if (tag === "EM" || tag === "I") return "*" + inner + "*";
+        if (tag === "A" && node.getAttribute("href")) {
+            return "[" + inner + "](" + node.getAttribute("href") + ")";
+        }
+        return inner;
+    };
+
+    const codeBlock = (pre) => {
+        const code = pre.querySelector("code");
+        let lang = "";
+        const match = code && /(?:^|\\s)language-([\\w+#.-]+)/.exec(code.className);
+        if (match) {
+            lang = match[1];
+        } else {
+            // Header bar above the code ("python" + copy button)
+            const label = pre.firstElementChild && pre.firstElementChild.firstElementChild;
+            const text = label ? label.textContent.trim() : "";
+            if (/^[\\w+#.-]{1,20}$/.test(text)) lang = text;
+        }
+        const lines = pre.querySelectorAll(".cm-line");
+        const text = (lines.length
+            ? Array.from(lines, (line) => line.textContent).join("\\n")
+            : (code || pre).textContent).replace(/\\n+$/, "");
+        lastFence = fenceFor(pre, text);
+        return lastFence + lang + "\\n" + text + "\\n" + lastFence;
+    };
+
+    const table = (el) => {
+        const rows = Array.from(el.querySelectorAll("tr"), (tr) =>
+            Array.from(tr.children, (cell) => inline(cell).trim().replace(/\\|/g, "\\\\|")));
+        if (!rows.length) return "";
+        const width = Math.max(...rows.map((row) => row.length));
+        const line = (row) =>
+            "| " + Array.from({ length: width }, (_, i) => row[i] || "").join(" | ") + " |";
+        return [line(rows[0]), "|" + " --- |".repeat(width), ...rows.slice(1).map(line)].join("\\n");
+    };
+
+    const list = (el, depth) => {
+        let n = parseInt(el.getAttribute("start") || "1", 10);
+        const items = [];
+        for (const li of el.children) {
+            if (li.tagName !== "LI") continue;
+            const marker = el.tagName === "OL" ? (n++) + ". " : "- ";
+            const pad = " ".repeat(marker.length);
+            const body = render(li, depth + 1).join("\\n");
+            items.push(marker + body.split("\\n").map((l, i) => (i && l ? pad + l : l)).join("\\n"));
+        }
+        return items.join("\\n");
+    };
+
+    const block = (el, depth) => {
+        const tag = el.tagName;
+        if (tag === "PRE") return codeBlock(el);
+        if (tag === "HR") return "---";
+        if (tag === "UL" || tag === "OL") return list(el, depth);
+        if (tag === "TABLE") return table(el);
+        if (/^H[1-6]$/.test(tag)) return "#".repeat(+tag[1]) + " " + inline(el).trim();
+        const inner = render(el, depth).join("\\n\\n");
+        if (tag === "BLOCKQUOTE") {
+            return inner.split("\\n").map((l) => (l ? "> " + l : ">")).join("\\n");
+        }
+        return inner;
+    };
+
+    // Markdown of each block-level child, in order
+    const render = (node, depth) => {
+        const out = [];
+        let line = "";
+        const flush = () => {
+            const text = line.split("\\n").map((l) => l.trim()).join("\\n").trim();
+            if (text) out.push(text);
+            line = "";
+        };
+        for (const child of node.childNodes) {
+            if (child.nodeType === 1 && BLOCK.test(child.tagName) && !SKIP.test(child.tagName)) {
+                flush();
+                lastFence = null;
+                const text = block(child, depth);
+                if (text) out.push(text);
+            } else {
+                line += inline(child);
+                if (line.trim()) lastFence = null;
+            }
+        }
+        flush();
+        return out;
+    };
+
+    let markdown = render(root, 0).join("\\n\\n").replace(/\\s+$/, "");
+    // The closing fence may be indented (list item) or quoted
+    const closing = /\\n[ >]*(`{3,})$/.exec(markdown);
+    if (partial && lastFence !== null && closing && closing[1] === lastFence) {
+        markdown = markdown.slice(0, closing.index);
+    }
+    return markdown;
+}
+"""
+
+# Markdown of the last assistant message in one evaluate, or null if
+# there are no more than `baseline` messages (i.e. no new answer yet).
+ANSWER_MARKDOWN_JS = """
+([assistantSel, baseline, partial]) => {
+    const toMarkdown = """ + MARKDOWN_JS + """;
+    const nodes = document.querySelectorAll(assistantSel);
+    if (nodes.length <= baseline) return null;
+    return toMarkdown(nodes[nodes.length - 1], partial);
+}
+"""
+
+# Installs a MutationObserver that watches for the next assistant
+# message and pushes *only the newly committed text* to Python.
+#
+# Events sent through the binding:
+#   {id, type: "start"}               stop button appeared
+#   {id, type: "delta", text: "..."}  new text since last delta
+#   {id, type: "done"}                stop button gone, final text flushed
+#
+# Text is committed conservatively: only the prefix that is identical
+# in two consecutive snapshots (minus trailing whitespace) is sent.
+# While a token is fading in, ChatGPT renders it in its own element,
+# so innerText briefly contains a layout newline in front of it.
+# Slicing by length (the old polling approach) dropped the character
+# that replaced that newline; waiting for a stable prefix does not.
+#
+# Snapshots are markdown (MARKDOWN_JS), so streamed text has the same
+# fences, lists and tables as /ask; the closing fence of a code block
+# is sent once the block is over.
+STREAM_OBSERVER_JS = """
+([binding, streamId, assistantSel, stopSel]) => {
+    const toMarkdown = """ + MARKDOWN_JS + """;
+    if (window.__pakiObserver) {
+        window.__pakiObserver.disconnect();
+    }
+
+    const baseline = document.querySelectorAll(assistantSel).length;
+    const emit = (event) => window[binding]({ id: streamId, ...event });
+    const commonPrefix = (a, b) => {
+        const n = Math.min(a.length, b.length);
+        let i = 0;
+        while (i < n && a.charCodeAt(i) === b.charCodeAt(i)) i++;
+        return i;
+    };
+
+    let target = null;
+    let sent = "";
+    let previous = "";
+    let started = false;
+    let finished = false;
+    let timer = null;
+
+    const commit = (text) => {
+        if (sent.startsWith(text)) return;
+        // Normally `text` extends `sent`. If already-sent text was
+        // re-rendered, resend from the first differing character
+        // rather than silently lose it.
+        emit({ type: "delta", text: text.slice(commonPrefix(sent, text)) });
+        sent = text;
+    };
+
+    const flush = () => {
+        timer = null;
+        if (finished) return;
+
+        const nodes = document.querySelectorAll(assistantSel);
+        if (nodes.length > baseline) target = nodes[nodes.length - 1];
+
+        const generating = document.querySelector(stopSel) !== null;
+        if (generating && !started) {
+            started = true;
+            emit({ type: "start" });
+        }
+
+        const final = started && !generating;
+        const current = target ? toMarkdown(target, !final) : "";
+
+        if (final) {
+            finished = true;
+            observer.disconnect();
+            window.__pakiObserver = null;
+            commit(current);
+            emit({ type: "done" });
+            return;
+        }
+
+        const stable = current.slice(0, commonPrefix(previous, current))
+            .replace(/\\s+$/, "");
+        previous = current;
+        if (stable.length > sent.length) commit(stable);
+    };
+
+    const observer = new MutationObserver(() => {
+        // Coalesce bursts of mutations into one snapshot per ~frame.
+        if (timer === null) timer = setTimeout(flush, 16);
+    });
+    observer.observe(document.body, {
+        childList: true,
+        subtree: true,
+        characterData: true,
+    });
+    window.__pakiObserver = observer;
+    window.__pakiObserverId = streamId;
+}
+"""
+
+# Disconnects the stream observer installed for `streamId` (used on
+# error / cancellation). Leaves a newer request's observer alone.
+STREAM_OBSERVER_STOP_JS = """
+(streamId) => {
+    if (window.__pakiObserver && window.__pakiObserverId === streamId) {
+        window.__pakiObserver.disconnect();
+        window.__pakiObserver = null;
+    }
+}
+"""
+
+# Cheap size probe used to decide when to start a fresh conversation.
+# performance.memory is Chrome-only; heap is null elsewhere.
+PAGE_STATS_JS = """
+([assistantSel]) => ({
+    dom_nodes: document.getElementsByTagName("*").length,
+    assistant_nodes: document.querySelectorAll(assistantSel).length,
+    js_heap_bytes: performance.memory ? performance.memory.usedJSHeapSize : null,
+})
+"""
+
+# Cheap logged-out probe for the periodic session check: a login
+# button means the stored session is gone (the chat itself may still
+# work anonymously, so the prompt box alone proves nothing).
+SESSION_CHECK_JS = """
+([promptSel, loginSel]) => ({
+    prompt_box: document.querySelector(promptSel) !== null,
+    login_button: document.querySelector(loginSel) !== null,
+})
+"""
+
+# Puts the prompt into the composer (passed as an argument, so no
+# escaping is needed) and resolves as soon as the UI has taken it,
+# i.e. the send button is enabled, or after `timeoutMs` at the latest.
+# Returns {found, ready}.
+SUBMIT_PROMPT_JS = """
+async ([promptSel, sendSel, text, timeoutMs]) => {
+    const el = document.querySelector(promptSel);
+    if (!el) return { found: false, ready: false };
+
+    el.focus();
+    el.innerText = text;
+    // React only notices the change through an input event
+    el.dispatchEvent(new Event("input", { bubbles: true }));
+
+    const isReady = () => {
+        const button = document.querySelector(sendSel);
+        return button !== null && !button.disabled
+            && button.getAttribute("aria-disabled") !== "true";
+    };
+    if (isReady()) return { found: true, ready: true };
+
+    return await new Promise((resolve) => {
+        const done = (ready) => {
+            observer.disconnect();
+            clearTimeout(timer);
+            resolve({ found: true, ready });
+        };
+        const observer = new MutationObserver(() => {
+            if (isReady()) done(true);
+        });
+        const timer = setTimeout(() => done(isReady()), timeoutMs);
+        observer.observe(document.body, {
+            childList: true,
+            subtree: true,
+            attributes: true,
+            attributeFilter: ["disabled", "aria-disabled"],
+        });
+    });
+}
+"""
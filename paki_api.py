@@ -1,29 +1,292 @@
 import os
+import re
+import sys
+import json
+import shlex
 import asyncio
+import argparse
+import time
+import uuid
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Callable
 
-from fastapi import FastAPI
-from fastapi.responses import StreamingResponse
-from playwright.async_api import async_playwright, Page, Browser, BrowserContext
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from playwright.async_api import (
+    TimeoutError as PlaywrightTimeoutError,
+    async_playwright,
+    Page,
+    Browser,
+    BrowserContext,
+    Route,
+)
 from playwright_stealth import Stealth
 import uvicorn
 
+import procstats
+from page_scripts import (
+    ANSWER_MARKDOWN_JS,
+    PAGE_STATS_JS,
+    SESSION_CHECK_JS,
+    SUBMIT_PROMPT_JS,
+    STREAM_BINDING,
+    STREAM_OBSERVER_JS,
+    STREAM_OBSERVER_STOP_JS,
+)
+from openai_compat import (
+    SSE_DONE,
+    SSE_HEADERS,
+    ChatCompletionRequest,
+    completion_body,
+    error_body,
+    messages_to_prompt,
+    new_completion_id,
+    openai_error,
+    sse_chunk,
+    sse_event,
+)
+from metrics import CANCELLATIONS, REGISTRY, RELOADS, TIMEOUTS, RequestTrace
+import metrics
+from fence_parser import extract_blocks
+from journal import RequestJournal
+from response_cache import ResponseCache, open_cache, prompt_key
+from page_pool import PagePool, Tab
+from singleflight import Flight, FlightGroup
+from scheduler import (
+    PRIORITY_BATCH,
+    PRIORITY_INTERACTIVE,
+    PageScheduler,
+    QueueFull,
+    Ticket,
+)
+
+# ============================================================
+# Command line (python paki_api.py ...)
+# ============================================================
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Paki API server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--headless", action=argparse.BooleanOptionalAction, default=None,
+                        help="run Chrome without a window (PAKI_HEADLESS)")
+    parser.add_argument("--viewport", help="WIDTHxHEIGHT, e.g. 1280x800 (PAKI_VIEWPORT)")
+    parser.add_argument("--browser-arg", action="append", default=[],
+                        help="extra Chrome flag, repeatable (PAKI_BROWSER_ARGS)")
+    parser.add_argument("--block-resources",
+                        help="comma separated file extensions to abort, '' for none (PAKI_BLOCK_RESOURCES)")
+    parser.add_argument("--block-telemetry", action=argparse.BooleanOptionalAction, default=None,
+                        help="abort known telemetry beacons (PAKI_BLOCK_TELEMETRY)")
+    parser.add_argument("--journal", help="append a JSONL record per request to this file (PAKI_JOURNAL)")
+    parser.add_argument("--pool", type=int, help="number of chat tabs serving requests (PAKI_POOL_SIZE)")
+    return parser.parse_args(argv)
+
+
+def apply_cli_overrides(args: argparse.Namespace) -> None:
+    """
+    CLI flags override the environment. Must run before the
+    configuration below reads it.
+    """
+    if args.headless is not None:
+        os.environ["PAKI_HEADLESS"] = "1" if args.headless else "0"
+    if args.viewport:
+        os.environ["PAKI_VIEWPORT"] = args.viewport
+    if args.browser_arg:
+        extra = shlex.split(os.getenv("PAKI_BROWSER_ARGS", ""))
+        os.environ["PAKI_BROWSER_ARGS"] = shlex.join(extra + args.browser_arg)
+    if args.block_resources is not None:
+        os.environ["PAKI_BLOCK_RESOURCES"] = args.block_resources
+    if args.block_telemetry is not None:
+        os.environ["PAKI_BLOCK_TELEMETRY"] = "1" if args.block_telemetry else "0"
+    if args.journal:
+        os.environ["PAKI_JOURNAL"] = args.journal
+    if args.pool:
+        os.environ["PAKI_POOL_SIZE"] = str(args.pool)
+
+
+if __name__ == "__main__":
+    CLI_ARGS = parse_args(sys.argv[1:])
+    apply_cli_overrides(CLI_ARGS)
+
+
 # ============================================================
-# Global application state (single browser / page instance)
+# Global application state (one browser / context, N chat tabs)
 # ============================================================
 state: dict[str, Page | Browser | BrowserContext | None] = {
     "playwright": None,
     "browser": None,
     "context": None,
-    "page": None,
+    # Loaded spare page that replaces a tab's page when it breaks
+    "standby": None,
 }
 
-CHAT_URL = "https://chatgpt.com/"
+# Active push-mode streams: stream id -> queue of observer events
+streams: dict[str, asyncio.Queue] = {}
+
+CHAT_URL = os.getenv("PAKI_CHAT_URL", "https://chatgpt.com/")
 PROMPT_SELECTOR = "#prompt-textarea"
 STOP_BUTTON_SELECTOR = 'button[data-testid="stop-button"]'
+SEND_BUTTON_SELECTOR = 'button[data-testid="send-button"]'
 ASSISTANT_SELECTOR = 'div[data-message-author-role="assistant"]'
 POPUP_XPATH = "//a[contains(text(), 'Stay logged out')]"
+LOGIN_BUTTON_SELECTOR = 'button[data-testid="login-button"]'
+
+# "push": in-page MutationObserver sends deltas through a binding.
+# "poll": legacy loop that re-reads the last message every 50 ms.
+STREAM_MODE = os.getenv("PAKI_STREAM_MODE", "push").lower()
+
+# Session file from save_auth.py. Set to "" to start without a stored
+# session (e.g. against the local fake chat page in bench/).
+AUTH_FILE = os.getenv("PAKI_AUTH_FILE", "auth.json")
+HEADLESS = os.getenv("PAKI_HEADLESS", "0") == "1"
+
+# auth.json is polled for changes this often (seconds, 0 = off); a new
+# session from save_auth.py is loaded without restarting the server
+AUTH_WATCH_SECONDS = float(os.getenv("PAKI_AUTH_WATCH_SECONDS", "5"))
+# How often to check that the page is still logged in (0 = off), and
+# the session cookie whose presence / expiry is checked with it
+SESSION_CHECK_SECONDS = float(os.getenv("PAKI_SESSION_CHECK_SECONDS", "60"))
+SESSION_COOKIE = os.getenv("PAKI_SESSION_COOKIE", "__Secure-next-auth.session-token")
+
+# ---- Browser footprint (see also the CLI in __main__) ----
+VIEWPORT = os.getenv("PAKI_VIEWPORT", "1280x800")
+BROWSER_ARGS = shlex.split(os.getenv("PAKI_BROWSER_ARGS", ""))
+NAVIGATION_TIMEOUT_MS = int(os.getenv("PAKI_NAVIGATION_TIMEOUT_MS", "60000"))
+
+# Requests the automation never needs are aborted before they hit the
+# network. Matching is done by URL pattern in the Playwright driver, so
+# unmatched requests never round-trip through Python. Note that any
+# routing disables Chromium's HTTP cache; set both to "" / 0 to compare.
+BLOCK_RESOURCES = [
+    ext for ext in os.getenv(
+        "PAKI_BLOCK_RESOURCES",
+        "png,jpg,jpeg,gif,webp,avif,ico,bmp,mp3,mp4,webm,ogg,wav,woff,woff2,ttf,otf",
+    ).split(",") if ext
+]
+BLOCK_TELEMETRY = os.getenv("PAKI_BLOCK_TELEMETRY", "1") == "1"
+TELEMETRY_PATTERNS = [
+    r"/ces/v1/",
+    r"browser-intake-[\w.-]*datadoghq",
+    r"sentry\.io",
+    r"google-analytics\.com",
+    r"googletagmanager\.com",
+    r"events\.statsigapi\.net",
+    r"/v1/rgstr",
+]
+
+# Upper bound on waiting for the UI to accept a prompt before pressing
+# Enter anyway (the send button normally enables within a few ms).
+SUBMIT_READY_TIMEOUT_MS = int(os.getenv("PAKI_SUBMIT_READY_TIMEOUT_MS", "2000"))
+
+# Default per-request deadline in seconds (queue wait included);
+# callers can override it with ?timeout=.
+REQUEST_TIMEOUT = float(os.getenv("PAKI_REQUEST_TIMEOUT", "300"))
+# How often a silent request checks whether its client is still there
+DISCONNECT_POLL_SECONDS = 1.0
+# How long to wait for the page to go idle after clicking stop
+STOP_SETTLE_TIMEOUT_MS = int(os.getenv("PAKI_STOP_SETTLE_TIMEOUT_MS", "5000"))
+
+# WebSocket delta coalescing: a frame goes out once this long has passed
+# since its first delta, or once it holds this many bytes. Clients can
+# override both per connection (/ws?coalesce_ms=&coalesce_bytes=).
+WS_COALESCE_MS = float(os.getenv("PAKI_WS_COALESCE_MS", "50"))
+WS_COALESCE_BYTES = int(os.getenv("PAKI_WS_COALESCE_BYTES", "4096"))
+
+# Requests allowed to wait for a tab; beyond this callers get a 429.
+MAX_QUEUE = int(os.getenv("PAKI_MAX_QUEUE", "16"))
+
+# Chat tabs generating in parallel (one conversation each). Each tab
+# costs roughly one renderer process of memory.
+POOL_SIZE = max(1, int(os.getenv("PAKI_POOL_SIZE", "1")))
+
+# One generation at a time per tab
+scheduler = PageScheduler(max_queue=MAX_QUEUE, slots=POOL_SIZE)
+pool = PagePool()
+
+# Identical prompts arriving while one is generating share that
+# generation instead of queueing again (PAKI_SINGLEFLIGHT=0 disables)
+SINGLEFLIGHT = os.getenv("PAKI_SINGLEFLIGHT", "1") == "1"
+flights = FlightGroup()
+
+# Persistent prompt -> response cache (PAKI_CACHE=0 disables it)
+CACHE_ENABLED = os.getenv("PAKI_CACHE", "1") == "1"
+CACHE_PATH = os.getenv("PAKI_CACHE_PATH", "paki_cache.sqlite3")
+CACHE_MAX_BYTES = int(float(os.getenv("PAKI_CACHE_MAX_MB", "64")) * 1024 * 1024)
+CACHE_TTL = float(os.getenv("PAKI_CACHE_TTL", str(7 * 24 * 3600)))
+CACHE_REPLAY_CHUNK = 256
+
+cache: ResponseCache | None = None
+
+# Request journal for traffic capture / replay (PAKI_JOURNAL=path; a
+# .gz path is compressed). PAKI_JOURNAL_PROMPTS=1 stores prompt text too.
+JOURNAL_PATH = os.getenv("PAKI_JOURNAL", "")
+JOURNAL_MAX_BYTES = int(float(os.getenv("PAKI_JOURNAL_MAX_MB", "64")) * 1024 * 1024)
+JOURNAL_BACKUPS = int(os.getenv("PAKI_JOURNAL_BACKUPS", "5"))
+JOURNAL_PROMPTS = os.getenv("PAKI_JOURNAL_PROMPTS", "0") == "1"
+
+journal: RequestJournal | None = None
+
+# Start a fresh conversation once any threshold is crossed (0 = ignore)
+ROTATE_TURNS = int(os.getenv("PAKI_ROTATE_TURNS", "25"))
+ROTATE_ASSISTANT_NODES = int(os.getenv("PAKI_ROTATE_NODES", "50"))
+ROTATE_HEAP_MB = float(os.getenv("PAKI_ROTATE_HEAP_MB", "512"))
+
+# Keep a second, fully loaded chat page ready to take over from a broken
+# one, instead of reloading the broken page while requests wait
+# (PAKI_STANDBY=0 disables; costs one extra tab)
+STANDBY_ENABLED = os.getenv("PAKI_STANDBY", "1") == "1"
+
+# Conversation rotation bookkeeping and the last page sample (from any
+# tab), reported by /stats; turns are counted per tab
+page_stats: dict[str, object] = {
+    "rotations": 0,
+    "last_rotation_reason": None,
+    "dom_nodes": None,
+    "assistant_nodes": None,
+    "js_heap_bytes": None,
+    "last_timings_ms": None,
+}
+
+# Startup cost and interception figures, reported by /stats
+browser_stats: dict[str, object] = {
+    "headless": HEADLESS,
+    "viewport": VIEWPORT,
+    "startup_seconds": None,
+    "blocked_requests": 0,
+}
+
+# Standby page swaps and warm-ups, reported by /stats
+standby_stats: dict[str, object] = {
+    "enabled": STANDBY_ENABLED,
+    "ready": False,
+    "swaps": 0,
+    "reloads": 0,
+    "warmups": 0,
+    "warmup_failures": 0,
+    "last_warmup_seconds": None,
+    "last_swap_ms": None,
+}
+
+# auth.json reloads and the last session check, reported by /readyz
+# and /stats. logged_in is None until the first check ran.
+auth_stats: dict[str, object] = {
+    "mtime": None,
+    "reloads": 0,
+    "reload_failures": 0,
+    "last_reload": None,
+    "logged_in": None,
+    "logged_out_since": None,
+    "last_check": None,
+}
+
+# WebSocket sessions, and stream deltas vs. frames actually sent
+ws_stats: dict[str, int] = {"sessions": 0, "deltas": 0, "frames": 0}
+
+# One JSON line per finished request on stdout (PAKI_JSON_LOGS=1)
+metrics.json_logs = os.getenv("PAKI_JSON_LOGS", "0") == "1"
+
+# Fire-and-forget work that must outlive the request (keeps references)
+background_tasks: set[asyncio.Task] = set()
 
 
 # ============================================================
@@ -35,7 +298,17 @@ async def lifespan(app: FastAPI):
     Initializes Playwright and warms up ChatGPT session on startup.
     Ensures clean shutdown of browser resources.
     """
+    global cache, journal
+    if CACHE_ENABLED:
+        cache = open_cache(CACHE_PATH, CACHE_MAX_BYTES, CACHE_TTL)
+    if JOURNAL_PATH:
+        journal = RequestJournal(JOURNAL_PATH, JOURNAL_MAX_BYTES, JOURNAL_BACKUPS, JOURNAL_PROMPTS)
+        journal.start()
+        metrics.journal = journal
+        print(f"Journaling requests to {JOURNAL_PATH}.")
+
     print("Initializing Playwright...")
+    started = time.perf_counter()
 
     state["playwright"] = await async_playwright().start()
 
@@ -43,53 +316,69 @@ async def lifespan(app: FastAPI):
     try:
         state["browser"] = await state["playwright"].chromium.launch(
             channel="chrome",
-            headless=False,  # set True for production
+            headless=HEADLESS,  # PAKI_HEADLESS=1 for production
             args=[
                 "--disable-blink-features=AutomationControlled",
                 "--no-sandbox",
+                *BROWSER_ARGS,
             ],
         )
     except Exception as e:
         print(f"Chrome launch failed ({e}), falling back to Chromium.")
         state["browser"] = await state["playwright"].chromium.launch(
-            headless=False,
-            args=["--disable-blink-features=AutomationControlled"],
+            headless=HEADLESS,
+            args=["--disable-blink-features=AutomationControlled", *BROWSER_ARGS],
         )
 
     # ---- Load authenticated context ----
-    if not os.path.exists("auth.json"):
-        print("ERROR: auth.json not found. Run save_auth.py first.")
+    auth_stats["mtime"] = auth_mtime()
+    if AUTH_FILE and not os.path.exists(AUTH_FILE):
+        print(f"ERROR: {AUTH_FILE} not found. Run save_auth.py first.")
     else:
         print("Loading session and warming up ChatGPT...")
-        state["context"] = await state["browser"].new_context(
-            storage_state="auth.json"
-        )
-        state["page"] = await state["context"].new_page()
+        state["context"] = await new_chat_context(state["browser"])
 
-        # Apply stealth once
-        stealth = Stealth()
-        await stealth.apply_stealth_async(state["page"])
-
-        print("Navigating to ChatGPT...")
-        await state["page"].goto(
-            CHAT_URL,
-            timeout=60_000,
-            wait_until="domcontentloaded",
+        print(f"Navigating to ChatGPT ({POOL_SIZE} tab(s))...")
+        opened = await asyncio.gather(
+            *(open_chat_page(state["context"]) for _ in range(POOL_SIZE)),
+            return_exceptions=True,
         )
-
-        try:
-            await state["page"].wait_for_selector(
-                PROMPT_SELECTOR, timeout=60_000
-            )
-            print("SUCCESS: ChatGPT session is ready.")
-        except Exception:
+        for result in opened:
+            if isinstance(result, BaseException):
+                print(f"WARNING: A chat tab failed to open: {result}")
+            else:
+                pool.add(result[0])
+        scheduler.slots = max(1, len(pool))
+        ready = any(not isinstance(r, BaseException) and r[1] for r in opened)
+        if ready:
+            print(f"SUCCESS: ChatGPT session is ready ({len(pool)} tab(s)).")
+            if STANDBY_ENABLED:
+                # After startup, so it does not delay readiness
+                ensure_standby()
+        else:
             print(
                 "WARNING: Prompt box not found. "
                 "You may be on a Cloudflare or login screen."
             )
 
+    browser_stats["startup_seconds"] = round(time.perf_counter() - started, 2)
+    rss = await asyncio.to_thread(procstats.rss_bytes, os.getpid())
+    print(
+        f"Startup took {browser_stats['startup_seconds']}s, "
+        f"RSS {rss / 1024 / 1024:.0f} MB (headless={HEADLESS})."
+    )
+
+    # Picks up a new auth.json (also one that did not exist at startup)
+    if AUTH_FILE and AUTH_WATCH_SECONDS > 0:
+        monitor_tasks.append(spawn(watch_auth_file()))
+    if SESSION_CHECK_SECONDS > 0:
+        monitor_tasks.append(spawn(watch_session()))
+
     yield  # ---- Application runs here ----
 
+    for task in monitor_tasks:
+        task.cancel()
+
     # ---- Shutdown ----
     print("Shutting down Playwright...")
     try:
@@ -103,6 +392,14 @@ async def lifespan(app: FastAPI):
         # Avoid noisy shutdown errors on Windows
         pass
 
+    if cache:
+        cache.close()
+    if standby_task is not None:
+        standby_task.cancel()
+    if journal:
+        metrics.journal = None
+        await journal.close()
+
 
 app = FastAPI(lifespan=lifespan)
 
@@ -110,6 +407,72 @@ app = FastAPI(lifespan=lifespan)
 # ============================================================
 # Utility helpers
 # ============================================================
+def blocked_url_pattern() -> re.Pattern | None:
+    """
+    One regex for every request to abort, or None if blocking is off.
+    """
+    patterns = []
+    if BLOCK_RESOURCES:
+        extensions = "|".join(re.escape(ext) for ext in BLOCK_RESOURCES)
+        patterns.append(rf"\.(?:{extensions})(?:[?#].*)?$")
+    if BLOCK_TELEMETRY:
+        patterns.extend(TELEMETRY_PATTERNS)
+    if not patterns:
+        return None
+    return re.compile("|".join(f"(?:{p})" for p in patterns), re.IGNORECASE)
+
+
+async def abort_route(route: Route) -> None:
+    browser_stats["blocked_requests"] += 1
+    await route.abort()
+
+
+async def install_request_blocking(context: BrowserContext) -> None:
+    pattern = blocked_url_pattern()
+    if pattern is not None:
+        await context.route(pattern, abort_route)
+
+
+async def new_chat_context(browser: Browser) -> BrowserContext:
+    """
+    A browser context with the stored session and request blocking.
+    """
+    width, height = (int(v) for v in VIEWPORT.lower().split("x"))
+    context = await browser.new_context(
+        storage_state=AUTH_FILE or None,
+        viewport={"width": width, "height": height},
+    )
+    await install_request_blocking(context)
+    return context
+
+
+async def open_chat_page(context: BrowserContext) -> tuple[Page, bool]:
+    """
+    Opens a new tab with stealth and the stream binding applied and
+    loads the chat. Returns (page, ready); ready is False when the
+    prompt box did not show up (Cloudflare or login screen).
+    """
+    page = await context.new_page()
+
+    # Apply stealth once per page
+    stealth = Stealth()
+    await stealth.apply_stealth_async(page)
+
+    # Channel for push-mode streaming (survives navigations)
+    await page.expose_binding(STREAM_BINDING, dispatch_stream_event)
+
+    await page.goto(
+        CHAT_URL,
+        timeout=NAVIGATION_TIMEOUT_MS,
+        wait_until="domcontentloaded",
+    )
+    try:
+        await page.wait_for_selector(PROMPT_SELECTOR, timeout=NAVIGATION_TIMEOUT_MS)
+        return page, True
+    except Exception:
+        return page, False
+
+
 async def dismiss_popup(page: Page) -> None:
     """
     Non-blocking popup dismissal.
@@ -120,148 +483,1540 @@ async def dismiss_popup(page: Page) -> None:
         await popup.first.click()
 
 
-async def get_last_assistant_message(page: Page) -> str | None:
+def dispatch_stream_event(source: dict, event: dict) -> None:
+    """
+    Binding callback for the in-page stream observer.
+    Routes the event to the queue of the stream that installed it;
+    events from stale observers are dropped.
+    """
+    queue = streams.get(event.get("id"))
+    if queue is not None:
+        queue.put_nowait(event)
+
+
+def stable_delta(sent: str, previous: str, current: str) -> tuple[str, str]:
     """
-    Returns the text of the last assistant message, if any.
+    Returns (delta, committed) given the text already sent and the last
+    two snapshots. Only the prefix shared by both snapshots is committed,
+    so transient layout characters at the growing edge are never streamed.
+    Mirrors the commit rule of the in-page observer.
     """
-    messages = await page.query_selector_all(ASSISTANT_SELECTOR)
-    if not messages:
+    stable = os.path.commonprefix([previous, current]).rstrip()
+    if len(stable) <= len(sent):
+        return "", sent
+    return stable[len(os.path.commonprefix([sent, stable])):], stable
+
+
+def spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+
+async def sample_page(page: Page) -> dict:
+    """
+    Updates page_stats with the current DOM / heap size (one evaluate).
+    """
+    sample = await page.evaluate(PAGE_STATS_JS, [ASSISTANT_SELECTOR])
+    page_stats.update(sample)
+    return sample
+
+
+def rotation_reason(sample: dict, turns: int) -> str | None:
+    if ROTATE_TURNS and turns >= ROTATE_TURNS:
+        return "turns"
+    if ROTATE_ASSISTANT_NODES and sample["assistant_nodes"] >= ROTATE_ASSISTANT_NODES:
+        return "assistant_nodes"
+    heap = sample["js_heap_bytes"]
+    if ROTATE_HEAP_MB and heap and heap >= ROTATE_HEAP_MB * 1024 * 1024:
+        return "js_heap"
+    return None
+
+
+async def maybe_rotate_conversation(tab: Tab) -> None:
+    """
+    Opens a fresh conversation on the tab once its current one grew past
+    a threshold, so extraction cost and Chrome's heap stay flat.
+    """
+    page = tab.page
+    tab.turns += 1
+    reason = rotation_reason(await sample_page(page), tab.turns)
+    if not reason:
+        return
+
+    print(f"Rotating conversation on tab {tab.index} ({reason}, {tab.turns} turns).")
+    await page.goto(CHAT_URL, wait_until="domcontentloaded")
+    await page.wait_for_selector(PROMPT_SELECTOR, timeout=30_000)
+    tab.turns = 0
+    pool.forget(tab)
+    page_stats["rotations"] += 1
+    page_stats["last_rotation_reason"] = reason
+    await sample_page(page)
+
+
+# ============================================================
+# Hot standby page
+# ============================================================
+# A spare tab in the same context, loaded and showing the prompt box,
+# kept aside while the pool serves requests. When a request leaves its
+# tab broken, recover_page() swaps the standby in (the failing
+# request and everyone queued behind it wait milliseconds instead of a
+# full reload), closes the broken page and warms a new standby in the
+# background.
+standby_task: asyncio.Task | None = None
+
+
+async def close_page(page: Page) -> None:
+    try:
+        await page.close()
+    except Exception:
+        pass
+
+
+def ensure_standby() -> None:
+    """
+    Starts warming a standby page in the background, unless one is
+    ready or already warming.
+    """
+    global standby_task
+    if not STANDBY_ENABLED or state["context"] is None or state["standby"] is not None:
+        return
+    if standby_task is not None and not standby_task.done():
+        return
+    standby_task = spawn(warm_standby())
+
+
+async def warm_standby() -> None:
+    context = state["context"]
+    started = time.perf_counter()
+    page = None
+    ready = False
+    try:
+        page, ready = await open_chat_page(context)
+    except Exception as e:
+        print(f"WARNING: Standby page failed to load: {e}")
+    seconds = time.perf_counter() - started
+
+    # The context may have been replaced meanwhile; its pages are useless
+    if not ready or context is not state["context"]:
+        standby_stats["warmup_failures"] += 1
+        if page is not None:
+            await close_page(page)
+        return
+    state["standby"] = page
+    standby_stats["ready"] = True
+    standby_stats["warmups"] += 1
+    standby_stats["last_warmup_seconds"] = round(seconds, 2)
+    STANDBY_WARMUP_SECONDS.observe(seconds)
+
+
+async def recover_page(page: Page) -> str:
+    """
+    Resets a page a failure left in an unknown state. Swaps in the
+    standby if it still has its prompt box, otherwise reloads the page
+    in place. Returns "swap" or "reload". The caller must hold the
+    page's tab, so no other request sees the swap half-done.
+    """
+    tab = pool.find(page)
+    standby = state["standby"]
+    if standby is not None and tab is not None:
+        started = time.perf_counter()
+        state["standby"] = None
+        standby_stats["ready"] = False
+        try:
+            usable = not standby.is_closed() and await standby.locator(PROMPT_SELECTOR).count() > 0
+        except Exception:
+            usable = False
+        if usable:
+            tab.page = standby
+            tab.turns = 0
+            pool.forget(tab)
+            standby_stats["swaps"] += 1
+            standby_stats["last_swap_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            spawn(close_page(page))
+            ensure_standby()
+            return "swap"
+        # Went stale while waiting (e.g. logged out): fall back to a reload
+        spawn(close_page(standby))
+
+    await page.reload(wait_until="domcontentloaded")
+    RELOADS.inc()
+    standby_stats["reloads"] += 1
+    if tab is not None:
+        tab.turns = 0
+        pool.forget(tab)
+    ensure_standby()
+    return "reload"
+
+
+# ============================================================
+# auth.json hot reload and session checks
+# ============================================================
+# watch_auth_file() polls the mtime of auth.json. When save_auth.py
+# writes a new session, a fresh context and page are built in the
+# background next to the old ones and swapped in between two requests;
+# only then is the old context closed. watch_session() periodically
+# checks that the page is still logged in, so an expired session shows
+# up in /readyz (and requests fail fast) instead of as timeouts.
+
+# Goes ahead of every queued request, but never interrupts a generation
+RELOAD_PRIORITY = -1
+
+monitor_tasks: list[asyncio.Task] = []
+
+
+def auth_mtime() -> float | None:
+    try:
+        return os.stat(AUTH_FILE).st_mtime if AUTH_FILE else None
+    except OSError:
         return None
-    return (await messages[-1].inner_text()).strip()
 
 
-async def safe_fill_input(page: Page, prompt: str) -> None:
+def auth_file_complete() -> bool:
+    """
+    False while save_auth.py is still writing the file.
+    """
+    try:
+        with open(AUTH_FILE, encoding="utf-8") as f:
+            return isinstance(json.load(f).get("cookies"), list)
+    except (OSError, ValueError, AttributeError):
+        return False
+
+
+async def close_context(context: BrowserContext) -> None:
+    try:
+        await context.close()
+    except Exception:
+        pass
+
+
+async def reload_auth() -> bool:
+    """
+    Builds a context from the current auth.json and swaps it in, with a
+    fresh set of tabs, once every tab is free. Keeps the old context if
+    the new one does not get to a logged-in chat (unless the current one
+    is logged out too). Returns True if swapped; raises QueueFull if the
+    swap could not be queued (try again later).
+    """
+    started = time.perf_counter()
+    context = None
+    pages: list[Page] = []
+    ready = False
+    try:
+        context = await new_chat_context(state["browser"])
+        opened = await asyncio.gather(
+            *(open_chat_page(context) for _ in range(len(pool) or POOL_SIZE))
+        )
+        pages = [page for page, _ in opened]
+        ready = all(tab_ready for _, tab_ready in opened)
+        # A logged-out file must not replace a session that still works
+        if ready and auth_stats["logged_in"] is not False:
+            ready = await logged_in(pages[0], context)
+    except Exception as e:
+        print(f"WARNING: Could not load the new session: {e}")
+        ready = False
+    if not ready:
+        if context is not None:
+            await close_context(context)
+        auth_stats["reload_failures"] += 1
+        print("WARNING: New auth.json is not logged in to the chat; keeping the current session.")
+        return False
+
+    # One ticket per slot: holding all of them means no tab is generating
+    tickets = []
+    try:
+        for _ in range(scheduler.slots):
+            tickets.append(scheduler.reserve(RELOAD_PRIORITY))
+    except QueueFull:
+        for ticket in tickets:
+            ticket.release()
+        await close_context(context)
+        raise
+    try:
+        for ticket in tickets:
+            await ticket.acquire()
+        old_context = state["context"]
+        state["context"], state["standby"] = context, None
+        pool.replace_all(pages)
+        scheduler.slots = len(pool)
+        standby_stats["ready"] = False
+    finally:
+        for ticket in tickets:
+            ticket.release()
+
+    if old_context is not None:
+        spawn(close_context(old_context))
+    auth_stats["reloads"] += 1
+    auth_stats["last_reload"] = round(time.time(), 3)
+    print(f"Loaded new session from {AUTH_FILE} in {time.perf_counter() - started:.1f}s.")
+    ensure_standby()
+    await check_session()
+    return True
+
+
+async def watch_auth_file() -> None:
+    while True:
+        await asyncio.sleep(AUTH_WATCH_SECONDS)
+        mtime = auth_mtime()
+        if mtime is None or mtime == auth_stats["mtime"] or not auth_file_complete():
+            continue
+        if state["browser"] is None:
+            continue
+        print(f"{AUTH_FILE} changed, loading the new session...")
+        try:
+            await reload_auth()
+        except QueueFull:
+            continue
+        # A session that did not work is not retried until the file changes
+        auth_stats["mtime"] = mtime
+
+
+async def logged_in(page: Page, context: BrowserContext) -> bool:
+    """
+    No login button on the page and, with a stored session, its cookie
+    still present and unexpired. Raises if the page cannot be read.
+    """
+    probe = await asyncio.wait_for(
+        page.evaluate(SESSION_CHECK_JS, [PROMPT_SELECTOR, LOGIN_BUTTON_SELECTOR]),
+        timeout=5,
+    )
+    if probe["login_button"]:
+        return False
+    if AUTH_FILE and SESSION_COOKIE:
+        now = time.time()
+        return any(
+            c["name"].startswith(SESSION_COOKIE) and (c.get("expires", -1) < 0 or c["expires"] > now)
+            for c in await context.cookies()
+        )
+    return True
+
+
+async def check_session() -> bool | None:
+    """
+    One logged-in check on a serving tab. Updates auth_stats;
+    returns None if the page could not be checked.
+    """
+    page, context = pool.any_page(), state["context"]
+    if page is None or context is None:
+        return None
+    try:
+        ok = await logged_in(page, context)
+    except Exception:
+        # Page mid-navigation (e.g. rotating); try again next time
+        return None
+
+    auth_stats["last_check"] = round(time.time(), 3)
+    if not ok and auth_stats["logged_in"] is not False:
+        auth_stats["logged_out_since"] = auth_stats["last_check"]
+        print(f"WARNING: Session looks logged out. Run save_auth.py; {AUTH_FILE} is reloaded automatically.")
+    elif ok:
+        auth_stats["logged_out_since"] = None
+    auth_stats["logged_in"] = ok
+    return ok
+
+
+async def watch_session() -> None:
+    while True:
+        await check_session()
+        await asyncio.sleep(SESSION_CHECK_SECONDS)
+
+
+async def after_generation(
+    tab: Tab,
+    page: Page,
+    ticket: Ticket,
+    abort: bool = False,
+    seconds: float | None = None,
+    failed: bool = False,
+) -> None:
+    """
+    Between-requests housekeeping, run after the response was sent.
+    `abort` stops a generation that may still be running first.
+    The tab stays reserved until it is done.
+    """
+    try:
+        # A page that was swapped for the standby after a failure is
+        # already being closed; nothing to clean up
+        if abort and tab.page is page:
+            await stop_generation(page)
+        if tab.page is page:
+            await maybe_rotate_conversation(tab)
+    except Exception as e:
+        print(f"WARNING: Conversation rotation failed: {e}")
+    finally:
+        if seconds is not None:
+            TAB_GENERATION_SECONDS.observe(seconds, tab=str(tab.index))
+        # The tab must be free before the ticket hands its slot on
+        pool.release(tab, seconds, failed)
+        ticket.release()
+
+
+async def wait_until(awaitable, deadline: float | Callable[[], float]):
+    """
+    asyncio.wait_for() against a deadline that is re-read while waiting
+    (see time_left()). Raises asyncio.TimeoutError, after cancelling
+    `awaitable`, once it has passed.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while not task.done():
+            left = time_left(deadline)
+            if left <= 0:
+                raise asyncio.TimeoutError()
+            await asyncio.wait({task}, timeout=left)
+        return task.result()
+    finally:
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+async def acquire_before(ticket: Ticket, deadline: float | Callable[[], float]) -> bool:
+    """
+    Waits for a tab until the deadline. False (and the ticket is
+    given up) if the request's time ran out in the queue.
+    """
+    try:
+        await wait_until(ticket.acquire(), deadline)
+        return True
+    except asyncio.TimeoutError:
+        ticket.release()
+        return False
+
+
+def last_stage(trace: RequestTrace) -> str:
+    """
+    Stage that was running when a deadline hit (the one after the last
+    completed mark).
+    """
+    order = ["popup", "fill", "submit", "start", "first_token", "generate", "extract"]
+    done = [stage for stage in order if trace.has(stage)]
+    if not done:
+        return "popup"
+    index = order.index(done[-1]) + 1
+    return order[index] if index < len(order) else "extract"
+
+
+def cache_policy(request: Request) -> tuple[bool, bool]:
+    """
+    Returns (read, write) for this request.
+    `X-Paki-Cache: bypass` or `Cache-Control: no-cache` skips the lookup
+    (the fresh answer is still stored); `Cache-Control: no-store` or
+    `X-Paki-Cache: off` skips both, as does `X-Paki-Session`: a turn of a
+    conversation is answered in its context, not from another one.
+    """
+    if cache is None or session_key(request):
+        return False, False
+    control = request.headers.get("cache-control", "").lower()
+    mode = request.headers.get("x-paki-cache", "").lower()
+    write = "no-store" not in control and mode != "off"
+    read = write and "no-cache" not in control and mode != "bypass"
+    return read, write
+
+
+def session_key(request: Request) -> str | None:
+    """
+    `X-Paki-Session` names a conversation: requests carrying the same
+    value go to the tab that served it before, when that tab is idle.
+    """
+    return request.headers.get("x-paki-session") or None
+
+
+def cache_status(read: bool) -> str:
+    if cache is None:
+        return "OFF"
+    return "MISS" if read else "BYPASS"
+
+
+async def cache_lookup(prompt: str, read: bool) -> str | None:
+    if not read:
+        return None
+    return await asyncio.to_thread(cache.get, prompt)
+
+
+async def cache_store(prompt: str, response: str, write: bool) -> None:
+    if write and response:
+        await asyncio.to_thread(cache.put, prompt, response)
+
+
+async def read_answer(page: Page, baseline: int = 0, partial: bool = False) -> str | None:
+    """
+    The last assistant message as markdown (code fences, lists and
+    tables kept), in a single evaluate. None if the page has no more
+    than `baseline` assistant messages. `partial` for a message that is
+    still being generated (see MARKDOWN_JS).
+    """
+    text = await page.evaluate(ANSWER_MARKDOWN_JS, [ASSISTANT_SELECTOR, baseline, partial])
+    return text.strip() if text is not None else None
+
+
+class GenerationTimeout(RuntimeError):
+    """
+    A generation stage did not happen in time (e.g. it never started).
+    """
+
+
+class DeadlineExceeded(GenerationTimeout):
+    """
+    The request's deadline passed before the answer was complete.
+    """
+
+
+class ClientDisconnected(Exception):
+    """
+    The HTTP client went away while its generation was running.
+    """
+
+
+def request_deadline(timeout: float | None) -> float:
+    """
+    Absolute loop time by which the request must be finished.
+    """
+    seconds = timeout if timeout and timeout > 0 else REQUEST_TIMEOUT
+    return asyncio.get_running_loop().time() + seconds
+
+
+def time_left(deadline: float | Callable[[], float]) -> float:
+    """
+    Seconds until `deadline`: a loop time, or a function returning one
+    (a shared flight's deadline, which grows as requests join it).
+    """
+    if callable(deadline):
+        deadline = deadline()
+    return deadline - asyncio.get_running_loop().time()
+
+
+def playwright_timeout(deadline: float | Callable[[], float], limit_ms: float | None = None) -> float:
     """
-    Safely fills the ChatGPT input box using evaluated JavaScript.
-    This works much better for large multi-line prompts than page.fill().
+    Time left until `deadline` as a Playwright timeout (ms, at most
+    `limit_ms`). Never 0, which Playwright reads as "wait forever".
     """
-    # 1. Focus the element
-    await page.focus(PROMPT_SELECTOR)
-    
-    # 2. Use JS to set the text content directly (bypass slow typing)
-    # We must trigger an 'input' event so React/ChatGPT knows the text changed
-    await page.evaluate(f"""
-        const el = document.querySelector('{PROMPT_SELECTOR}');
-        el.innerText = `{{}}`;
-        el.dispatchEvent(new Event('input', {{ bubbles: true }}));
-    """.format(prompt.replace('`', '\\`').replace('${', '\\${')))
-    
-    # 3. Small wait to let the UI react
-    await asyncio.sleep(0.5)
+    left = max(1, time_left(deadline) * 1000)
+    return min(left, limit_ms) if limit_ms is not None else left
+
+
+async def guarded(
+    stream: AsyncGenerator[str, None],
+    request: Request,
+    deadline: float | Callable[[], float],
+) -> AsyncGenerator[str, None]:
+    """
+    Re-yields `stream` until it ends. Raises DeadlineExceeded or
+    ClientDisconnected (after cancelling `stream`) when the deadline
+    passes or the client leaves, checking at least every
+    DISCONNECT_POLL_SECONDS even while no text arrives.
+    """
+    iterator = stream.__aiter__()
+    pending: asyncio.Future | None = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+
+            left = time_left(deadline)
+            if left <= 0:
+                raise DeadlineExceeded("Deadline exceeded.")
+
+            done, _ = await asyncio.wait(
+                {pending}, timeout=min(left, DISCONNECT_POLL_SECONDS)
+            )
+            if pending in done:
+                try:
+                    item = pending.result()
+                except StopAsyncIteration:
+                    return
+                finally:
+                    pending = None
+                yield item
+            elif await request.is_disconnected():
+                raise ClientDisconnected("Client disconnected.")
+    finally:
+        if pending is not None:
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+        await iterator.aclose()
+
+
+async def stop_generation(page: Page) -> None:
+    """
+    Frees the page after a cut-short request: clicks the stop button and
+    waits for the page to settle. Falls back to a reload only if that
+    fails, which is far more expensive.
+    """
+    try:
+        stop = page.locator(STOP_BUTTON_SELECTOR)
+        if await stop.count() == 0:
+            return
+        await stop.first.click(timeout=2_000)
+        await page.wait_for_selector(
+            STOP_BUTTON_SELECTOR, state="hidden", timeout=STOP_SETTLE_TIMEOUT_MS
+        )
+        CANCELLATIONS.inc(method="stop")
+    except Exception as e:
+        print(f"WARNING: Stop button did not settle the page ({e}); resetting it.")
+        CANCELLATIONS.inc(method=await recover_page(page))
+
+
+async def submit_prompt(page: Page, prompt: str, trace: RequestTrace) -> None:
+    """
+    Injects the prompt as an evaluate argument (safe for any text,
+    including `{}`, backticks and `${`), waits only until the UI has taken
+    it, then presses Enter. Records "fill" and "submit" stages.
+    """
+    result = await page.evaluate(
+        SUBMIT_PROMPT_JS,
+        [PROMPT_SELECTOR, SEND_BUTTON_SELECTOR, prompt, SUBMIT_READY_TIMEOUT_MS],
+    )
+    if not result["found"]:
+        raise RuntimeError("Prompt box not found.")
+    if not result["ready"]:
+        print("WARNING: Send button did not enable; submitting anyway.")
+    trace.mark("fill")
+
+    await page.press(PROMPT_SELECTOR, "Enter")
+    trace.mark("submit")
+
 
 # ============================================================
 # /ask endpoint (non-streaming)
 # ============================================================
 @app.get("/ask")
-async def ask(prompt: str):
-    page: Page | None = state["page"]
-    if not page:
-        return {"error": "Browser not initialized or auth.json invalid."}
+async def ask(
+    request: Request,
+    prompt: str,
+    priority: int = PRIORITY_BATCH,
+    timeout: float | None = None,
+    blocks: bool = False,
+):
+    """
+    The whole answer as markdown. With blocks=true the response also
+    lists its code blocks: [{"index", "lang", "code", "closed"}].
+    """
+    chat = ChatStream(request, prompt, RequestTrace("ask"), priority, timeout, produce=produce_ask)
+    try:
+        await chat.open()
+    except StreamRefused as e:
+        if e.status_code == 503:
+            # /ask has always answered 200 here
+            if not len(pool):
+                return {"error": "Browser not initialized or auth.json invalid."}
+            return {"error": str(e)}
+        return JSONResponse({"error": str(e)}, status_code=e.status_code, headers=e.headers)
+
+    parts = []
+    try:
+        async for delta in chat.deltas():
+            parts.append(delta)
+    except StreamFailed as e:
+        status = 504 if chat.trace.outcome == "timeout" else 200
+        return JSONResponse({"error": str(e)}, status_code=status, headers=chat.headers)
+    finally:
+        chat.finish()
+
+    if chat.trace.outcome == "aborted":
+        return JSONResponse({"error": "Client disconnected."}, headers=chat.headers)
+    response = "".join(parts)
+    body = {
+        "response": response,
+        "queue_wait": float(chat.headers["X-Queue-Wait"]),
+        "timings_ms": chat.trace.timings,
+    }
+    if blocks:
+        # Parsed from the text, so cached and shared answers have them too
+        body["blocks"] = [vars(block) for block in extract_blocks(response)]
+    return JSONResponse(body, headers=chat.headers)
 
+
+async def run_ask(
+    page: Page, prompt: str, trace: RequestTrace, deadline: float | Callable[[], float]
+) -> dict:
+    """
+    Runs one full generation on `page`, until `deadline` at the latest.
+    Caller must hold a ticket.
+    """
     try:
         await dismiss_popup(page)
+        trace.mark("popup")
 
-        # Send prompt securely
-        await safe_fill_input(page, prompt)
-        await page.press(PROMPT_SELECTOR, "Enter")
+        await submit_prompt(page, prompt, trace)
 
         # Wait for generation to start
-        await page.wait_for_selector(
-            STOP_BUTTON_SELECTOR, timeout=15_000
+        try:
+            await page.wait_for_selector(
+                STOP_BUTTON_SELECTOR, timeout=playwright_timeout(deadline, 15_000)
+            )
+        except PlaywrightTimeoutError:
+            raise GenerationTimeout("Generation did not start.")
+        trace.mark("start")
+
+        # Wait until generation finishes (bounded by the request deadline)
+        try:
+            await page.wait_for_selector(
+                STOP_BUTTON_SELECTOR, state="hidden", timeout=playwright_timeout(deadline)
+            )
+        except PlaywrightTimeoutError:
+            raise DeadlineExceeded("Deadline exceeded; generation stopped.")
+        trace.mark("generate")
+
+        response = await read_answer(page)
+        trace.mark("extract")
+        page_stats["last_timings_ms"] = trace.timings
+        if response:
+            # Finished as "ok" by ChatStream once the answer is counted
+            return {"response": response, "timings_ms": trace.timings}
+
+        trace.finish("error")
+        return {"error": "No response captured."}
+
+    except DeadlineExceeded as e:
+        # Cut short like a streamed request: after_generation() stops
+        # the generation, the page needs no reset
+        TIMEOUTS.inc(endpoint=trace.endpoint, stage="generate")
+        trace.finish("timeout")
+        return {"error": str(e)}
+
+    except Exception as e:
+        if isinstance(e, GenerationTimeout):
+            TIMEOUTS.inc(endpoint=trace.endpoint, stage="start")
+        # Reset page for next request
+        method = await recover_page(page)
+        trace.mark(method)
+        trace.finish("timeout" if isinstance(e, GenerationTimeout) else "error")
+        done = "replaced" if method == "swap" else "reloaded"
+        return {"error": f"Task failed: {e}. Page {done}."}
+
+
+# ============================================================
+# Streaming strategies
+# ============================================================
+async def stream_push(
+    page: Page, prompt: str, trace: RequestTrace
+) -> AsyncGenerator[str, None]:
+    """
+    Event-driven streaming: an in-page observer pushes deltas and an
+    end-of-generation signal through the exposed binding, so nothing is
+    re-read from Python and deltas are forwarded as soon as they paint.
+    """
+    stream_id = uuid.uuid4().hex
+    queue: asyncio.Queue = asyncio.Queue()
+    streams[stream_id] = queue
+
+    try:
+        # Observer must be in place before submitting so no text is missed
+        await page.evaluate(
+            STREAM_OBSERVER_JS,
+            [STREAM_BINDING, stream_id, ASSISTANT_SELECTOR, STOP_BUTTON_SELECTOR],
         )
+        await submit_prompt(page, prompt, trace)
 
-        # Wait until generation finishes (timeout=0 for infinite wait)
+        # Wait for generation to start
+        try:
+            event = await asyncio.wait_for(queue.get(), timeout=30)
+        except asyncio.TimeoutError:
+            raise GenerationTimeout("Generation did not start.")
+        trace.mark("start")
+
+        while event["type"] != "done":
+            if event["type"] == "delta":
+                if not trace.has("first_token"):
+                    trace.mark("first_token")
+                yield event["text"]
+            event = await queue.get()
+        trace.mark("generate")
+
+    finally:
+        streams.pop(stream_id, None)
+        try:
+            await page.evaluate(STREAM_OBSERVER_STOP_JS, stream_id)
+        except Exception:
+            pass
+
+
+async def stream_poll(
+    page: Page, prompt: str, trace: RequestTrace
+) -> AsyncGenerator[str, None]:
+    """
+    Legacy polling loop (PAKI_STREAM_MODE=poll).
+    Re-reads the new assistant message every 50 ms and emits only the
+    stable part of what changed.
+    """
+    baseline = await page.locator(ASSISTANT_SELECTOR).count()
+    await submit_prompt(page, prompt, trace)
+
+    # Wait for generation to start
+    try:
         await page.wait_for_selector(
-            STOP_BUTTON_SELECTOR, state="hidden", timeout=0
+            STOP_BUTTON_SELECTOR, timeout=30_000
         )
+    except Exception:
+        raise GenerationTimeout("Generation did not start.")
+    trace.mark("start")
 
-        # Allow final DOM paint
-        await asyncio.sleep(0.1)
+    sent = previous = ""
 
-        response = await get_last_assistant_message(page)
-        if response:
-            return {"response": response}
+    while True:
+        is_generating = await page.locator(
+            STOP_BUTTON_SELECTOR
+        ).is_visible()
 
-        return {"error": "No response captured."}
+        current = await read_answer(page, baseline, partial=is_generating) or ""
+
+        delta, sent = stable_delta(sent, previous, current)
+        if delta:
+            if not trace.has("first_token"):
+                trace.mark("first_token")
+            yield delta
+        previous = current
+
+        if not is_generating:
+            break
+
+        # Balanced polling (CPU vs latency)
+        await asyncio.sleep(0.05)
+
+    trace.mark("generate")
+
+    # Final sweep
+    current = await read_answer(page, baseline)
+    if current is not None:
+        delta, sent = stable_delta(sent, current, current)
+        if delta:
+            yield delta
+
+
+# ============================================================
+# Streamed generation (shared by the streaming endpoints)
+# ============================================================
+class StreamRefused(Exception):
+    """
+    The stream could not start (busy, deadline, no browser).
+    Carries what the endpoint should answer with.
+    """
+
+    def __init__(self, message: str, status_code: int, headers: dict[str, str] | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class StreamFailed(Exception):
+    """
+    The generation ended early; str(e) is the client-facing message.
+    """
+
+
+async def produce_stream(
+    page: Page, prompt: str, trace: RequestTrace, deadline: float | Callable[[], float]
+) -> AsyncGenerator[str, None]:
+    """
+    Live deltas from the page (push or poll mode). The deadline is
+    enforced by guarded() between deltas.
+    """
+    await dismiss_popup(page)
+    trace.mark("popup")
+    stream = stream_push if STREAM_MODE == "push" else stream_poll
+    async for delta in stream(page, prompt, trace):
+        yield delta
+
+
+async def produce_ask(
+    page: Page, prompt: str, trace: RequestTrace, deadline: float | Callable[[], float]
+) -> AsyncGenerator[str, None]:
+    """
+    The whole answer at once, read after generation finished (/ask).
+    """
+    result = await run_ask(page, prompt, trace, deadline)
+    if "response" not in result:
+        raise StreamFailed(result["error"])
+    yield result["response"]
+
+
+async def run_flight(
+    flight: Flight,
+    ticket: Ticket,
+    produce,
+    prompt: str,
+    trace: RequestTrace,
+    write: bool,
+    session: str | None = None,
+) -> None:
+    """
+    Background task behind a Flight: waits for a tab, runs the
+    generation and publishes its text, until the latest deadline of the
+    requests using it. Always frees the tab. Stage timings go to the
+    trace of the request that started the flight.
+    """
+    def deadline() -> float:
+        return flight.deadline
+
+    ok = False
+    tab: Tab | None = None
+    page: Page | None = None
+    started = 0.0
+    try:
+        if not await acquire_before(ticket, deadline):
+            flight.close("timeout", StreamFailed("Deadline exceeded while waiting in the queue."))
+            return
+        try:
+            # A session waits for the tab that holds its conversation
+            tab = await wait_until(pool.acquire(session), deadline)
+        except asyncio.TimeoutError:
+            flight.close("timeout", StreamFailed("Deadline exceeded while waiting for the session's tab."))
+            return
+        page = tab.page
+        started = time.perf_counter()
+        trace.queue_wait = ticket.wait
+        trace.restart()
+        trace.fields["tab"] = tab.index
+        flight.admit(True)
+
+        async for delta in guarded(produce(page, prompt, trace, deadline), flight, deadline):
+            flight.publish(delta)
+        ok = True
+        page_stats["last_timings_ms"] = trace.timings
+        flight.close("ok")
+        # Only complete, error-free answers are cached
+        await cache_store(prompt, flight.text.strip(), write)
+
+    except DeadlineExceeded:
+        TIMEOUTS.inc(endpoint=trace.endpoint, stage=last_stage(trace))
+        flight.close("timeout", StreamFailed("Deadline exceeded; generation stopped."))
+
+    except GenerationTimeout as e:
+        TIMEOUTS.inc(endpoint=trace.endpoint, stage="start")
+        flight.close("timeout", StreamFailed(str(e)))
+
+    except (ClientDisconnected, asyncio.CancelledError):
+        # Abandoned: every request using this flight has gone
+        pass
 
     except Exception as e:
-        # Reset page for next request
-        await page.reload(wait_until="domcontentloaded")
-        return {"error": f"Task failed: {e}. Page reloaded."}
+        # /ask failures were already counted (and the page reloaded)
+        flight.close(trace.outcome or "error", StreamFailed(str(e)))
+
+    finally:
+        flight.close("aborted", StreamFailed("Generation was cancelled."))
+        flights.discard(flight)
+        if tab is not None:
+            spawn(after_generation(
+                tab, page, ticket, abort=not ok,
+                seconds=time.perf_counter() - started,
+                failed=flight.outcome in ("error", "timeout"),
+            ))
+        else:
+            ticket.release()
+
+
+class ChatStream:
+    """
+    One answer from queueing to page release, independent of the wire
+    format. open() finds the answer in the cache, joins an identical
+    generation already in flight, or starts one (see singleflight.py);
+    deltas() yields the text. finish() must run once the response is
+    over and is safe to call more than once.
+    """
+
+    def __init__(
+        self,
+        request: Request,
+        prompt: str,
+        trace: RequestTrace,
+        priority: int = PRIORITY_INTERACTIVE,
+        timeout: float | None = None,
+        produce=produce_stream,
+    ):
+        self.request = request
+        self.session = session_key(request)
+        self.prompt = prompt
+        self.key = prompt_key(prompt)
+        self.trace = trace
+        # Clients may only lower their own priority: anything sooner than
+        # interactive would overtake users and page reloads (RELOAD_PRIORITY)
+        self.priority = max(priority, PRIORITY_INTERACTIVE)
+        self.produce = produce
+        self.deadline = request_deadline(timeout)
+        self.read, self.write = cache_policy(request)
+        # Same prompt, different conversations: different answers
+        self.shared = SINGLEFLIGHT and self.session is None
+        self.cached: str | None = None
+        self.flight: Flight | None = None
+        self.joined = False
+        self.headers: dict[str, str] = {}
+        self._finished = False
+        trace.prompt = prompt
+        trace.fields.update(prompt_hash=self.key[:16], prompt_chars=len(prompt), priority=self.priority)
+
+    async def open(self) -> None:
+        """
+        Raises StreamRefused if the stream cannot start.
+        """
+        trace = self.trace
+        self.cached = await cache_lookup(self.prompt, self.read)
+        if self.cached is not None:
+            trace.add_bytes(self.cached)
+            trace.finish("cache_hit")
+            self.headers = {"X-Cache": "HIT", "X-Queue-Wait": "0.000"}
+            return
+
+        if not len(pool):
+            trace.finish("unavailable")
+            raise StreamRefused("Browser not initialized.", 503)
+        if auth_stats["logged_in"] is False:
+            trace.finish("unavailable")
+            raise StreamRefused(f"Session expired; run save_auth.py to refresh {AUTH_FILE}.", 503)
+
+        # /ask publishes the finished answer once, the streaming endpoints
+        # publish live deltas: only the same kind of output is shared
+        key = f"{self.produce.__name__}:{self.key}"
+        flight = flights.join(key) if self.shared else None
+        if flight is not None:
+            self.joined = True
+            trace.fields["singleflight"] = "joined"
+        else:
+            try:
+                ticket = scheduler.reserve(self.priority)
+            except QueueFull as e:
+                trace.finish("rejected")
+                raise StreamRefused(
+                    "Server busy, queue is full.", 429, {"Retry-After": str(e.retry_after)}
+                )
+            flight = flights.start(key, self.deadline) if self.shared else Flight(key, self.deadline)
+            flight.task = spawn(run_flight(
+                flight, ticket, self.produce, self.prompt, trace, self.write, self.session,
+            ))
+        self.flight = flight
+        flight.attach(self.deadline)
+
+        # Wait for the page before answering so X-Queue-Wait is accurate
+        started = asyncio.get_running_loop().time()
+        try:
+            admitted = await asyncio.wait_for(
+                asyncio.shield(flight.admitted), timeout=max(0, time_left(self.deadline))
+            )
+        except asyncio.TimeoutError:
+            admitted = False
+        wait = asyncio.get_running_loop().time() - started
+        headers = {"X-Queue-Wait": f"{wait:.3f}"}
+        if not admitted:
+            # Before finish(), which would record the request as aborted
+            trace.finish("timeout")
+            self.finish()
+            # Nothing was generated, so the request may be sent again
+            # (unlike a generation timeout, which carries no Retry-After)
+            headers["Retry-After"] = str(scheduler.retry_after())
+            raise StreamRefused("Deadline exceeded while waiting in the queue.", 504, headers)
+        if self.joined:
+            trace.queue_wait = wait
+            trace.restart()
+        self.headers = {
+            **headers,
+            "X-Cache": cache_status(self.read),
+            "X-Singleflight": "JOINED" if self.joined else "LEADER" if self.shared else "OFF",
+        }
+        if "tab" in trace.fields:
+            # Lets clients (bench.load) check that a session kept its tab
+            self.headers["X-Paki-Tab"] = str(trace.fields["tab"])
+
+    def finish(self) -> None:
+        # Once per request: from deltas(), or from the background task
+        # if the client left before the generator ever started.
+        if self._finished or self.flight is None:
+            return
+        self._finished = True
+        self.trace.finish("aborted")  # no-op if the stream completed
+        self.flight.detach()
+
+    async def deltas(self) -> AsyncGenerator[str, None]:
+        """
+        Yields the answer as it is generated (joiners first get what was
+        generated before they arrived). Raises StreamFailed if it ends
+        early; simply stops if the client disconnected.
+        """
+        if self.cached is not None:
+            # Replay as chunks so clients need no separate path
+            for i in range(0, len(self.cached), CACHE_REPLAY_CHUNK):
+                yield self.cached[i:i + CACHE_REPLAY_CHUNK]
+            return
+
+        trace = self.trace
+        try:
+            async for delta in guarded(self.flight.subscribe(), self.request, self.deadline):
+                trace.add_bytes(delta)
+                yield delta
+            trace.finish("ok")
+
+        except DeadlineExceeded:
+            # This request's own deadline; a shared generation goes on
+            # for requests that joined with a later one
+            stage = "joined" if self.joined else last_stage(trace)
+            TIMEOUTS.inc(endpoint=trace.endpoint, stage=stage)
+            trace.finish("timeout")
+            raise StreamFailed("Deadline exceeded; generation stopped.")
+
+        except ClientDisconnected:
+            trace.finish("aborted")
+            return
+
+        except StreamFailed:
+            trace.finish(self.flight.outcome or "error")
+            raise
+
+        finally:
+            self.finish()
 
 
 # ============================================================
 # /chat_stream endpoint (streaming)
 # ============================================================
 @app.get("/chat_stream")
-async def chat_stream(prompt: str):
-    page: Page | None = state["page"]
-    if not page:
+async def chat_stream(
+    request: Request,
+    prompt: str,
+    priority: int = PRIORITY_INTERACTIVE,
+    timeout: float | None = None,
+):
+    chat = ChatStream(request, prompt, RequestTrace("chat_stream"), priority, timeout)
+    try:
+        await chat.open()
+    except StreamRefused as e:
         return StreamingResponse(
-            iter(["Error: Browser not initialized.\n"]),
+            iter([f"Error: {e}\n"]),
+            status_code=e.status_code,
             media_type="text/plain",
+            headers=e.headers,
         )
 
     async def response_generator():
+        sent = False
         try:
-            await dismiss_popup(page)
-
-            # Use JS-injected input (FASTER & SAFER)
-            # We explicitly pass arguments to avoid Python string interpolation issues
-            await page.evaluate("""
-                ([selector, text]) => {
-                    const el = document.querySelector(selector);
-                    if (el) {
-                        el.innerText = text;
-                        el.dispatchEvent(new Event('input', { bubbles: true }));
-                    }
-                }
-            """, [PROMPT_SELECTOR, prompt])
-            
-            await asyncio.sleep(0.5)
-            await page.press(PROMPT_SELECTOR, "Enter")
-
-            # Wait for generation to start
-            try:
-                await page.wait_for_selector(
-                    STOP_BUTTON_SELECTOR, timeout=30_000
-                )
-            except Exception:
-                yield "Error: Generation did not start."
-                return
+            async for delta in chat.deltas():
+                sent = True
+                yield delta
+        except StreamFailed as e:
+            yield f"\nError: {e}" if sent else f"Error: {e}"
 
-            last_text = ""
+    return StreamingResponse(
+        response_generator(),
+        media_type="text/plain",
+        headers=chat.headers,
+        background=BackgroundTask(chat.finish),
+    )
 
-            while True:
-                is_generating = await page.locator(
-                    STOP_BUTTON_SELECTOR
-                ).is_visible()
 
-                current_text = await get_last_assistant_message(page)
-                if current_text and len(current_text) > len(last_text):
-                    yield current_text[len(last_text):]
-                    last_text = current_text
+# ============================================================
+# OpenAI-compatible /v1/chat/completions (POST, JSON or SSE)
+# ============================================================
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request, body: ChatCompletionRequest):
+    prompt = messages_to_prompt(body.messages)
+    if not prompt:
+        return openai_error("`messages` contains no text.", 400, "invalid_request_error")
+
+    priority = body.priority
+    if priority is None:
+        priority = PRIORITY_INTERACTIVE if body.stream else PRIORITY_BATCH
+    trace = RequestTrace("chat_completions")
+    trace.fields["stream"] = body.stream
+    chat = ChatStream(request, prompt, trace, priority, body.timeout)
+    try:
+        await chat.open()
+    except StreamRefused as e:
+        return openai_error(str(e), e.status_code, headers=e.headers)
+
+    completion_id = new_completion_id()
+
+    if not body.stream:
+        parts = []
+        try:
+            async for delta in chat.deltas():
+                parts.append(delta)
+        except StreamFailed as e:
+            status = 504 if chat.trace.outcome == "timeout" else 502
+            return openai_error(str(e), status, headers=chat.headers)
+        finally:
+            chat.finish()
+        return JSONResponse(
+            completion_body(completion_id, body.model, "".join(parts).strip()),
+            headers=chat.headers,
+        )
 
-                if not is_generating:
+    async def event_stream():
+        yield sse_chunk(completion_id, body.model, {"role": "assistant", "content": ""})
+        try:
+            async for delta in chat.deltas():
+                yield sse_chunk(completion_id, body.model, {"content": delta})
+        except StreamFailed as e:
+            yield sse_event(error_body(str(e), "server_error"))
+        else:
+            yield sse_chunk(completion_id, body.model, {}, finish_reason="stop")
+        yield SSE_DONE
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={**chat.headers, **SSE_HEADERS},
+        background=BackgroundTask(chat.finish),
+    )
+
+
+# ============================================================
+# /ws: many prompts over one WebSocket, coalesced deltas
+# ============================================================
+# Client -> server (JSON text frames):
+#   {"type": "prompt", "prompt": "...", "id"?, "priority"?, "timeout"?}
+#   {"type": "cancel", "id"?}       stops the running prompt
+# Server -> client, per prompt id:
+#   {"type": "start", "id", "queue_wait", "cache"}
+#   {"type": "delta", "id", "text"}  coalesced, see WS_COALESCE_*
+#   {"type": "done", "id", "chars", "timings_ms"}
+#   {"type": "cancelled", "id"}
+#   {"type": "error", "id", "status", "message", "retry_after"?}
+# Prompts on one connection run one after another.
+class SocketClient:
+    """
+    Stands in for the HTTP request of a generation driven over a
+    WebSocket: cache headers come from the handshake, and guarded()
+    sees a "disconnect" when the socket closes or the prompt is cancelled.
+    """
+
+    def __init__(self, websocket: WebSocket, prompt_id: str):
+        self.headers = websocket.headers  # cache policy, X-Paki-Session
+        self.prompt_id = prompt_id
+        self.cancelled = asyncio.Event()
+
+    async def is_disconnected(self) -> bool:
+        return self.cancelled.is_set()
+
+
+async def coalesce(
+    stream: AsyncGenerator[str, None], window: float, max_bytes: int
+) -> AsyncGenerator[tuple[str, int], None]:
+    """
+    Re-yields `stream` as (text, pieces) batches. A batch is sent
+    `window` seconds after its first piece arrived or once it reaches
+    `max_bytes`, whichever is first; window=0 sends every piece as is.
+    Whatever was buffered is still sent if the stream fails.
+    """
+    loop = asyncio.get_running_loop()
+    iterator = stream.__aiter__()
+    pending: asyncio.Future | None = None
+    batch: list[str] = []
+    size = 0
+    flush_at: float | None = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            timeout = None if flush_at is None else max(0.0, flush_at - loop.time())
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+
+            if pending in done:
+                item, pending = pending, None
+                try:
+                    text = item.result()
+                except StopAsyncIteration:
                     break
+                except Exception:
+                    if batch:
+                        yield "".join(batch), len(batch)
+                    raise
+                batch.append(text)
+                size += len(text.encode("utf-8"))
+                if flush_at is None:
+                    flush_at = loop.time() + window
+                if size < max_bytes and loop.time() < flush_at:
+                    continue
+
+            yield "".join(batch), len(batch)
+            batch, size, flush_at = [], 0, None
+
+        if batch:
+            yield "".join(batch), len(batch)
+    finally:
+        if pending is not None:
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+        await iterator.aclose()
+
+
+async def ws_run_prompt(
+    websocket: WebSocket, client: SocketClient, message: dict, window: float, max_bytes: int
+) -> None:
+    prompt_id = client.prompt_id
+    prompt = message.get("prompt")
+    try:
+        priority = int(message.get("priority", PRIORITY_INTERACTIVE))
+        timeout = float(message["timeout"]) if message.get("timeout") is not None else None
+        if not isinstance(prompt, str) or not prompt.strip():
+            raise ValueError("`prompt` must be a non-empty string.")
+    except (TypeError, ValueError) as e:
+        await websocket.send_json({"type": "error", "id": prompt_id, "status": 400, "message": str(e)})
+        return
+
+    chat = ChatStream(client, prompt, RequestTrace("ws"), priority, timeout)
+    try:
+        await chat.open()
+    except StreamRefused as e:
+        error = {"type": "error", "id": prompt_id, "status": e.status_code, "message": str(e)}
+        if "Retry-After" in e.headers:
+            error["retry_after"] = float(e.headers["Retry-After"])
+        await websocket.send_json(error)
+        return
+
+    await websocket.send_json({
+        "type": "start",
+        "id": prompt_id,
+        "queue_wait": float(chat.headers.get("X-Queue-Wait", 0)),
+        "cache": chat.headers.get("X-Cache"),
+    })
+    chars = 0
+    frames = coalesce(chat.deltas(), window, max_bytes)
+    try:
+        async for text, pieces in frames:
+            chars += len(text)
+            ws_stats["deltas"] += pieces
+            ws_stats["frames"] += 1
+            await websocket.send_json({"type": "delta", "id": prompt_id, "text": text})
+            # guarded() only polls for a cancel while no text arrives
+            if client.cancelled.is_set():
+                break
+    except StreamFailed as e:
+        status = 504 if chat.trace.outcome == "timeout" else 502
+        await websocket.send_json({"type": "error", "id": prompt_id, "status": status, "message": str(e)})
+        return
+    finally:
+        await frames.aclose()
+        chat.finish()
+
+    if client.cancelled.is_set():
+        await websocket.send_json({"type": "cancelled", "id": prompt_id})
+    else:
+        await websocket.send_json({
+            "type": "done", "id": prompt_id, "chars": chars, "timings_ms": chat.trace.timings,
+        })
+
+
+@app.websocket("/ws")
+async def ws_session(
+    websocket: WebSocket,
+    coalesce_ms: float = WS_COALESCE_MS,
+    coalesce_bytes: int = WS_COALESCE_BYTES,
+):
+    await websocket.accept()
+    ws_stats["sessions"] += 1
+    window = max(0.0, coalesce_ms) / 1000
+    inbox: asyncio.Queue = asyncio.Queue()
+    current: SocketClient | None = None
+
+    async def receive():
+        # Runs beside the prompt loop so "cancel" and a closing socket
+        # are noticed while a generation is streaming.
+        try:
+            while True:
+                try:
+                    message = await websocket.receive_json()
+                except (ValueError, KeyError):
+                    # Not JSON, or a binary frame
+                    message = {"type": "invalid"}
+                if message.get("type") == "cancel":
+                    if current is not None and message.get("id") in (None, current.prompt_id):
+                        current.cancelled.set()
+                else:
+                    await inbox.put(message)
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+        finally:
+            if current is not None:
+                current.cancelled.set()
+            await inbox.put(None)
 
-                # Balanced polling (CPU vs latency)
-                await asyncio.sleep(0.05)
+    reader = asyncio.create_task(receive())
+    try:
+        while (message := await inbox.get()) is not None:
+            if message.get("type") != "prompt":
+                await websocket.send_json({
+                    "type": "error", "id": message.get("id"), "status": 400,
+                    "message": "Expected {\"type\": \"prompt\"} or {\"type\": \"cancel\"}.",
+                })
+                continue
+            current = SocketClient(websocket, str(message.get("id") or uuid.uuid4().hex[:12]))
+            try:
+                await ws_run_prompt(websocket, current, message, window, coalesce_bytes)
+            finally:
+                current = None
+    except (WebSocketDisconnect, RuntimeError):
+        # Socket closed while sending; the generation was already cut short
+        pass
+    finally:
+        reader.cancel()
+        await asyncio.gather(reader, return_exceptions=True)
+        ws_stats["sessions"] -= 1
+
+
+# ============================================================
+# Health endpoints (never touch the chat)
+# ============================================================
+@app.get("/healthz")
+async def healthz():
+    """
+    Liveness: the process and its event loop respond.
+    """
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """
+    Readiness: browser and context are up, at least one tab is open and
+    the prompt box is on it. Read-only, so it is safe to poll during a
+    generation. Returns 503 until ready.
+    """
+    browser: Browser | None = state["browser"]
+    page: Page | None = pool.any_page()
+    checks = {
+        "browser": browser is not None and browser.is_connected(),
+        "context": state["context"] is not None,
+        "page": page is not None and not page.is_closed(),
+        "prompt_box": False,
+        # Unknown until the first session check counts as fine
+        "session": auth_stats["logged_in"] is not False,
+    }
+    if checks["page"]:
+        try:
+            count = await asyncio.wait_for(
+                page.locator(PROMPT_SELECTOR).count(), timeout=2
+            )
+            checks["prompt_box"] = count > 0
+        except Exception:
+            pass
+
+    ready = all(checks.values())
+    return JSONResponse(
+        {
+            "status": "ready" if ready else "not_ready",
+            "checks": checks,
+            "generating": scheduler.busy > 0,
+            "queued": scheduler.pending,
+            "tabs": len(pool),
+            "auth": auth_stats,
+        },
+        status_code=200 if ready else 503,
+    )
 
-            # Final sweep
-            current_text = await get_last_assistant_message(page)
-            if current_text and len(current_text) > len(last_text):
-                yield current_text[len(last_text):]
 
-        except Exception as e:
-            yield f"Error: {e}"
+# ============================================================
+# /metrics endpoint (Prometheus text format)
+# ============================================================
+# Request counters and latency histograms are recorded by RequestTrace;
+# the gauges below are read from live state at scrape time.
+REGISTRY.gauge(
+    "paki_queue_depth", "Requests waiting for a tab.",
+    callback=lambda: scheduler.pending,
+)
+REGISTRY.gauge(
+    "paki_pages_busy", "Pages currently reserved by a request.",
+    callback=lambda: scheduler.busy,
+)
+REGISTRY.gauge(
+    "paki_pool_tabs", "Chat tabs in the pool, by state.", ("state",),
+    callback=lambda: {("busy",): pool.busy, ("idle",): len(pool) - pool.busy},
+)
+REGISTRY.counter(
+    "paki_pool_sticky_requests_total", "Session requests that found their tab idle vs. waited for it.",
+    ("result",),
+    callback=lambda: {("hit",): pool.sticky_hits, ("wait",): pool.sticky_waits},
+)
+TAB_GENERATION_SECONDS = REGISTRY.histogram(
+    "paki_tab_generation_seconds", "Time a tab spent on one generation.", ("tab",),
+)
+REGISTRY.gauge(
+    "paki_page_dom_nodes", "DOM nodes on the chat page (last sample).",
+    callback=lambda: page_stats["dom_nodes"],
+)
+REGISTRY.gauge(
+    "paki_page_js_heap_bytes", "Used JS heap of the chat page (last sample).",
+    callback=lambda: page_stats["js_heap_bytes"],
+)
+REGISTRY.counter(
+    "paki_conversation_rotations_total", "Fresh conversations started since startup.",
+    callback=lambda: page_stats["rotations"],
+)
+REGISTRY.counter(
+    "paki_blocked_requests_total", "Browser requests aborted by the route filter.",
+    callback=lambda: browser_stats["blocked_requests"],
+)
+REGISTRY.gauge(
+    "paki_standby_ready", "1 if a warmed standby page is waiting.",
+    callback=lambda: 1 if state["standby"] is not None else 0,
+)
+REGISTRY.counter(
+    "paki_page_recoveries_total", "Broken pages replaced by the standby vs. reloaded in place.",
+    ("method",),
+    callback=lambda: {("swap",): standby_stats["swaps"], ("reload",): standby_stats["reloads"]},
+)
+STANDBY_WARMUP_SECONDS = REGISTRY.histogram(
+    "paki_standby_warmup_seconds", "Time to open and load a standby page.",
+)
+REGISTRY.gauge(
+    "paki_ws_sessions", "Open WebSocket sessions.",
+    callback=lambda: ws_stats["sessions"],
+)
+REGISTRY.counter(
+    "paki_ws_frames_total", "WebSocket delta frames sent, and the stream deltas they carried.", ("kind",),
+    callback=lambda: {("frames",): ws_stats["frames"], ("deltas",): ws_stats["deltas"]},
+)
+REGISTRY.counter(
+    "paki_singleflight_requests_total", "Generations started vs. requests that joined one in flight.",
+    ("role",),
+    callback=lambda: {("leader",): flights.started, ("joined",): flights.joined},
+)
+REGISTRY.counter(
+    "paki_cache_lookups_total", "Response cache lookups since startup.", ("result",),
+    callback=lambda: {("hit",): cache.hits, ("miss",): cache.misses} if cache else {},
+)
+
 
-    return StreamingResponse(response_generator(), media_type="text/plain")
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(
+        REGISTRY.render(), media_type="text/plain; version=0.0.4"
+    )
+
+
+# ============================================================
+# /stats endpoint (diagnostics)
+# ============================================================
+@app.get("/stats")
+async def stats():
+    """
+    Queue, cache and conversation-size figures. Does not touch the page;
+    DOM / heap numbers are from the last sample taken after a request.
+    """
+    return {
+        "queue": scheduler.snapshot(),
+        "singleflight": flights.snapshot() if SINGLEFLIGHT else None,
+        "cache": await asyncio.to_thread(cache.stats) if cache else None,
+        "page": page_stats,
+        "pool": pool.snapshot(),
+        "standby": standby_stats,
+        "auth": auth_stats,
+        "websocket": ws_stats,
+        "journal": journal.snapshot() if journal else None,
+        "browser": {
+            **browser_stats,
+            # Whole process tree: this server, the driver and Chrome
+            "rss_bytes": await asyncio.to_thread(procstats.rss_bytes, os.getpid()),
+        },
+    }
 
 
 # ============================================================
 # Entrypoint
 # ============================================================
 if __name__ == "__main__":
+    # Runs this module's own app: uvicorn.run("paki_api:app") would
+    # import the file a second time (as paki_api, next to __main__) and
+    # register every metric twice. CLI flags were applied at the top.
     # IMPORTANT: Do NOT override event loop policy on Windows
-    uvicorn.run(app, host="127.0.0.1", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host=CLI_ARGS.host, port=CLI_ARGS.port)
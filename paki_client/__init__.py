@@ -0,0 +1,12 @@
+"""
+Client library for the Paki API.
+
+    PakiClient       blocking client (scripts, Streamlit)
+    AsyncPakiClient  asyncio client (batch jobs, many files at once)
+    RetryPolicy      retries on 429 / 503 / queue-wait 504 / connection errors
+    PakiError        the API refused or failed a request
+"""
+from paki_client.client import DEFAULT_URL, AsyncPakiClient, PakiClient
+from paki_client.retry import PakiError, RetryPolicy
+
+__all__ = ["DEFAULT_URL", "AsyncPakiClient", "PakiClient", "PakiError", "RetryPolicy"]
@@ -0,0 +1,269 @@
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Iterator
+
+import httpx
+
+from paki_client.retry import PakiError, RetryPolicy, raise_for_status
+from paki_client.stream import astream_text, stream_text
+
+# ============================================================
+# Paki API clients (sync and async)
+# ============================================================
+# One pooled keep-alive connection pool per client: create a client
+# once and reuse it for every request (or use it as a context manager).
+#
+#   with PakiClient() as paki:
+#       for text in paki.stream("Explain asyncio"):
+#           print(text, end="")
+#
+#   async with AsyncPakiClient(max_connections=8) as paki:
+#       answers = await paki.map(prompts, concurrency=8)
+#
+# The base URL defaults to PAKI_API_URL, else the local server.
+# Prompts go in the JSON body of POST /v1/chat/completions (whole source
+# files do not fit in a query string); stream() reads its SSE chunks.
+
+DEFAULT_URL = os.getenv("PAKI_API_URL", "http://127.0.0.1:8000")
+COMPLETIONS_PATH = "/v1/chat/completions"
+CONNECT_TIMEOUT = 10
+# Never retried: a timeout while reading means a generation was running
+RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+# A dropped connection is retried for streams only: a non-streaming
+# answer sends no headers until the generation finished, so the prompt
+# most likely ran already and would run (and enter the chat) twice
+STREAM_RETRY_ERRORS = RETRY_ERRORS + (httpx.RemoteProtocolError,)
+
+
+def request_options(
+    prompt: str,
+    stream: bool,
+    priority: int | None = None,
+    timeout: float | None = None,
+    session: str | None = None,
+    cache: str | None = None,
+) -> tuple[dict, dict]:
+    """
+    JSON body and headers for one prompt. `session` keeps follow-up
+    turns on the same chat tab (X-Paki-Session); `cache` is an
+    X-Paki-Cache mode ("off", "bypass").
+    """
+    body = {"messages": [{"role": "user", "content": prompt}], "stream": stream}
+    if priority is not None:
+        body["priority"] = priority
+    if timeout is not None:
+        body["timeout"] = timeout
+    headers = {}
+    if session is not None:
+        headers["X-Paki-Session"] = session
+    if cache is not None:
+        headers["X-Paki-Cache"] = cache
+    return body, headers
+
+
+def answer_text(body: dict) -> str:
+    try:
+        return body["choices"][0]["message"]["content"] or ""
+    except (KeyError, IndexError, TypeError):
+        raise PakiError("No answer in the API response.")
+
+
+class PakiClient:
+    def __init__(
+        self,
+        base_url: str | None = None,
+        timeout: float = 300,
+        retry: RetryPolicy | None = None,
+        max_connections: int = 10,
+        headers: dict | None = None,
+    ):
+        self.base_url = (base_url or DEFAULT_URL).rstrip("/")
+        self.retry = retry or RetryPolicy()
+        self.max_connections = max_connections
+        self._http = httpx.Client(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(timeout, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            headers=headers,
+        )
+
+    def __enter__(self) -> "PakiClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._http.close()
+
+    def _open(self, body: dict, headers: dict) -> httpx.Response:
+        """
+        POSTs a completion request and returns the open (streaming) 200
+        response, retrying per the policy. The caller must close it.
+        """
+        retry_errors = STREAM_RETRY_ERRORS if body["stream"] else RETRY_ERRORS
+        attempt = 0
+        while True:
+            request = self._http.build_request("POST", COMPLETIONS_PATH, json=body, headers=headers)
+            try:
+                response = self._http.send(request, stream=True)
+            except retry_errors:
+                if not self.retry.should_retry(attempt):
+                    raise
+                time.sleep(self.retry.delay(attempt))
+                attempt += 1
+                continue
+            if response.status_code == 200:
+                return response
+            content = response.read()
+            response.close()
+            if not self.retry.should_retry(attempt, response):
+                raise_for_status(response, content)
+            time.sleep(self.retry.delay(attempt, response))
+            attempt += 1
+
+    def ask(self, prompt: str, **options) -> str:
+        """
+        The whole answer as markdown. Raises PakiError if the API
+        refused or failed it.
+        """
+        body, headers = request_options(prompt, False, **options)
+        response = self._open(body, headers)
+        try:
+            response.read()
+        finally:
+            response.close()
+        return answer_text(response.json())
+
+    def stream(self, prompt: str, **options) -> Iterator[str]:
+        """
+        Yields the answer as it is generated, as correctly decoded text.
+        Raises PakiError (status None) if the generation fails after the
+        answer started; what was yielded until then stays valid.
+        """
+        body, headers = request_options(prompt, True, **options)
+        response = self._open(body, headers)
+        try:
+            yield from stream_text(response.iter_bytes())
+        finally:
+            response.close()
+
+    def ready(self, timeout: float = 2) -> dict:
+        """
+        The /readyz body ("status" is "ready" or "not_ready"). Raises
+        httpx.HTTPError if the API cannot be reached. Never retried.
+        """
+        return self._http.get("/readyz", timeout=timeout).json()
+
+    def map(
+        self,
+        prompts: list[str],
+        concurrency: int | None = None,
+        return_exceptions: bool = False,
+        **options,
+    ) -> list:
+        """
+        Answers of many prompts (via ask()), in order, at most
+        `concurrency` at a time. With return_exceptions a failed prompt
+        gives its exception instead of raising.
+        """
+
+        def one(prompt: str):
+            try:
+                return self.ask(prompt, **options)
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                return e
+
+        with ThreadPoolExecutor(max_workers=concurrency or self.max_connections) as executor:
+            return list(executor.map(one, prompts))
+
+
+class AsyncPakiClient:
+    def __init__(
+        self,
+        base_url: str | None = None,
+        timeout: float = 300,
+        retry: RetryPolicy | None = None,
+        max_connections: int = 10,
+        headers: dict | None = None,
+    ):
+        self.base_url = (base_url or DEFAULT_URL).rstrip("/")
+        self.retry = retry or RetryPolicy()
+        self.max_connections = max_connections
+        self._http = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(timeout, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            headers=headers,
+        )
+
+    async def __aenter__(self) -> "AsyncPakiClient":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+    async def _open(self, body: dict, headers: dict) -> httpx.Response:
+        retry_errors = STREAM_RETRY_ERRORS if body["stream"] else RETRY_ERRORS
+        attempt = 0
+        while True:
+            request = self._http.build_request("POST", COMPLETIONS_PATH, json=body, headers=headers)
+            try:
+                response = await self._http.send(request, stream=True)
+            except retry_errors:
+                if not self.retry.should_retry(attempt):
+                    raise
+                await asyncio.sleep(self.retry.delay(attempt))
+                attempt += 1
+                continue
+            if response.status_code == 200:
+                return response
+            content = await response.aread()
+            await response.aclose()
+            if not self.retry.should_retry(attempt, response):
+                raise_for_status(response, content)
+            await asyncio.sleep(self.retry.delay(attempt, response))
+            attempt += 1
+
+    async def ask(self, prompt: str, **options) -> str:
+        body, headers = request_options(prompt, False, **options)
+        response = await self._open(body, headers)
+        try:
+            await response.aread()
+        finally:
+            await response.aclose()
+        return answer_text(response.json())
+
+    async def stream(self, prompt: str, **options) -> AsyncIterator[str]:
+        body, headers = request_options(prompt, True, **options)
+        response = await self._open(body, headers)
+        try:
+            async for text in astream_text(response.aiter_bytes()):
+                yield text
+        finally:
+            await response.aclose()
+
+    async def ready(self, timeout: float = 2) -> dict:
+        return (await self._http.get("/readyz", timeout=timeout)).json()
+
+    async def map(
+        self,
+        prompts: list[str],
+        concurrency: int | None = None,
+        return_exceptions: bool = False,
+        **options,
+    ) -> list:
+        semaphore = asyncio.Semaphore(concurrency or self.max_connections)
+
+        async def one(prompt: str) -> str:
+            async with semaphore:
+                return await self.ask(prompt, **options)
+
+        return await asyncio.gather(*(one(p) for p in prompts), return_exceptions=return_exceptions)
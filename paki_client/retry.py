@@ -0,0 +1,90 @@
+import random
+
+import httpx
+
+# ============================================================
+# Retry policy and errors shared by both clients
+# ============================================================
+# Retried: 429 (queue full; the API says when to come back in
+# Retry-After), 503 (browser restarting, not logged in yet), a 504 from
+# a request that ran out of time while still queued (it carries
+# Retry-After) and connection errors (see client.RETRY_ERRORS). A 504
+# from a generation that ran out of time is not: the prompt would most
+# likely get stuck again. Never retried once an answer started
+# streaming, so text is never delivered twice.
+
+RETRY_STATUSES = {429, 503}
+
+
+class PakiError(RuntimeError):
+    """
+    The API refused or failed a request (after any retries).
+    `status` is the HTTP status, or None for an error in a 200 body.
+    """
+
+    def __init__(self, message: str, status: int | None = None, retry_after: float | None = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class RetryPolicy:
+    def __init__(self, retries: int = 4, backoff: float = 1.0, max_backoff: float = 30.0):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def delay(self, attempt: int, response: httpx.Response | None = None) -> float:
+        """
+        Seconds to wait before retry number `attempt` (0-based): the
+        server's Retry-After if it sent one, else exponential backoff
+        with full jitter.
+        """
+        retry_after = retry_after_seconds(response) if response is not None else None
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def should_retry(self, attempt: int, response: httpx.Response | None = None) -> bool:
+        if attempt >= self.retries:
+            return False
+        if response is None or response.status_code in RETRY_STATUSES:
+            return True
+        # Queue-wait deadline: nothing was generated yet
+        return response.status_code == 504 and "retry-after" in response.headers
+
+
+def retry_after_seconds(response: httpx.Response) -> float | None:
+    """
+    Retry-After in seconds; None if missing or not a number (e.g. an
+    HTTP date from a proxy in front of the API).
+    """
+    try:
+        return float(response.headers["retry-after"])
+    except (KeyError, ValueError):
+        return None
+
+
+def error_message(response: httpx.Response, body: bytes) -> str:
+    """
+    The API's error text from a JSON ({"error"} / OpenAI style) or
+    plain-text ("Error: ...") error body.
+    """
+    text = body.decode("utf-8", errors="replace").strip()
+    try:
+        data = response.json() if body else {}
+    except ValueError:
+        data = None
+    if isinstance(data, dict):
+        error = data.get("error")
+        if isinstance(error, dict):
+            return error.get("message", text)
+        if error:
+            return str(error)
+    return text.removeprefix("Error:").strip() or f"HTTP {response.status_code}"
+
+
+def raise_for_status(response: httpx.Response, body: bytes) -> None:
+    if response.status_code == 200:
+        return
+    raise PakiError(error_message(response, body), response.status_code, retry_after_seconds(response))
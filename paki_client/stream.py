@@ -0,0 +1,82 @@
+import json
+import codecs
+from typing import AsyncIterator, Iterator
+
+from paki_client.retry import PakiError
+
+# ============================================================
+# /v1 stream reading shared by both clients
+# ============================================================
+# An SSEParser is fed the response body as it arrives: it decodes UTF-8
+# incrementally (a character split across two pieces is held back until
+# it is complete) and returns the data of each server-sent event that a
+# piece completed. The sync and async readers below only differ in how
+# they iterate over the body.
+
+
+class SSEParser:
+    """
+    Incremental server-sent events parser. `done` is set once the
+    "[DONE]" event arrived; nothing after it is returned.
+    """
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._buffer = ""
+        self._data: list[str] = []
+        self.done = False
+
+    def feed(self, chunk: bytes) -> list[str]:
+        self._buffer += self._decoder.decode(chunk)
+        *complete, self._buffer = self._buffer.split("\n")
+        events = []
+        for line in complete:
+            if self.done:
+                break
+            line = line.rstrip("\r")
+            if line.startswith("data:"):
+                self._data.append(line[5:].removeprefix(" "))
+            elif not line and self._data:
+                event, self._data = "\n".join(self._data), []
+                if event == "[DONE]":
+                    self.done = True
+                else:
+                    events.append(event)
+        return events
+
+
+def chunk_text(event: str) -> str:
+    """
+    The text of one /v1 stream chunk. Raises PakiError for an error
+    event (the generation failed after it started).
+    """
+    payload = json.loads(event)
+    if "error" in payload:
+        raise PakiError(payload["error"].get("message", "Generation failed."))
+    choices = payload.get("choices") or [{}]
+    return choices[0].get("delta", {}).get("content") or ""
+
+
+def stream_text(chunks: Iterator[bytes]) -> Iterator[str]:
+    """
+    The answer text of a /v1 stream body, piece by piece.
+    """
+    parser = SSEParser()
+    for chunk in chunks:
+        for event in parser.feed(chunk):
+            text = chunk_text(event)
+            if text:
+                yield text
+        if parser.done:
+            return
+
+
+async def astream_text(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    parser = SSEParser()
+    async for chunk in chunks:
+        for event in parser.feed(chunk):
+            text = chunk_text(event)
+            if text:
+                yield text
+        if parser.done:
+            return
@@ -0,0 +1,70 @@
+import os
+
+# ============================================================
+# /proc based CPU / memory sampling (Linux only)
+# ============================================================
+# The API's cost is dominated by the browser it drives, so every
+# figure here covers the whole process tree (uvicorn + Chrome helpers).
+# On systems without /proc every function returns zeros.
+
+CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _read_stat(pid: int) -> list[str] | None:
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            data = f.read()
+    except OSError:
+        return None
+    # comm may contain spaces; fields restart after the closing paren
+    return data[data.rfind(")") + 2:].split()
+
+
+def process_tree(pid: int) -> list[int]:
+    """
+    Returns `pid` and all of its live descendants.
+    """
+    children: dict[int, list[int]] = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return [pid]
+
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        fields = _read_stat(int(entry))
+        if fields:
+            children.setdefault(int(fields[1]), []).append(int(entry))
+
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, []))
+    return tree
+
+
+def cpu_seconds(pid: int) -> float:
+    """
+    User + system CPU time consumed so far by the process tree.
+    """
+    total = 0
+    for p in process_tree(pid):
+        fields = _read_stat(p)
+        if fields:
+            total += int(fields[11]) + int(fields[12])
+    return total / CLK_TCK
+
+
+def rss_bytes(pid: int) -> int:
+    """
+    Resident memory of the process tree.
+    """
+    total = 0
+    for p in process_tree(pid):
+        fields = _read_stat(p)
+        if fields:
+            total += int(fields[21]) * PAGE_SIZE
+    return total
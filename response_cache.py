@@ -0,0 +1,154 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+
+# ============================================================
+# Persistent prompt -> response cache (SQLite)
+# ============================================================
+# Content-addressed: the key is the SHA-256 of the normalized prompt.
+# Bounded by total response size (least-recently-used rows are evicted
+# first) and by age (rows older than `ttl` seconds are ignored/purged).
+# All methods are blocking; call them through asyncio.to_thread().
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Canonical form used for the cache key. Only changes that cannot
+    alter the meaning of a prompt (code included) are applied: Unicode
+    NFC, LF line endings, trailing whitespace per line and at both ends.
+    """
+    text = unicodedata.normalize("NFC", prompt)
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return "\n".join(line.rstrip() for line in text.split("\n")).strip()
+
+
+def prompt_key(prompt: str) -> str:
+    return hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Size-bounded LRU + TTL cache of final responses.
+    """
+
+    def __init__(self, path: str, max_bytes: int, ttl: float):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key         TEXT PRIMARY KEY,
+                response    TEXT NOT NULL,
+                size        INTEGER NOT NULL,
+                created_at  REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS responses_lru ON responses (accessed_at)"
+        )
+        self._db.commit()
+
+    def get(self, prompt: str) -> str | None:
+        """
+        Returns the cached response for `prompt`, refreshing its LRU
+        position, or None on a miss / expired entry.
+        """
+        key = prompt_key(prompt)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._db.commit()
+                self.misses += 1
+                return None
+
+            self._db.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._db.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, prompt: str, response: str) -> None:
+        """
+        Stores a response and evicts expired, then least-recently-used,
+        rows until the cache fits in `max_bytes`.
+        """
+        size = len(response.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (prompt_key(prompt), response, size, now, now),
+            )
+            self._db.execute(
+                "DELETE FROM responses WHERE created_at < ?", (now - self.ttl,)
+            )
+            total = self._db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()[0]
+
+            if total > self.max_bytes:
+                rows = self._db.execute(
+                    "SELECT key, size FROM responses ORDER BY accessed_at"
+                ).fetchall()
+                victims = []
+                for key, row_size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    victims.append((key,))
+                    total -= row_size
+                self._db.executemany("DELETE FROM responses WHERE key = ?", victims)
+
+            self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def open_cache(path: str, max_bytes: int, ttl: float) -> ResponseCache | None:
+    """
+    Opens the cache, or returns None (caching disabled) if the database
+    cannot be created.
+    """
+    try:
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        return ResponseCache(path, max_bytes, ttl)
+    except sqlite3.Error as e:
+        print(f"WARNING: Response cache disabled ({e}).")
+        return None
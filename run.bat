@@ -51,8 +51,16 @@ echo.
 :: Start API in background
 start "PAKI API SERVER" cmd /k "venv\Scripts\activate && python paki_api.py"
 
-:: Wait for API to warm up
-timeout /t 5 >nul
+:: Wait for API to become ready (polls /readyz, up to ~120s)
+set /a ready_tries=0
+:wait_api
+timeout /t 1 >nul
+curl -s -f http://127.0.0.1:8000/readyz >nul 2>&1
+if %errorlevel% equ 0 goto api_ready
+set /a ready_tries+=1
+if %ready_tries% lss 120 goto wait_api
+echo [WARNING] API is not ready yet, continuing anyway...
+:api_ready
 
 :: Start Streamlit in background
 start "STREAMLIT UI" cmd /k "venv\Scripts\activate && streamlit run streamlit_app.py"
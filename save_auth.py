@@ -71,6 +71,7 @@ def run():
         
         print("\nSUCCESS: 'auth.json' has been created.")
         print("You can now close Chrome and run paki_api.py.")
+        print("(A running paki_api.py picks up the new session by itself.)")
         
         browser.close()
 
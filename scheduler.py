@@ -0,0 +1,144 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+
+# ============================================================
+# Admission queue for the shared browser page
+# ============================================================
+# Only one generation can run on a chat page at a time. Every endpoint
+# reserves a Ticket first (rejected immediately when the queue is full),
+# then waits for its turn in priority order (lower value = sooner, FIFO
+# within a priority).
+
+PRIORITY_INTERACTIVE = 0  # /chat_stream: a user is watching
+PRIORITY_BATCH = 10       # /ask: scripts and batch jobs
+
+
+class QueueFull(Exception):
+    """
+    Raised by PageScheduler.reserve() when no more requests may wait.
+    `retry_after` is a whole-second estimate for the Retry-After header.
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Queue is full, retry after {retry_after}s.")
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """
+    A reserved place in the queue. Use as `async with ticket:` or call
+    acquire()/release() explicitly; release() is idempotent.
+    """
+
+    def __init__(self, scheduler: "PageScheduler", priority: int):
+        self.scheduler = scheduler
+        self.priority = priority
+        self.reserved_at = time.perf_counter()
+        self.acquired_at: float | None = None
+        self.released = False
+
+    @property
+    def wait(self) -> float:
+        """
+        Seconds spent waiting in the queue (so far, if not yet granted).
+        """
+        end = self.acquired_at if self.acquired_at is not None else time.perf_counter()
+        return end - self.reserved_at
+
+    async def acquire(self) -> "Ticket":
+        await self.scheduler._acquire(self)
+        return self
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self.scheduler._release(self)
+
+    async def __aenter__(self) -> "Ticket":
+        return await self.acquire()
+
+    async def __aexit__(self, *exc) -> None:
+        self.release()
+
+
+class PageScheduler:
+    """
+    Bounded priority queue in front of `slots` chat pages.
+    """
+
+    def __init__(self, max_queue: int = 16, slots: int = 1):
+        self.max_queue = max_queue
+        self.slots = slots
+        self.busy = 0
+        self.pending = 0  # reserved, not yet granted
+        self._heap: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._avg_service = 0.0
+
+    def reserve(self, priority: int = PRIORITY_BATCH) -> Ticket:
+        """
+        Admits a request or raises QueueFull. Never blocks.
+        """
+        if self.busy >= self.slots and self.pending >= self.max_queue:
+            raise QueueFull(self.retry_after())
+        self.pending += 1
+        return Ticket(self, priority)
+
+    def retry_after(self) -> int:
+        """
+        Rough time until a newly queued request would start.
+        """
+        service = self._avg_service or 30.0
+        return max(1, math.ceil(service * (self.pending + 1) / self.slots))
+
+    def snapshot(self) -> dict:
+        return {
+            "busy": self.busy,
+            "queued": self.pending,
+            "max_queue": self.max_queue,
+            "slots": self.slots,
+            "avg_service_seconds": round(self._avg_service, 3),
+        }
+
+    async def _acquire(self, ticket: Ticket) -> None:
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (ticket.priority, next(self._seq), future))
+        self._wake_next()  # grants immediately when a slot is free
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted and cancelled in the same tick: pass the slot on
+                self.busy -= 1
+                self._wake_next()
+            else:
+                future.cancel()
+                self.pending -= 1
+            ticket.released = True
+            raise
+        ticket.acquired_at = time.perf_counter()
+
+    def _release(self, ticket: Ticket) -> None:
+        if ticket.acquired_at is None:
+            # Reserved but never acquired
+            self.pending -= 1
+            return
+
+        service = time.perf_counter() - ticket.acquired_at
+        self._avg_service = (
+            service if not self._avg_service
+            else 0.8 * self._avg_service + 0.2 * service
+        )
+        self.busy -= 1
+        self._wake_next()
+
+    def _wake_next(self) -> None:
+        while self._heap and self.busy < self.slots:
+            _, _, future = heapq.heappop(self._heap)
+            if not future.cancelled():
+                self.busy += 1
+                self.pending -= 1
+                future.set_result(None)
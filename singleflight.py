@@ -0,0 +1,141 @@
+import asyncio
+from typing import AsyncGenerator
+
+# ============================================================
+# In-flight deduplication of identical prompts
+# ============================================================
+# The first request for a prompt starts a Flight: one generation whose
+# output is appended to a buffer. Identical requests arriving while it
+# runs subscribe to that Flight instead of queueing for the page again;
+# each subscriber first gets everything buffered so far in one piece
+# (catch-up) and then the live chunks, so all of them see the same text.
+#
+# The generation itself runs in a background task owned by the Flight,
+# not by any one client: it only stops early when the last request
+# using it has gone, or when the latest deadline of the requests that
+# joined it has passed.
+
+
+class Flight:
+    """
+    Requests using the flight attach() when they start and detach()
+    when they end; the generation is abandoned when the last one leaves.
+    """
+
+    def __init__(self, key: str, deadline: float):
+        self.key = key
+        # Loop time the generation may run until (see attach())
+        self.deadline = deadline
+        self.chunks: list[str] = []
+        self.done = False
+        self.error: Exception | None = None
+        # ok / timeout / error / aborted, once done
+        self.outcome: str | None = None
+        self.subscribers = 0
+        self.task: asyncio.Task | None = None
+        self.abandoned = False
+        # Resolves to True once the page is acquired, False if that failed
+        self.admitted: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._changed = asyncio.Event()
+
+    def _wake(self) -> None:
+        # Waiters hold the old event; a fresh one is used for the next change
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def admit(self, acquired: bool) -> None:
+        if not self.admitted.done():
+            self.admitted.set_result(acquired)
+
+    def publish(self, text: str) -> None:
+        self.chunks.append(text)
+        self._wake()
+
+    def close(self, outcome: str, error: Exception | None = None) -> None:
+        if self.done:
+            return
+        self.done = True
+        self.outcome = outcome
+        self.error = error
+        self.admit(False)
+        self._wake()
+
+    @property
+    def text(self) -> str:
+        return "".join(self.chunks)
+
+    def attach(self, deadline: float) -> None:
+        self.subscribers += 1
+        self.deadline = max(self.deadline, deadline)
+
+    def detach(self) -> None:
+        self.subscribers -= 1
+        if self.subscribers == 0:
+            self.abandon()
+
+    def abandon(self) -> None:
+        """
+        Stops a generation nobody is waiting for any more.
+        """
+        if not self.done and self.task is not None and not self.abandoned:
+            self.abandoned = True
+            self.task.cancel()
+
+    async def is_disconnected(self) -> bool:
+        """
+        Lets guarded() treat "nobody left" like a client that went away.
+        """
+        return self.abandoned
+
+    async def subscribe(self) -> AsyncGenerator[str, None]:
+        """
+        Yields everything published so far as one chunk, then each new
+        chunk until the flight ends. Re-raises the flight's error (a new
+        instance per subscriber).
+        """
+        index = 0
+        while True:
+            if index < len(self.chunks):
+                text = "".join(self.chunks[index:])
+                index = len(self.chunks)
+                yield text
+                continue
+            if self.done:
+                if self.error is not None:
+                    raise type(self.error)(*self.error.args)
+                return
+            await self._changed.wait()
+
+
+class FlightGroup:
+    def __init__(self):
+        self._flights: dict[str, Flight] = {}
+        self.started = 0
+        self.joined = 0
+
+    def join(self, key: str) -> Flight | None:
+        """
+        The running flight for `key`, if one can still be joined.
+        """
+        flight = self._flights.get(key)
+        if flight is None or flight.done or flight.abandoned:
+            return None
+        self.joined += 1
+        return flight
+
+    def start(self, key: str, deadline: float) -> Flight:
+        flight = Flight(key, deadline)
+        self._flights[key] = flight
+        self.started += 1
+        return flight
+
+    def discard(self, flight: Flight) -> None:
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+
+    def snapshot(self) -> dict:
+        return {
+            "in_flight": len(self._flights),
+            "started": self.started,
+            "joined": self.joined,
+        }
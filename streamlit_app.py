@@ -1,9 +1,20 @@
 import streamlit as st
-import requests
+import httpx
+import asyncio
 import os
+import time
+
+from fence_parser import FenceParser
+from paki_client import DEFAULT_URL, AsyncPakiClient, PakiClient, PakiError, RetryPolicy
 
 # --- CONIFG ---
-API_URL = "http://127.0.0.1:8000/chat_stream"
+API_BASE = DEFAULT_URL
+# Files generated at the same time (the API queues what its pages can't take)
+MAX_PARALLEL = int(os.getenv("CODE_DOCTOR_PARALLEL", "4"))
+# Cap on re-renders per file per second while a response streams
+RENDER_FPS = float(os.getenv("CODE_DOCTOR_RENDER_FPS", "4"))
+STREAM_TIMEOUT = 300
+MAX_RETRIES = 5
 st.set_page_config(page_title="Code Doctor 🚑", layout="wide")
 
 # --- CSS STYLES ---
@@ -31,23 +42,125 @@ with st.sidebar:
     st.header("Settings")
     api_status = st.empty()
     try:
-        # Check if API is alive (simple ping check)
-        requests.get("http://127.0.0.1:8000/ask?prompt=ping", timeout=3)
-        api_status.success("🟢 API Connected")
-    except:
+        # Cheap readiness probe; never sends a prompt to the browser
+        with PakiClient(API_BASE) as paki:
+            ready = paki.ready()
+        if ready.get("status") == "ready":
+            busy = " (generating…)" if ready.get("generating") else ""
+            api_status.success(f"🟢 API Connected{busy}")
+        else:
+            api_status.warning("🟡 API starting / not logged in")
+    except (httpx.HTTPError, ValueError):
         api_status.error("🔴 API Offline")
         st.warning("Make sure 'python paki_api.py' is running!")
 
+    parallel = st.slider("Files in parallel", 1, 16, MAX_PARALLEL)
+
     st.markdown("---")
     st.info("💡 **Tip:** Use specific instructions like 'Optimize loop' or 'Add comments'.")
 
+# --- PARALLEL PROCESSING ---
+async def fix_file(client, semaphore, item, overall):
+    """Streams one file's fix into its own section of the page."""
+    filename, prompt, ui = item["name"], item["prompt"], item["ui"]
+    parser = FenceParser()
+    async with semaphore:
+        ui["status"].info("✍️ Generating…")
+        started = time.perf_counter()
+        last_render = 0.0
+        try:
+            # A full queue (429) is retried by the client after Retry-After
+            async for text in client.stream(prompt):
+                parser.feed(text)
+                # Re-render at most RENDER_FPS times per second
+                now = time.perf_counter()
+                if now - last_render >= 1 / RENDER_FPS:
+                    last_render = now
+                    ui["response"].markdown(parser.text + "▌")
+                    block = parser.current or parser.largest()
+                    if block:
+                        ui["code"].code(block.code, language=block.lang or "python")
+                    ui["status"].info(
+                        f"✍️ Generating… {len(parser.text):,} chars, {now - started:.0f}s"
+                    )
+            parser.close()
+        except PakiError as e:
+            if parser.text:
+                # Failed mid-answer: keep what arrived
+                ui["response"].markdown(parser.text)
+                ui["code"].empty()
+            if e.status == 429:
+                ui["status"].error("🔴 API stayed busy; try again later.")
+            else:
+                ui["status"].error(f"🔴 {e}")
+            overall.file_done()
+            return
+        except (httpx.HTTPError, ValueError, KeyError) as e:
+            # Also a malformed stream: fails this file only, not the fan-out
+            if parser.text:
+                ui["response"].markdown(parser.text)
+                ui["code"].empty()
+            ui["status"].error(f"An error occurred: {e}")
+            overall.file_done()
+            return
+
+    # Final render without cursor
+    ui["response"].markdown(parser.text)
+    ui["code"].empty()
+    overall.file_done()
+
+    # The parser already picked out the code blocks
+    best = parser.largest()
+    fixed_code = best.code.strip("\n") if best else None
+    elapsed = time.perf_counter() - started
+    if fixed_code:
+        ui["status"].markdown(
+            f'<div class="success-box">✅ Fix Generated Successfully! ({elapsed:.0f}s)</div>',
+            unsafe_allow_html=True,
+        )
+        # Download Button
+        with ui["result"].container():
+            st.download_button(
+                label=f"💾 Download Fixed `{filename}`",
+                data=fixed_code,
+                file_name=f"fixed_{filename}",
+                mime="text/plain",
+                key=f"download_{item['index']}",
+            )
+    else:
+        ui["status"].warning("⚠️ No code block found in response.")
+
+
+class OverallProgress:
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.bar = st.progress(0.0, text=f"0 / {total} files done")
+
+    def file_done(self):
+        self.done += 1
+        self.bar.progress(self.done / self.total, text=f"{self.done} / {self.total} files done")
+
+
+async def fix_all(items, parallel):
+    """Fans the files out over one pooled client, at most `parallel` at a time."""
+    overall = OverallProgress(len(items))
+    semaphore = asyncio.Semaphore(parallel)
+    retry = RetryPolicy(retries=MAX_RETRIES)
+    async with AsyncPakiClient(
+        API_BASE, timeout=STREAM_TIMEOUT, retry=retry, max_connections=parallel
+    ) as client:
+        await asyncio.gather(*(fix_file(client, semaphore, item, overall) for item in items))
+
+
 # --- MAIN INPUT ---
 uploaded_files = st.file_uploader("📂 Select Python files", accept_multiple_files=True, type=['py', 'js', 'html', 'css', 'json', 'md'])
 instruction = st.text_area("📝 What should I fix/improve?", placeholder="e.g. Fix bugs, add type hints, and optimize performance.", height=100)
 
 if st.button("🚀 Analyze & Fix Code", type="primary", disabled=not uploaded_files):
     
-    for uploaded_file in uploaded_files:
+    items = []
+    for index, uploaded_file in enumerate(uploaded_files):
         filename = uploaded_file.name
         content = uploaded_file.read().decode("utf-8")
         
@@ -67,43 +180,13 @@ if st.button("🚀 Analyze & Fix Code", type="primary", disabled=not uploaded_fi
             f"Code:\n```\n{content}\n```"
         )
         
-        # Stream Response
-        st.write("---")
-        full_response = ""
-        response_box = st.empty()
-
-        try:
-            # We use a simple loop with requests.get(stream=True)
-            with requests.get("http://127.0.0.1:8000/chat_stream", params={"prompt": instruction + "\n\nOriginal Code:\n" + content}, stream=True, timeout=120) as r:
-                for chunk in r.iter_content(chunk_size=1024):
-                    if chunk:
-                        text = chunk.decode("utf-8")
-                        full_response += text
-                        response_box.markdown(full_response + "▌")
-            
-            # Final render without cursor
-            response_box.markdown(full_response)
-            
-            # Extract Code Logic
-            import re
-            code_blocks = re.findall(r'```(?:\w+)?\n(.*?)```', full_response, re.DOTALL)
-            fixed_code = max(code_blocks, key=len).strip() if code_blocks else None
-            
-            if fixed_code:
-                st.markdown('<div class="success-box">✅ Fix Generated Successfully!</div>', unsafe_allow_html=True)
-                
-                # Download Button
-                st.download_button(
-                    label=f"💾 Download Fixed `{filename}`",
-                    data=fixed_code,
-                    file_name=f"fixed_{filename}",
-                    mime="text/plain"
-                )
-            else:
-                st.warning("⚠️ No code block found in response.")
+        # One section per file, filled in while its answer streams
+        ui = {"status": st.empty(), "response": st.empty(), "code": st.empty(), "result": st.empty()}
+        ui["status"].info("🕒 Queued")
+        items.append({"index": index, "name": filename, "prompt": prompt, "ui": ui})
 
-        except Exception as e:
-            st.error(f"An error occurred: {str(e)}")
+    st.divider()
+    asyncio.run(fix_all(items, parallel))
 
 if not uploaded_files:
     st.info("👆 Upload a file to get started.")
@@ -1,11 +1,12 @@
-import httpx
 import sys
 
-# Test Streaming
+from paki_client import PakiClient
+
+# Test Streaming (API URL: first argument, else PAKI_API_URL, else local)
 print("--- Testing Streaming Response ---")
 try:
-    with httpx.stream("GET", "https://0c02b6a91d90.ngrok-free.app/chat_stream", params={"prompt": "Write a long poem about coding."}, timeout=120) as r:
-        for chunk in r.iter_text():
+    with PakiClient(sys.argv[1] if len(sys.argv) > 1 else None, timeout=120) as paki:
+        for chunk in paki.stream("Write a long poem about coding."):
             print(chunk, end="", flush=True)
     print("\n\n--- Done ---")
 except Exception as e:
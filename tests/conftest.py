@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The modules under test live at the repository root (flat layout), so
+# `pytest` works from any directory, not only via `python -m pytest`.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
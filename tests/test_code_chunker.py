@@ -0,0 +1,87 @@
+import ast
+import textwrap
+
+from code_chunker import line_windows, split_lines, split_source, stitch
+
+MODULE = textwrap.dedent('''\
+    import os
+
+
+    class Store:
+        """A small class."""
+
+        def load(self, path):
+            with open(path) as f:
+                return f.read()
+
+        def save(self, path, text):
+            with open(path, "w") as f:
+                f.write(text)
+
+
+    def main():
+        store = Store()
+        print(store.load(os.devnull))
+    # trailing comment
+''')
+
+
+def test_split_lines_matches_ast_numbering():
+    source = "a = 1\r\nb = 2\n\nc = 3"
+    lines = split_lines(source)
+    assert "".join(lines) == source
+    assert lines[1] == "b = 2\n"
+    assert len(lines) == len(source.split("\n"))
+
+
+def test_small_file_is_one_chunk():
+    chunks = split_source(MODULE, "store.py")
+    assert len(chunks) == 1
+    assert chunks[0].text == MODULE
+
+
+def test_python_chunks_cover_the_file_in_order():
+    chunks = split_source(MODULE, "store.py", max_chars=120)
+    assert len(chunks) > 1
+    assert "".join(chunk.text for chunk in chunks) == MODULE
+    assert chunks[0].start == 1
+    for before, after in zip(chunks, chunks[1:]):
+        assert after.start == before.end + 1
+    assert chunks[-1].end == len(split_lines(MODULE))
+
+
+def test_line_windows_cover_non_python_files():
+    source = "".join(f"line {i}\n" for i in range(200))
+    chunks = split_source(source, "notes.txt", max_chars=300)
+    assert "".join(chunk.text for chunk in chunks) == source
+    assert all(len(chunk.text) <= 300 for chunk in chunks)
+
+
+def test_stitch_without_fixes_is_the_original():
+    chunks = split_source(MODULE, "store.py", max_chars=120)
+    assert stitch(chunks, [None] * len(chunks), "store.py") == MODULE
+
+
+def test_stitch_reindents_a_dedented_method_window():
+    chunks = line_windows(MODULE, max_chars=120)
+    index = next(i for i, chunk in enumerate(chunks) if chunk.text.lstrip("\n").startswith("    def save"))
+    # The model returns the method at column 0, with a fix in its body
+    fixed = [None] * len(chunks)
+    fixed[index] = textwrap.dedent(chunks[index].text).replace('"w"', '"w", encoding="utf-8"')
+
+    result = stitch(chunks, fixed, "store.py")
+    ast.parse(result)
+    assert '        with open(path, "w", encoding="utf-8") as f:\n            f.write(text)\n' in result
+    assert result == MODULE.replace('"w"', '"w", encoding="utf-8"')
+
+
+def test_stitch_keeps_the_original_of_a_fix_that_breaks_python():
+    chunks = split_source(MODULE, "store.py", max_chars=120)
+    fixed = [None] * len(chunks)
+    fixed[-1] = "def main(:\n    pass\n"
+    assert stitch(chunks, fixed, "store.py") == MODULE
+
+
+def test_stitch_does_not_parse_other_languages():
+    chunks = line_windows("a {\n}\n", max_chars=100)
+    assert stitch(chunks, ["b {\n}\n"], "style.css") == "b {\n}\n"
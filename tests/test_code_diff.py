@@ -0,0 +1,82 @@
+import textwrap
+
+from code_diff import SnapshotStore, changed_ranges, diff_plan
+
+FUNCTIONS = "".join(
+    textwrap.dedent(f'''\
+        def f{i}(x):
+            y = x + {i}
+            return y * 2
+
+
+    ''')
+    for i in range(10)
+)
+
+
+def test_changed_ranges():
+    old = "a\nb\nc\n"
+    assert changed_ranges(old, old) == []
+    assert changed_ranges(old, "a\nB\nc\n") == [(1, 2)]
+    # A deletion is an empty range where the line was
+    assert changed_ranges(old, "a\nc\n") == [(1, 1)]
+
+
+def test_no_snapshot_means_full_review():
+    assert diff_plan(FUNCTIONS, None, "m.py") is None
+    assert diff_plan(FUNCTIONS, {"reviewed": "", "fixed": None}, "m.py") is None
+
+
+def test_unchanged_file_has_nothing_to_review():
+    plan = diff_plan(FUNCTIONS, {"reviewed": FUNCTIONS, "fixed": None}, "m.py")
+    assert plan is not None
+    assert plan.changed == []
+    assert "".join(chunk.text for chunk in plan.chunks) == FUNCTIONS
+
+
+def test_one_changed_line_reviews_its_function():
+    current = FUNCTIONS.replace("y = x + 3", "y = x - 3")
+    plan = diff_plan(current, {"reviewed": FUNCTIONS, "fixed": None}, "m.py")
+    assert plan is not None and plan.baseline == "reviewed"
+    [region] = plan.regions
+    assert region.text.strip() == "def f3(x):\n    y = x - 3\n    return y * 2"
+    assert "".join(chunk.text for chunk in plan.chunks) == current
+
+    fixed = region.text.replace("y * 2", "y * 3")
+    merged = plan.merge([fixed])
+    assert merged == current.replace("y = x - 3\n    return y * 2", "y = x - 3\n    return y * 3")
+
+
+def test_adopted_fix_is_the_baseline():
+    fixed = FUNCTIONS.replace("y = x + 5", "y = x + 50")
+    plan = diff_plan(fixed, {"reviewed": FUNCTIONS, "fixed": fixed}, "m.py")
+    assert plan.baseline == "fixed" and plan.changed == []
+
+
+def test_too_much_changed_means_full_review():
+    current = FUNCTIONS.replace("return y * 2", "return y * 4")
+    assert diff_plan(current, {"reviewed": FUNCTIONS, "fixed": None}, "m.py") is None
+    # The same change is fine when the ratio allows it
+    assert diff_plan(current, {"reviewed": FUNCTIONS, "fixed": None}, "m.py", max_ratio=1.0) is not None
+
+
+def test_context_lines_outside_python():
+    old = "".join(f"line {i}\n" for i in range(40))
+    new = old.replace("line 20\n", "line twenty\n")
+    plan = diff_plan(new, {"reviewed": old, "fixed": None}, "notes.txt", context=2)
+    [region] = plan.regions
+    assert (region.start, region.end) == (19, 23)
+
+
+def test_snapshots_are_shared_between_single_file_and_batch_runs(tmp_path):
+    source = tmp_path / "pkg" / "m.py"
+    source.parent.mkdir()
+    source.write_text(FUNCTIONS)
+
+    batch = SnapshotStore(str(tmp_path))
+    batch.save(str(source), FUNCTIONS, None)
+
+    single = SnapshotStore.for_file(str(source))
+    assert single.root == str(tmp_path)
+    assert single.load(str(source))["file"] == "pkg/m.py"
+    assert single.load(str(source))["reviewed"] == FUNCTIONS
@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+from fence_parser import FenceParser, extract_blocks
+
+ANSWER = (
+    "Here is the fix.\n\n"
+    "```python\n"
+    "def f(x):\n"
+    "    return x * 2\n"
+    "```\n\n"
+    "Shell:\n"
+    "~~~bash\n"
+    "echo '```'\n"
+    "~~~\n\n"
+    "````markdown\n"
+    "```js\n"
+    "let a = 1;\n"
+    "```\n"
+    "````\n"
+    "And a cut-off one:\r\n"
+    "```\r\n"
+    "unfinished = True\r\n"
+)
+
+
+def random_chunks(text: str, rng: random.Random) -> list[str]:
+    cuts = sorted(rng.sample(range(1, len(text)), rng.randint(1, 40)))
+    return [text[i:j] for i, j in zip([0] + cuts, cuts + [len(text)])]
+
+
+def test_extract_blocks():
+    blocks = extract_blocks(ANSWER)
+    assert [(b.lang, b.closed) for b in blocks] == [
+        ("python", True), ("bash", True), ("markdown", True), ("", False),
+    ]
+    assert blocks[0].code == "def f(x):\n    return x * 2"
+    assert blocks[1].code == "echo '```'"
+    assert blocks[2].code == "```js\nlet a = 1;\n```"
+    assert blocks[3].code == "unfinished = True"
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_random_chunk_splits_match_extract_blocks(seed):
+    lines = []
+    parser = FenceParser(on_line=lambda lang, line: lines.append(line))
+    done = []
+    for chunk in random_chunks(ANSWER, random.Random(seed)):
+        done.extend(parser.feed(chunk))
+        current = parser.current
+        if current is not None:
+            assert not current.closed
+    done.extend(parser.close())
+
+    assert done == parser.blocks == extract_blocks(ANSWER)
+    assert parser.text == ANSWER
+    assert "".join(lines).replace("\r", "") == "".join(b.code + "\n" for b in done)
+
+
+def test_current_previews_the_open_block():
+    parser = FenceParser()
+    parser.feed("Intro\n```py\nx = 1\ny =")
+    assert parser.in_block
+    assert parser.current.code == "x = 1\ny ="
+    assert parser.feed(" 2\n``") == []
+    assert parser.current.code == "x = 1\ny = 2\n``"
+    [block] = parser.feed("`\n")
+    assert block.code == "x = 1\ny = 2" and block.closed
+    assert parser.current is None
+
+
+def test_largest_ignores_cut_off_blocks_unless_asked():
+    parser = FenceParser()
+    parser.feed("```\nshort\n```\n```\na much longer block\n")
+    parser.close()
+    assert parser.largest().code == "short"
+    assert parser.largest(include_open=True).code == "a much longer block"